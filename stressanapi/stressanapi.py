@@ -35,12 +35,13 @@ __descr__   = 'A stress-test tool for API servers'
 __url__     = 'https://github.com/rabuchaim/StressAnAPI/'
 
 import logging, logging.handlers
-import socket, struct, binascii, itertools, math, gc
-import tty, termios, subprocess, ctypes, shlex, signal, shutil
+import socket, http.server, http.client, mmap, struct, binascii, itertools, math, gc, ssl, multiprocessing, multiprocessing.connection
+import tty, termios, select, subprocess, ctypes, shlex, signal, shutil, calendar, contextvars
 import urllib, urllib.request, urllib.response, urllib.parse, bisect
-import re, argparse, threading, time, json, random, textwrap, functools
+import re, argparse, hmac, threading, time, json, random, textwrap, functools, asyncio, csv, email.utils
 from typing import List,Dict
 from collections import defaultdict, deque
+from array import array
 from datetime import timedelta, datetime as dt
 
 current_filename = sys.argv[0]
@@ -69,10 +70,12 @@ class classGlobal:
     argsvars = {}
     config = None
     thread_list = []
+    thread_list_lock = threading.Lock() # the keyboard and the target_rps controller add/remove threads
     lock = threading.Lock()
     event_pause = threading.Event()
     event_pause_time = None
     event_quit = threading.Event()
+    key_poll_interval = 0.2
     event_debug = threading.Event()
 
     logger = None
@@ -99,12 +102,112 @@ class classGlobal:
     date_format_no_datetime = ''
 
     allowed_methods = ['GET','POST','PUT','PATCH','DELETE']
+    allowed_engines = ['urllib','pooled','asyncio','pipeline']
     default_wait_time = 0.5
     default_burst = 1
     default_threads = 1
     default_timeout = 1
     default_syslog_server_url = 'udp://127.0.0.1:514/local7'
     default_success_status_codes = [200,201,202,204]
+    default_engine = 'urllib'
+    default_pool_size = 1
+    default_pool_max_requests = 1000
+    default_pool_max_idle_time = 30.0
+    default_processes = 1
+    default_pipeline_depth = 8
+    default_arrival_rate = 0
+    allowed_arrival_distributions = ['fixed','poisson']
+    spin_threshold = 0.002
+    slot_retime_interval = 0.05 # a waiting open-loop slot follows the rate changes of the stages
+    arrival_scheduler = None
+    allowed_stage_types = ['ramp','hold','wave']
+    stage_min_rate = 0.1 # the arrival rate of a stage at 0 req/sec
+    stages_tick_interval = 0.05
+    stage_rate_factor = 1.0
+    stages_runner = None
+    control_lock = threading.Lock()
+    default_target_rps = 0
+    default_target_rps_max_concurrency = 100
+    target_rps_tick_interval = 1.0
+    target_rps_pid_gains = (0.1, 0.3, 0.01)
+    target_rps_max_integral = 5.0
+    target_rps_busy_ratio = 0.7
+    target_rps_min_sleep = 0.001
+    target_rps_tolerance = 0.05
+    target_rps_saturation_ticks = 5
+    target_rps_max_error_ratio = 0.01
+    target_rps_max_latency_growth = 2.0
+    target_rps_max_client_cpu = 0.8
+    target_rps_controller = None
+    default_slo_p99 = 0.5
+    default_slo_error_ratio = 1.0
+    default_slo_p95 = 0
+    default_slo_min_rps = 0
+    headless = False
+    headless_progress_interval = 5
+    run_duration = 0
+    report_file = ''
+    load_start_time = None
+    default_find_max_start_rate = 100
+    default_find_max_max_rate = 100000
+    default_find_max_step_duration = 10
+    default_find_max_precision = 5
+    default_histogram_significant_digits = 3
+    default_histogram_max_value = 3600
+    default_timeseries_max_seconds = 3600
+    time_series = None
+    data_feeders = {}
+    data_feeders_lock = threading.Lock()
+    data_feeder_index_suffix = '.stressanapi-idx'
+    worker_index = 0
+    default_scenario_file = ''
+    allowed_scenario_cursors = ['shared','partition']
+    scenario_reader = None
+    scenario_lock = threading.Lock()
+    scenario_thread_counter = itertools.count()
+    scenario_partitions = 0
+    scenario_queue_size = 10000 # the rows dealt to a thread that doesn't read them (ex: a stopped thread) are dropped after this size
+    scenario_validate_rows = 1000
+    scenario_max_patterns = 100
+    scenario_other_pattern = '(other patterns)'
+    default_replay_file = ''
+    default_replay_speed = 1.0
+    replay_lookahead = 10000
+    replay_read_batch = 256
+    replay_max_wait = 1.0
+    request_mix_keys = ['name','weight','url','method','headers','post_data']
+    flow_step_keys = ['name','url','method','headers','post_data','extract','think_time']
+    allowed_flow_extractors = ['json','regex','header']
+    flow_pattern = '(whole flow)'
+    flow_extraction_error_code = 905
+    allowed_assertions = ['contains','not_contains','regex','json','body_size','header']
+    default_assertions_sample_rate = 1.0
+    assertion_error_code = 906
+    default_read_full_body = False
+    body_buffer_size = 65536
+    default_phase_timing = True
+    request_phases = ['dns','connect','tls','ttfb','transfer']
+    default_metrics_listen = ''
+    metrics_exporter = None
+    metrics_snapshot_interval = 1.0
+    metrics_histogram_buckets = [0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0]
+    find_max_warmup_time = 2.0
+    find_max_cooldown_time = 1.0
+    find_max_max_steps = 30
+    find_max_max_shortfall = 0.1
+    exit_code = 0
+    agents = []
+    agents_addresses = []
+    agent_index = 0
+    agents_count = 1
+    agent_connect_timeout = 10
+    default_agent_listen = '127.0.0.1:7878'
+    agent_token = os.getenv('STRESSANAPI_AGENT_TOKEN','')
+    worker_stats_interval = 0.5
+    stats_shards = []
+    stats_lock = threading.RLock()
+    worker_processes = []
+    view_mode = 'none'
     default_user_agent = f"{__appname__} v{__version__}"
     default_template = {
         "url": "http://localhost:8000/api/v1/foo_action",
@@ -127,6 +230,45 @@ class classGlobal:
         "start_threads": default_threads,
         "cpu_affinity": [-1],
         "syslog_server_url": default_syslog_server_url,
+        "engine": default_engine,
+        "start_clients": default_threads,
+        "processes": default_processes,
+        "pipeline_depth": default_pipeline_depth,
+        "arrival_rate": default_arrival_rate,
+        "arrival_distribution": allowed_arrival_distributions[0],
+        "stages": [],
+        "target_rps": default_target_rps,
+        "target_rps_max_concurrency": default_target_rps_max_concurrency,
+        "slo_p99": default_slo_p99,
+        "slo_error_ratio": default_slo_error_ratio,
+        "slo_p95": default_slo_p95,
+        "slo_min_rps": default_slo_min_rps,
+        "find_max_start_rate": default_find_max_start_rate,
+        "find_max_max_rate": default_find_max_max_rate,
+        "find_max_step_duration": default_find_max_step_duration,
+        "find_max_precision": default_find_max_precision,
+        "histogram_significant_digits": default_histogram_significant_digits,
+        "histogram_max_value": default_histogram_max_value,
+        "timeseries_max_seconds": default_timeseries_max_seconds,
+        "timeseries_file": "",
+        "timeseries_export": "",
+        "metrics_listen": default_metrics_listen,
+        "scenario_file": default_scenario_file,
+        "scenario_cursor": allowed_scenario_cursors[0],
+        "replay_file": default_replay_file,
+        "replay_speed": default_replay_speed,
+        "requests": [],
+        "flow": [],
+        "assertions": [],
+        "assertions_sample_rate": default_assertions_sample_rate,
+        "read_full_body": default_read_full_body,
+        "phase_timing": default_phase_timing,
+        "pool_size": default_pool_size,
+        "pool_max_requests": default_pool_max_requests,
+        "pool_max_idle_time": default_pool_max_idle_time,
+        "tcp_nodelay": True,
+        "socket_send_buffer": 0,
+        "socket_recv_buffer": 0,
     }
 
 G = classGlobal()
@@ -176,18 +318,196 @@ class configFile:
         self.threads = threads
         self.cpu_affinity = cpu_affinity
         self.syslog_server = syslog_server
+        self.engine = config_dict.get('engine',G.default_engine)
+        self.clients = config_dict.get('clients',threads)
+        self.processes = config_dict.get('processes',G.default_processes)
+        self.pipeline_depth = config_dict.get('pipeline_depth',G.default_pipeline_depth)
+        self.connection_pool = config_dict.get('connection_pool',{})
+        self.arrival_rate = config_dict.get('arrival_rate',G.default_arrival_rate)
+        self.arrival_distribution = config_dict.get('arrival_distribution',G.allowed_arrival_distributions[0])
+        self.stages = config_dict.get('stages',[])
+        self.target_rps = config_dict.get('target_rps',G.default_target_rps)
+        self.target_rps_max_concurrency = config_dict.get('target_rps_max_concurrency',G.default_target_rps_max_concurrency)
+        self.slo_p99 = config_dict.get('slo_p99',G.default_slo_p99)
+        self.slo_error_ratio = config_dict.get('slo_error_ratio',G.default_slo_error_ratio)
+        self.slo_p95 = config_dict.get('slo_p95',G.default_slo_p95)
+        self.slo_min_rps = config_dict.get('slo_min_rps',G.default_slo_min_rps)
+        self.slo_thresholds = config_dict.get('slo_thresholds',[])
+        self.find_max_start_rate = config_dict.get('find_max_start_rate',G.default_find_max_start_rate)
+        self.find_max_max_rate = config_dict.get('find_max_max_rate',G.default_find_max_max_rate)
+        self.find_max_step_duration = config_dict.get('find_max_step_duration',G.default_find_max_step_duration)
+        self.find_max_precision = config_dict.get('find_max_precision',G.default_find_max_precision)
+        self.histogram_significant_digits = config_dict.get('histogram_significant_digits',G.default_histogram_significant_digits)
+        self.histogram_max_value = config_dict.get('histogram_max_value',G.default_histogram_max_value)
+        self.timeseries_max_seconds = config_dict.get('timeseries_max_seconds',G.default_timeseries_max_seconds)
+        self.timeseries_file = config_dict.get('timeseries_file','')
+        self.timeseries_export = config_dict.get('timeseries_export','')
+        self.metrics_listen = config_dict.get('metrics_listen',G.default_metrics_listen)
+        self.scenario_file = config_dict.get('scenario_file',G.default_scenario_file)
+        self.scenario_cursor = config_dict.get('scenario_cursor',G.allowed_scenario_cursors[0])
+        self.replay_file = config_dict.get('replay_file',G.default_replay_file)
+        self.replay_speed = config_dict.get('replay_speed',G.default_replay_speed)
+        self.requests = config_dict.get('requests',[])
+        self.flow = config_dict.get('flow',[])
+        self.assertions = config_dict.get('assertions',[])
+        self.assertions_sample_rate = config_dict.get('assertions_sample_rate',G.default_assertions_sample_rate)
+        self.read_full_body = config_dict.get('read_full_body',G.default_read_full_body)
+        self.phase_timing = config_dict.get('phase_timing',G.default_phase_timing)
         self.elapsed_load_time = '%.6f'%(time.monotonic() - start_time)
 
-def validateConfigFile(config_file):
+##──── Validates the "stages" of the configuration file and returns them with all the keys filled in ───────────────────────────
+def validateStages(stages)->list:
+    if not isinstance(stages,list):
+        raise StressAnAPIConfigException(f'Error in "stages", must be a List not {str(type(stages))}') from None
+    stage_keys = {'ramp':['from','to'], 'hold':['rate'], 'wave':['min','max','period']}
+    zero_keys = ['from','to','rate','min'] # a ramp can start (or end) at 0 req/sec
+    new_stages = []
+    for index, stage in enumerate(stages):
+        if not isinstance(stage,dict) or str(stage.get('type','')).lower() not in G.allowed_stage_types:
+            raise StressAnAPIConfigException(f'Invalid stage #{index+1}, must be a Dict with "type" {" or ".join(G.allowed_stage_types)} - "{stage}"') from None
+        stage_type = str(stage['type']).lower()
+        new_stage = {'type':stage_type, 'name':str(stage.get('name',stage_type))}
+        for key in ['duration'] + stage_keys[stage_type]:
+            try:
+                new_stage[key] = float(stage[key])
+                assert new_stage[key] >= 0 if key in zero_keys else new_stage[key] > 0
+            except:
+                raise StressAnAPIConfigException(f'Invalid "{key}" value in stage #{index+1} ({stage_type}), must be float and greater than {"or equal to " if key in zero_keys else ""}0 - "{stage.get(key,None)}"') from None
+        if stage_type == 'wave' and new_stage['min'] > new_stage['max']:
+            raise StressAnAPIConfigException(f'Invalid wave in stage #{index+1}, "min" must be lower than "max" - "{stage}"') from None
+        new_stages.append(new_stage)
+    return new_stages
+
+##──── Checks the "post_data" and the "headers" of the configuration, or of one request of the "requests" mix ('where')
+def validatePostData(post_data,where:str=''):
+    if not isinstance(post_data,Dict):
+        raise StressAnAPIConfigException(f'Error in "post_data"{where}, must be a Dict not {str(type(post_data))}') from None
+    for key,val in post_data.items():
+        if len(re.findall('random:', str(val))) + len(re.findall('file:', str(val))) + len(re.findall('filerand:', str(val))) > 1:
+            raise StressAnAPIConfigException(f'Error in post_data "{key}"{where} - Only 1 "random:", "file:" or "filerand:" instruction per value') from None
+    try:
+        classStringTemplate(json.dumps(post_data,ensure_ascii=False),quoteJsonValue)
+    except StressAnAPIException as ERR:
+        raise StressAnAPIConfigException(f'Error in "post_data"{where} - {stripColor(str(ERR))}') from None
+
+def validateHeaders(headers,where:str=''):
+    if not isinstance(headers,Dict):
+        raise StressAnAPIConfigException(f'Error in "headers"{where}, must be a Dict not {str(type(headers))}') from None
+    for key,val in headers.items():
+        if (key.lower() == 'content-type') and (val.lower() not in CONTENT_TYPES.values()):
+            raise StressAnAPIConfigException(f'Invalid content-type{where}: {val}') from None
+        if len(re.findall('random:', val)) + len(re.findall('file:', val)) + len(re.findall('filerand:', val)) > 1:
+            raise StressAnAPIConfigException(f'Error in header "{key}"{where} - Only 1 "random:", "file:" or "filerand:" instruction per value') from None
+        try:
+            classStringTemplate(str(val),quoteHeaderValue)
+        except StressAnAPIException as ERR:
+            raise StressAnAPIConfigException(f'Error in header "{key}"{where} - {stripColor(str(ERR))}') from None
+
+##──── Validates a request of the "requests" mix or a step of the "flow" and returns it with all the keys filled in: the keys that are
+##──── not set are taken from the request of "url", and the headers of the request replace the headers of the configuration with the same name.
+def validateRequestDefinition(request,where:str,config_dict:dict,allowed_keys:list)->dict:
+    if not isinstance(request,dict):
+        raise StressAnAPIConfigException(f'Invalid value{where}, must be a Dict - "{request}"') from None
+    unknown_keys = [key for key in request.keys() if key not in allowed_keys]
+    if unknown_keys:
+        raise StressAnAPIConfigException(f'Unknown keys {unknown_keys}{where}, the allowed keys are {allowed_keys}') from None
+    base_url_parts = urllib.parse.urlsplit(config_dict['url'])
+    url, method = str(request.get('url',config_dict['url'])), str(request.get('method',config_dict['method'])).upper()
+    if not url.startswith(('http://','https://')) or not isValidURL(url):
+        raise StressAnAPIConfigException(f'Malformed URL{where} - "{url}"') from None
+    url_parts = urllib.parse.urlsplit(url)
+    if config_dict['engine'] != 'urllib' and (url_parts.scheme,url_parts.netloc) != (base_url_parts.scheme,base_url_parts.netloc):
+        raise StressAnAPIConfigException(f'The connections of the \'{config_dict["engine"]}\' engine are opened to the host of "url", '
+                                         f'the url{where} must use "{base_url_parts.scheme}://{base_url_parts.netloc}" - "{url}"') from None
+    try:
+        classStringTemplate(url,quoteUrlValue)
+    except StressAnAPIException as ERR:
+        raise StressAnAPIConfigException(f'Invalid "url" value{where} - {stripColor(str(ERR))}') from None
+    if method not in G.allowed_methods:
+        raise StressAnAPIConfigException(f'Invalid method{where}, must be one of {G.allowed_methods} - "{method}"') from None
+    post_data, request_headers = request.get('post_data',config_dict['post_data']), request.get('headers',{})
+    validatePostData(post_data,where)
+    validateHeaders(request_headers,where)
+    request_header_keys = [key.lower() for key in request_headers.keys()]
+    headers = {key:val for key,val in config_dict['headers'].items() if key.lower() not in request_header_keys} | request_headers
+    name = str(request.get('name') or f"{method} {url_parts.path or '/'}")
+    return {'name':name, 'url':url, 'method':method, 'headers':headers, 'post_data':post_data}
+
+##──── Validates the "requests" mix, the name of each request is the name of its statistics
+def validateRequestMix(requests,config_dict:dict)->list:
+    if not isinstance(requests,list):
+        raise StressAnAPIConfigException(f'Error in "requests", must be a List not {str(type(requests))}') from None
+    if len(requests) > G.scenario_max_patterns:
+        raise StressAnAPIConfigException(f'Too many requests in "requests", the maximum is {G.scenario_max_patterns}') from None
+    new_requests = []
+    for index, request in enumerate(requests):
+        where = f' of the request #{index+1}'
+        new_request = validateRequestDefinition(request,where,config_dict,G.request_mix_keys)
+        try:
+            new_request['weight'] = float(request.get('weight',1))
+            assert new_request['weight'] > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "weight" value{where}, must be float and greater than 0 - "{request.get("weight",None)}"') from None
+        if new_request['name'] in [other_request['name'] for other_request in new_requests]:
+            raise StressAnAPIConfigException(f'Duplicated name "{new_request["name"]}"{where}, each request of "requests" must have its own "name"') from None
+        new_requests.append(new_request)
+    return new_requests
+
+##──── Validates the "flow": the steps are sent in order by each virtual user, the values extracted from the response of a step
+##──── ("extract") are used by the next steps with %%var:name%%, and "think_time" is the pause after the step (seconds or [min, max]).
+def validateFlow(flow,config_dict:dict)->list:
+    if not isinstance(flow,list):
+        raise StressAnAPIConfigException(f'Error in "flow", must be a List not {str(type(flow))}') from None
+    if len(flow) >= G.scenario_max_patterns:
+        raise StressAnAPIConfigException(f'Too many steps in "flow", the maximum is {G.scenario_max_patterns - 1}') from None
+    new_steps, variables = [], []
+    for index, step in enumerate(flow):
+        where = f' of the step #{index+1} of the "flow"'
+        new_step = validateRequestDefinition(step,where,config_dict,G.flow_step_keys)
+        step_text = json.dumps([new_step['url'],new_step['headers'],new_step['post_data']],ensure_ascii=False)
+        for variable in classStringTemplate.variables_regex.findall(step_text):
+            if variable.startswith('var:') and variable[4:] not in variables:
+                raise StressAnAPIConfigException(f'The variable "%%{variable}%%"{where} is not extracted by a previous step') from None
+        extract = step.get('extract',{})
+        if not isinstance(extract,dict):
+            raise StressAnAPIConfigException(f'Error in "extract"{where}, must be a Dict not {str(type(extract))}') from None
+        new_step['extract'] = {}
+        for variable, extractor in extract.items():
+            if not re.fullmatch(r'\w+',variable):
+                raise StressAnAPIConfigException(f'Invalid variable name "{variable}"{where}, only letters, digits and "_" are allowed') from None
+            if not isinstance(extractor,dict) or len(extractor) != 1 or list(extractor.keys())[0] not in G.allowed_flow_extractors:
+                raise StressAnAPIConfigException(f'Invalid extractor of "{variable}"{where}, must be a Dict with one of {G.allowed_flow_extractors} - "{extractor}"') from None
+            kind, argument = list(extractor.items())[0]
+            try:
+                newFlowExtractor(variable,kind,str(argument))
+            except StressAnAPIException as ERR:
+                raise StressAnAPIConfigException(f'Invalid extractor of "{variable}"{where} - {stripColor(str(ERR))}') from None
+            new_step['extract'][variable] = {kind:str(argument)}
+            variables.append(variable)
+        think_time = step.get('think_time',0)
+        try:
+            think_time = [float(value) for value in think_time] if isinstance(think_time,list) else [float(think_time)] * 2
+            assert len(think_time) == 2 and 0 <= think_time[0] <= think_time[1]
+        except:
+            raise StressAnAPIConfigException(f'Invalid "think_time" value{where}, must be seconds or [min, max] - "{step.get("think_time",None)}"') from None
+        new_step['think_time'] = think_time
+        if new_step['name'] in [other_step['name'] for other_step in new_steps] + [G.flow_pattern]:
+            raise StressAnAPIConfigException(f'Duplicated name "{new_step["name"]}"{where}, each step of "flow" must have its own "name"') from None
+        new_steps.append(new_step)
+    return new_steps
+
+def validateConfigFile(config_file,config_dict=None):
     try:
         start_time = time.monotonic()
         new_config_dict = {}
 
-        try:
-            with open(config_file,'r') as f:
-                config_dict = json.load(f)
-        except Exception as ERR:
-            raise StressAnAPIException(f"The json file appears to be invalid - {str(ERR)}") from None
+        if config_dict is None: # the agents receive the configuration from the controller
+            try:
+                with open(config_file,'r') as f:
+                    config_dict = json.load(f)
+            except Exception as ERR:
+                raise StressAnAPIException(f"The json file appears to be invalid - {str(ERR)}") from None
+            config_file = os.path.realpath(config_file)
 
         url = str(config_dict.get('url',''))
         method = str(config_dict.get('method',''))
@@ -198,8 +518,23 @@ def validateConfigFile(config_file):
         burst = config_dict.get('start_burst',G.default_burst)
         success_status_codes = config_dict.get('success_status_codes',G.default_success_status_codes)
         threads = config_dict.get('start_threads',G.default_threads)
+        clients = config_dict.get('start_clients',threads)
+        processes = config_dict.get('processes',G.default_processes)
         cpu_affinity = config_dict.get('cpu_affinity',[])
         syslog_server_url = config_dict.get('syslog_server_url','')
+        engine = str(config_dict.get('engine',G.default_engine)).lower()
+        pool_size = config_dict.get('pool_size',G.default_pool_size)
+        pool_max_requests = config_dict.get('pool_max_requests',G.default_pool_max_requests)
+        pool_max_idle_time = config_dict.get('pool_max_idle_time',G.default_pool_max_idle_time)
+        tcp_nodelay = config_dict.get('tcp_nodelay',True)
+        socket_send_buffer = config_dict.get('socket_send_buffer',0)
+        socket_recv_buffer = config_dict.get('socket_recv_buffer',0)
+        pipeline_depth = config_dict.get('pipeline_depth',G.default_pipeline_depth)
+        arrival_rate = config_dict.get('arrival_rate',G.default_arrival_rate)
+        arrival_distribution = str(config_dict.get('arrival_distribution',G.allowed_arrival_distributions[0])).lower()
+        stages = config_dict.get('stages',[])
+        target_rps = config_dict.get('target_rps',G.default_target_rps)
+        target_rps_max_concurrency = config_dict.get('target_rps_max_concurrency',G.default_target_rps_max_concurrency)
 
         ##──── Check URL and METHOD - required data
         if (config_dict.get('url',None) is None) or (config_dict.get('url',None) == ""):
@@ -215,25 +550,19 @@ def validateConfigFile(config_file):
             allowed_methods_result = allowed_methods_joined.rsplit(", ", 1)
             allowed_methods_string = " or ".join(allowed_methods_result)
             raise StressAnAPIConfigException(f'The allowed methods are {allowed_methods_string}, not "{method}"') from None
+        try:
+            classStringTemplate(url,quoteUrlValue)
+        except StressAnAPIException as ERR:
+            raise StressAnAPIConfigException(f'Invalid "url" value - {stripColor(str(ERR))}') from None
         new_config_dict['url'] = url
         new_config_dict['method'] = method.upper()
 
         ##──── check post data
-        if not isinstance(post_data,Dict):
-            raise StressAnAPIConfigException(f'Error in "post_data", must be a Dict not {str(type(post_data))}') from None
-        for key,val in post_data.items():
-            if len(re.findall('random:', val)) + len(re.findall('file:', val)) + len(re.findall('filerand:', val)) > 1:
-                raise StressAnAPIConfigException(f'Error in post_data "{key}" - Only 1 "random:", "file:" or "filerand:" instruction per value') from None
+        validatePostData(post_data)
         new_config_dict['post_data'] = post_data
 
         ##──── check headers
-        if not isinstance(headers,Dict):
-            raise StressAnAPIConfigException(f'Error in "headers", must be a Dict not {str(type(headers))}') from None
-        for key,val in headers.items():
-            if (key.lower() == 'content-type') and (val.lower() not in CONTENT_TYPES.values()):
-                raise StressAnAPIConfigException(f'Invalid content-type: {val}') from None
-            if len(re.findall('random:', val)) + len(re.findall('file:', val)) + len(re.findall('filerand:', val)) > 1:
-                raise StressAnAPIConfigException(f'Error in header "{key}" - Only 1 "random:", "file:" or "filerand:" instruction per value') from None
+        validateHeaders(headers)
         new_config_dict['headers'] = headers
 
         ##──── validate timeout
@@ -276,6 +605,21 @@ def validateConfigFile(config_file):
             raise StressAnAPIConfigException(f'Invalid "threads" value, must be an integer and greater than 0 - "{threads}"') from None
         new_config_dict['threads'] = threads
 
+        ##──── validate virtual clients (used only by the 'asyncio' engine)
+        try:
+            clients = int(clients)
+            assert clients > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "start_clients" value, must be an integer and greater than 0 - "{clients}"') from None
+        new_config_dict['clients'] = clients
+
+        ##──── validate the number of worker processes
+        try:
+            processes = int(processes)
+            assert processes > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "processes" value, must be an integer and greater than 0 - "{processes}"') from None
+        new_config_dict['processes'] = processes
 
         ##──── validate cpu affinity
         if not isinstance(cpu_affinity,List):
@@ -324,12 +668,195 @@ def validateConfigFile(config_file):
                 
             logDebug(f"Syslog server configuration: {syslog_server}")
         new_config_dict['syslog_server'] = syslog_server
+
+        ##──── validate the request engine and the connection pool options (used only by the 'pooled' engine)
+        if engine not in G.allowed_engines:
+            raise StressAnAPIConfigException(f'Invalid "engine" value, must be one of {", ".join(G.allowed_engines)} - "{engine}"') from None
+        new_config_dict['engine'] = engine
+        try:
+            pool_size = int(pool_size)
+            assert pool_size > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "pool_size" value, must be an integer and greater than 0 - "{pool_size}"') from None
+        try:
+            pool_max_requests = int(pool_max_requests)
+            assert pool_max_requests >= 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "pool_max_requests" value, must be an integer (0 = unlimited) - "{pool_max_requests}"') from None
+        try:
+            pool_max_idle_time = float(pool_max_idle_time)
+            assert pool_max_idle_time > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "pool_max_idle_time" value, must be float and greater than 0 - "{pool_max_idle_time}"') from None
+        if not isinstance(tcp_nodelay,bool):
+            raise StressAnAPIConfigException(f'Invalid "tcp_nodelay" value, must be true or false - "{tcp_nodelay}"') from None
+        try:
+            socket_send_buffer, socket_recv_buffer = int(socket_send_buffer), int(socket_recv_buffer)
+            assert socket_send_buffer >= 0 and socket_recv_buffer >= 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "socket_send_buffer"/"socket_recv_buffer" value, must be an integer (0 = OS default) - "{socket_send_buffer}"/"{socket_recv_buffer}"') from None
+        new_config_dict['connection_pool'] = {'pool_size':pool_size,'max_requests':pool_max_requests,'max_idle_time':pool_max_idle_time,
+                                              'tcp_nodelay':tcp_nodelay,'send_buffer':socket_send_buffer,'recv_buffer':socket_recv_buffer}
+        try:
+            pipeline_depth = int(pipeline_depth)
+            assert pipeline_depth > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "pipeline_depth" value, must be an integer and greater than 0 - "{pipeline_depth}"') from None
+        new_config_dict['pipeline_depth'] = pipeline_depth
+        try:
+            arrival_rate = float(arrival_rate)
+            assert arrival_rate >= 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "arrival_rate" value, must be float and greater or equal than 0 (0 = disabled) - "{arrival_rate}"') from None
+        new_config_dict['arrival_rate'] = arrival_rate
+        if arrival_distribution not in G.allowed_arrival_distributions:
+            raise StressAnAPIConfigException(f'Invalid "arrival_distribution" value, must be {" or ".join(G.allowed_arrival_distributions)} - "{arrival_distribution}"') from None
+        new_config_dict['arrival_distribution'] = arrival_distribution
+        new_config_dict['stages'] = validateStages(stages)
+        if new_config_dict['stages'] and arrival_rate == 0: # the stages always run in open-loop mode
+            new_config_dict['arrival_rate'] = max(G.stage_min_rate,getStageRate(new_config_dict['stages'][0],0.0))
+        try:
+            target_rps = float(target_rps)
+            assert target_rps >= 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "target_rps" value, must be float and greater or equal than 0 (0 = disabled) - "{target_rps}"') from None
+        if target_rps > 0 and new_config_dict['arrival_rate'] > 0:
+            raise StressAnAPIConfigException(f'The "target_rps" option works with the closed loop and can not be used with "arrival_rate" or "stages"') from None
+        new_config_dict['target_rps'] = target_rps
+        try:
+            target_rps_max_concurrency = int(target_rps_max_concurrency)
+            assert target_rps_max_concurrency > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "target_rps_max_concurrency" value, must be an integer and greater than 0 - "{target_rps_max_concurrency}"') from None
+        new_config_dict['target_rps_max_concurrency'] = target_rps_max_concurrency
+        ##──── validate the SLOs and the options of the --find-max mode
+        for key, default_value in [('slo_p99',G.default_slo_p99),('find_max_start_rate',G.default_find_max_start_rate),('find_max_max_rate',G.default_find_max_max_rate),
+                                   ('find_max_step_duration',G.default_find_max_step_duration),('find_max_precision',G.default_find_max_precision)]:
+            try:
+                new_config_dict[key] = float(config_dict.get(key,default_value))
+                assert new_config_dict[key] > 0
+            except:
+                raise StressAnAPIConfigException(f'Invalid "{key}" value, must be float and greater than 0 - "{config_dict.get(key,default_value)}"') from None
+        try:
+            new_config_dict['slo_error_ratio'] = float(config_dict.get('slo_error_ratio',G.default_slo_error_ratio))
+            assert 0 <= new_config_dict['slo_error_ratio'] <= 100
+        except:
+            raise StressAnAPIConfigException(f'Invalid "slo_error_ratio" value, must be a percentage between 0 and 100 - "{config_dict.get("slo_error_ratio",None)}"') from None
+        ##──── the thresholds only checked by the headless mode, 0 = disabled
+        for key, default_value in [('slo_p95',G.default_slo_p95),('slo_min_rps',G.default_slo_min_rps)]:
+            try:
+                new_config_dict[key] = float(config_dict.get(key,default_value))
+                assert new_config_dict[key] >= 0
+            except:
+                raise StressAnAPIConfigException(f'Invalid "{key}" value, must be float and greater or equal to 0 (0 = disabled) - "{config_dict.get(key,default_value)}"') from None
+        ##──── the headless mode checks only the thresholds of the configuration file, not the defaults used by --find-max
+        new_config_dict['slo_thresholds'] = [key for key in ['slo_p95','slo_p99','slo_error_ratio','slo_min_rps'] if key in config_dict]
+        if new_config_dict['find_max_start_rate'] > new_config_dict['find_max_max_rate']:
+            raise StressAnAPIConfigException(f'The "find_max_start_rate" must be lower than "find_max_max_rate"') from None
+        
+        ##──── validate the precision and the maximum value (in seconds) of the histograms of the elapsed times
+        try:
+            new_config_dict['histogram_significant_digits'] = int(config_dict.get('histogram_significant_digits',G.default_histogram_significant_digits))
+            assert 1 <= new_config_dict['histogram_significant_digits'] <= 4
+        except:
+            raise StressAnAPIConfigException(f'Invalid "histogram_significant_digits" value, must be an integer between 1 and 4 - "{config_dict.get("histogram_significant_digits",None)}"') from None
+        try:
+            new_config_dict['histogram_max_value'] = float(config_dict.get('histogram_max_value',G.default_histogram_max_value))
+            assert new_config_dict['histogram_max_value'] > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "histogram_max_value" value, must be float and greater than 0 - "{config_dict.get("histogram_max_value",None)}"') from None
+        
+        ##──── validate the options of the per-second time series
+        try:
+            new_config_dict['timeseries_max_seconds'] = int(config_dict.get('timeseries_max_seconds',G.default_timeseries_max_seconds))
+            assert new_config_dict['timeseries_max_seconds'] > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "timeseries_max_seconds" value, must be an integer and greater than 0 - "{config_dict.get("timeseries_max_seconds",None)}"') from None
+        for key in ['timeseries_file','timeseries_export']:
+            if not isinstance(config_dict.get(key,''),str):
+                raise StressAnAPIConfigException(f'Invalid "{key}" value, must be a file name - "{config_dict.get(key)}"') from None
+            new_config_dict[key] = config_dict.get(key,'')
+        if new_config_dict['timeseries_export'] != '' and not new_config_dict['timeseries_export'].lower().endswith(('.csv','.json')):
+            raise StressAnAPIConfigException(f'Invalid "timeseries_export" value, the file name must end with .csv or .json - "{new_config_dict["timeseries_export"]}"') from None
+        ##──── validate the address of the Prometheus endpoint ('' = disabled)
+        try:
+            new_config_dict['metrics_listen'] = str(config_dict.get('metrics_listen',G.default_metrics_listen)).strip()
+            if new_config_dict['metrics_listen'] != '':
+                if ':' not in new_config_dict['metrics_listen']:
+                    new_config_dict['metrics_listen'] = f"127.0.0.1:{new_config_dict['metrics_listen']}"
+                parseHostPort(new_config_dict['metrics_listen'])
+        except:
+            raise StressAnAPIConfigException(f'Invalid "metrics_listen" value, must be "host:port" or "port" - "{config_dict.get("metrics_listen",None)}"') from None
+        ##──── validate the scenario file ('' = disabled), only its first rows are read because it is streamed while the test runs
+        scenario_file = config_dict.get('scenario_file',G.default_scenario_file)
+        if not isinstance(scenario_file,str):
+            raise StressAnAPIConfigException(f'Invalid "scenario_file" value, must be a file name - "{scenario_file}"') from None
+        if scenario_file != '':
+            try:
+                for scenario_row in itertools.islice(readScenarioRows(scenario_file,new_config_dict['url'],new_config_dict['method'],strict=True),G.scenario_validate_rows):pass
+            except StressAnAPIException as ERR:
+                raise StressAnAPIConfigException(f'Error in "scenario_file" - {stripColor(str(ERR))}') from None
+        new_config_dict['scenario_file'] = scenario_file
+        scenario_cursor = str(config_dict.get('scenario_cursor',G.allowed_scenario_cursors[0])).lower()
+        if scenario_cursor not in G.allowed_scenario_cursors:
+            raise StressAnAPIConfigException(f'Invalid "scenario_cursor" value, must be one of {G.allowed_scenario_cursors} - "{config_dict.get("scenario_cursor",None)}"') from None
+        new_config_dict['scenario_cursor'] = scenario_cursor
+        ##──── validate the access log replay ('' = disabled), the requests are sent in open-loop mode at the pace of the log
+        replay_file = config_dict.get('replay_file',G.default_replay_file)
+        if not isinstance(replay_file,str):
+            raise StressAnAPIConfigException(f'Invalid "replay_file" value, must be a file name - "{replay_file}"') from None
+        if replay_file != '':
+            if new_config_dict['arrival_rate'] > 0 or target_rps > 0 or scenario_file != '':
+                raise StressAnAPIConfigException(f'The "replay_file" option sends the requests at the pace of the log and can not be used with "arrival_rate", "stages", "target_rps" or "scenario_file"') from None
+            try:
+                next(readAccessLogRows(replay_file,new_config_dict['url']))
+            except StressAnAPIException as ERR:
+                raise StressAnAPIConfigException(f'Error in "replay_file" - {stripColor(str(ERR))}') from None
+        new_config_dict['replay_file'] = replay_file
+        try:
+            new_config_dict['replay_speed'] = float(config_dict.get('replay_speed',G.default_replay_speed))
+            assert new_config_dict['replay_speed'] > 0
+        except:
+            raise StressAnAPIConfigException(f'Invalid "replay_speed" value, must be float and greater than 0 (2 = twice as fast as the log) - "{config_dict.get("replay_speed",None)}"') from None
+        ##──── validate the weighted mix of requests ([] = only the request of "url" and "method")
+        requests = config_dict.get('requests',[])
+        if requests != [] and (scenario_file != '' or replay_file != ''):
+            raise StressAnAPIConfigException(f'The "requests" mix can not be used with "scenario_file" or "replay_file", their rows are the requests to send') from None
+        new_config_dict['requests'] = validateRequestMix(requests,new_config_dict)
+        ##──── validate the "flow" of steps sent in order by each virtual user ([] = disabled)
+        flow = config_dict.get('flow',[])
+        if flow != []:
+            if scenario_file != '' or replay_file != '' or requests != [] or new_config_dict['arrival_rate'] > 0:
+                raise StressAnAPIConfigException(f'The "flow" option sends the steps in order by each virtual user (closed-loop) and can not be used with '
+                                                 f'"scenario_file", "replay_file", "requests", "arrival_rate" or "stages"') from None
+            if engine == 'pipeline':
+                raise StressAnAPIConfigException(f'The steps of a "flow" depend on the previous responses, so they can not be sent by the \'pipeline\' engine') from None
+        elif '%%var:' in json.dumps([url,post_data,headers,requests],ensure_ascii=False):
+            raise StressAnAPIConfigException(f'The template variable %%var:name%% is only available in the steps of a "flow"') from None
+        new_config_dict['flow'] = validateFlow(flow,new_config_dict)
+        ##──── validate the assertions of the successful responses ([] = only the "success_status_codes")
+        new_config_dict['assertions'] = validateAssertions(config_dict.get('assertions',[]))
+        try:
+            new_config_dict['assertions_sample_rate'] = float(config_dict.get('assertions_sample_rate',G.default_assertions_sample_rate))
+            assert 0 < new_config_dict['assertions_sample_rate'] <= 1
+        except:
+            raise StressAnAPIConfigException(f'Invalid "assertions_sample_rate" value, must be float greater than 0 and up to 1 (1 = all the responses) - "{config_dict.get("assertions_sample_rate",None)}"') from None
+        ##──── read the whole body of the responses with the 'urllib' engine (the other engines always read the whole body)
+        read_full_body = config_dict.get('read_full_body',G.default_read_full_body)
+        if not isinstance(read_full_body,bool):
+            raise StressAnAPIConfigException(f'Invalid "read_full_body" value, must be true or false - "{read_full_body}"') from None
+        new_config_dict['read_full_body'] = read_full_body
+        ##──── the time of each phase of the requests (dns, connect, tls, ttfb and transfer)
+        phase_timing = config_dict.get('phase_timing',G.default_phase_timing)
+        if not isinstance(phase_timing,bool):
+            raise StressAnAPIConfigException(f'Invalid "phase_timing" value, must be true or false - "{phase_timing}"') from None
+        new_config_dict['phase_timing'] = phase_timing
         
         new_config_dict['stats_window_size'] = G.stats_window_size
         new_config_dict['garbage_collector_interval'] = G.garbage_collector_interval
         
         ##──── set the values to the G.config global variable
-        G.config = configFile(os.path.realpath(config_file),new_config_dict,url,method,post_data,headers,timeout,success_status_codes,
+        G.config = configFile(config_file,new_config_dict,url,method,post_data,headers,timeout,success_status_codes,
                             interval,burst,threads,cpu_affinity,syslog_server,start_time)
     except Exception as ERR:
         logDebug(f"failed at validateConfigFile: {str(ERR)}")
@@ -339,6 +866,24 @@ def validateConfigFile(config_file):
 def displayConfig():
     logDebug(f"configuration: {json.dumps(G.config.config_dict,separators=(', ',':'))}")
     log(f"  - Request...: {cWhite(G.config.method)} at {cWhite(G.config.url)}")
+    if G.config.scenario_file != '':
+        log(f"  - Scenario..: {cWhite(G.config.scenario_file)} - the rows are read in sequence with a {cWhite(G.config.scenario_cursor)} cursor")
+    if G.config.requests:
+        total_weight = sum([request['weight'] for request in G.config.requests])
+        log(f"  - Requests..: {cWhite(len(G.config.requests))} weighted requests - the keys not set are taken from the request above")
+        for request in G.config.requests:
+            log(f"      {cWhite('%5.1f%%'%(request['weight'] * 100 / total_weight))} {cWhite(request['name'])} - {request['method']} at {request['url']}")
+    if G.config.flow:
+        log(f"  - Flow......: {cWhite(len(G.config.flow))} steps sent in order by each {'virtual client' if G.config.engine == 'asyncio' else 'thread'} - the keys not set are taken from the request above")
+        for index, step in enumerate(G.config.flow):
+            extract = f" - extract {cWhite(', '.join(step['extract'].keys()))}" if step['extract'] else ''
+            think_time = f" - think time {cWhite(getThinkTimeText(step['think_time']))}" if step['think_time'][1] > 0 else ''
+            log(f"      {index+1}. {cWhite(step['name'])} - {step['method']} at {step['url']}{extract}{think_time}")
+    if G.config.assertions:
+        sample_rate = 'all the responses' if G.config.assertions_sample_rate >= 1.0 else f"{cWhite('%.1f%%'%(G.config.assertions_sample_rate*100))} of the responses"
+        log(f"  - Assertions: {cWhite(len(G.config.assertions))} checked on {sample_rate} with a success status code - failures counted as {cWhite(G.assertion_error_code)}")
+        for assertion in G.config.assertions:
+            log(f"      - {newResponseAssertion(assertion)[3]}")
 
     if G.config.method in ["GET","DELETE","PATCH"]:
         if G.config.post_data != {}:
@@ -362,9 +907,45 @@ def displayConfig():
     log(f"  - Timeout...: {cWhite('%.6f'%(G.config.timeout))} {getPluralString(G.config.timeout,'second','seconds',show_value_string=False)}"
         f"\t - Success Status Codes: {cWhite(','.join(map(str,G.config.success_status_codes)))}{cpu_affinity}")
 
-    tab = "\t" if G.config.threads < 10 else ""
-    number_of_threads = G.config.threads if len(G.thread_list) == 0 else len(G.thread_list)
-    log(f"  - Concurrent Threads: {cWhite(number_of_threads)} {tab}\t - Burst: {cWhite(G.config.burst)} \t\t- Interval between requests: {cWhite('%.6f'%(G.config.interval))} {getPluralString(G.config.interval,'second','seconds',show_value_string=False)}")
+    if G.config.engine in ['pooled','asyncio','pipeline']:
+        pool = G.config.connection_pool
+        max_requests = 'unlimited' if pool['max_requests'] == 0 else pool['max_requests']
+        if G.config.engine == 'pooled':
+            pool_size = f" - Pool size: {cWhite(pool['pool_size'])} per thread"
+        elif G.config.engine == 'pipeline':
+            pool_size = f" - Pipeline depth: {cWhite(G.config.pipeline_depth)}"
+        else:
+            pool_size = ''
+        log(f"  - Engine....: {cWhite(G.config.engine)}{pool_size} - Max requests/connection: {cWhite(max_requests)}"
+            f" - Max idle time: {cWhite('%.1f'%(pool['max_idle_time']))}s - TCP_NODELAY: {cWhite('on' if pool['tcp_nodelay'] else 'off')}")
+    else:
+        log(f"  - Engine....: {cWhite(G.config.engine)} - Read full body: {cWhite('on' if G.config.read_full_body else 'off')}")
+
+    if G.config.engine == 'asyncio':
+        concurrency_label, number_of_threads = "Virtual Clients...", G.config.clients
+    else:
+        concurrency_label = "Concurrent Threads"
+        number_of_threads = G.config.threads if len(G.thread_list) == 0 else len(G.thread_list)
+    if G.agents_addresses:
+        log(f"  - Remote Agents...: {cWhite(len(G.agents_addresses))} \t\t - {', '.join(G.agents_addresses)}")
+    if G.config.processes > 1:
+        log(f"  - Worker Processes: {cWhite(G.config.processes)} \t\t - The values below are per process{' (in each agent)' if G.agents_addresses else ''}")
+    tab = "\t" if number_of_threads < 10 else ""
+    if G.config.stages:
+        log(f"  - {concurrency_label}: {cWhite(number_of_threads)} {tab}\t - Load stages: {cWhite(len(G.config.stages))} "
+            f"({getTimeHumanReadable(time.monotonic()-sum([stage['duration'] for stage in G.config.stages]))}, {cWhite(G.config.arrival_distribution)} arrivals, total of all threads)")
+        for index, stage in enumerate(G.config.stages):
+            current = f" {cWhite('<')}" if G.stages_runner is not None and G.stages_runner.index == index else ''
+            log(f"      {index+1}. {describeStage(stage)}{current}")
+    elif G.config.replay_file != '':
+        log(f"  - {concurrency_label}: {cWhite(number_of_threads)} {tab}\t - Replay of the access log {cWhite(G.config.replay_file)} at {cWhite('%.2f'%(G.config.replay_speed))}x the original pace (open-loop)")
+    elif G.config.arrival_rate > 0:
+        log(f"  - {concurrency_label}: {cWhite(number_of_threads)} {tab}\t - Open-loop arrival rate: {cWhite('%.1f'%(G.config.arrival_rate))} req/sec ({cWhite(G.config.arrival_distribution)} arrivals, total of all threads)")
+    else:
+        if G.config.target_rps > 0:
+            log(f"  - Target....: {cWhite('%.0f'%(G.config.target_rps))} req/sec (threads, burst and interval adjusted automatically up to "
+                f"{cWhite(G.config.target_rps_max_concurrency)} {'virtual clients' if G.config.engine == 'asyncio' else 'threads'}{' per process' if G.config.processes > 1 else ''})")
+        log(f"  - {concurrency_label}: {cWhite(number_of_threads)} {tab}\t - Burst: {cWhite(G.config.burst)} \t\t- Interval between requests: {cWhite('%.6f'%(G.config.interval))} {getPluralString(G.config.interval,'second','seconds',show_value_string=False)}")
 
 ##################################################################################################################################
 ##################################################################################################################################
@@ -396,6 +977,8 @@ HTTP_STATUS_CODES = {"100":"Continue","101":"Switching Protocols",
                      "902":"Connection reset by peer",
                      "903":"Remote end closed connection without response",
                      "904":"Exceeded maximum redirects",
+                     "905":"Flow extraction failed",
+                     "906":"Assertion failed",
                      "999":"Unknown Error",
                      "32":"Broken Pipe"
                     }
@@ -421,54 +1004,301 @@ CONTENT_TYPES = {"javascript":"application/javascript", "json":"application/json
     #   #    ####   #     #       #   #     #    #        #
  ###    #    #  #   #    ###   ###    #    ###    ###  ###
 
-##──── class to store statistics about the elapsed time of the requests
+##──── class to store the elapsed times in a log-linear bucketed histogram (HdrHistogram style) with a fixed memory ─────────────
+##──── The values are recorded in microseconds with 'significant_digits' of precision up to 'max_value' seconds, the counts are
+##──── exact for the whole run and the histograms of the threads/processes are merged by adding their buckets.
 class classTimeStats:
-    def __init__(self, window_size=10000):
-        self.window_size = window_size
-        self.__times = deque(maxlen=window_size)
-        self.__sorted_times = []
+    def __init__(self, significant_digits=G.default_histogram_significant_digits, max_value=G.default_histogram_max_value):
+        self.significant_digits = significant_digits
+        self.max_value = max_value
+        self.__sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.__sub_bucket_half_bits = self.__sub_bucket_bits - 1
+        self.__max_value_usec = int(max_value * 1000000)
+        self.__max_index = self.__index(self.__max_value_usec)
+        self.reset()
 
-    def save(self, time_in_seconds: float):
-        if len(self.__times) == self.window_size:
-            old_time = self.__times.popleft()
-            self.__sorted_times.pop(bisect.bisect_left(self.__sorted_times, old_time))
+    def __index(self, value_usec: int) -> int:
+        bucket = max(0, value_usec.bit_length() - self.__sub_bucket_bits)
+        return (bucket << self.__sub_bucket_half_bits) + (value_usec >> bucket)
+
+    ##──── the highest value (in seconds) that is recorded in the same bucket of 'index'
+    def __value(self, index: int) -> float:
+        bucket = max(0, (index >> self.__sub_bucket_half_bits) - 1)
+        return (((index - (bucket << self.__sub_bucket_half_bits)) << bucket) + (1 << bucket) - 1) / 1000000
+
+    ##──── the buckets are allocated on demand up to the bucket of max_value, so the histograms of short elapsed times are small
+    def __grow(self, index: int):
+        size = min(self.__max_index + 1, ((index >> self.__sub_bucket_half_bits) + 1) << self.__sub_bucket_half_bits)
+        self.counts.frombytes(bytes(8 * (size - len(self.counts))))
 
-        self.__times.append(time_in_seconds)
-        bisect.insort(self.__sorted_times, time_in_seconds)
+    def save(self, time_in_seconds: float):
+        value_usec = min(max(0, int(time_in_seconds * 1000000)), self.__max_value_usec)
+        bucket = value_usec.bit_length() - self.__sub_bucket_bits
+        if bucket < 0:
+            bucket = 0
+        index = (bucket << self.__sub_bucket_half_bits) + (value_usec >> bucket)
+        try:
+            self.counts[index] += 1
+        except IndexError:
+            self.__grow(index)
+            self.counts[index] += 1
+        self.total += 1
+        self.sum += time_in_seconds
+        if time_in_seconds < self.__interval_min:
+            self.__interval_min = time_in_seconds
+            if time_in_seconds < self.__min:
+                self.__min = time_in_seconds
+        if time_in_seconds > self.__interval_max:
+            self.__interval_max = time_in_seconds
+            if time_in_seconds > self.__max:
+                self.__max = time_in_seconds
 
     def reset(self):
-        self.__times.clear()
-        self.__sorted_times.clear()
+        self.counts = array('Q') # grows on demand, so the histograms that are never used (ex: the phases) cost nothing
+        self.total, self.sum, self.__min, self.__max = 0, 0.0, math.inf, 0.0
+        self.__interval_min, self.__interval_max = math.inf, 0.0 # the min/max since the last drain()
+        self.__last_counts, self.__last_sum, self.__last_total = array('Q'), 0.0, 0
+
+    ##──── the buckets changed since the last call, sent by the worker processes and the agents to be merged in the main process
+    def drain(self) -> dict:
+        total = self.total
+        if total == self.__last_total: # nothing saved since the last call, the buckets are not copied and compared
+            return {'counts': [], 'sum': 0.0, 'min': None, 'max': None}
+        counts, total_sum, last_counts, changed = self.counts[:], self.sum, self.__last_counts, []
+        if len(last_counts) < len(counts):
+            last_counts.frombytes(bytes(8 * (len(counts) - len(last_counts))))
+        for start in range(0, len(counts), 64): # the chunks of buckets are compared in C, only the changed ones are walked
+            chunk, last_chunk = counts[start:start + 64], last_counts[start:start + 64]
+            if chunk != last_chunk:
+                changed.extend([[start + offset, count - last_count] for offset, (count, last_count) in enumerate(zip(chunk, last_chunk)) if count != last_count])
+        delta = {'counts': changed, 'sum': total_sum - self.__last_sum, 'min': None, 'max': None}
+        if changed:
+            delta['min'], delta['max'] = self.__interval_min, self.__interval_max
+        self.__last_counts, self.__last_sum, self.__last_total = counts, total_sum, total
+        self.__interval_min, self.__interval_max = math.inf, 0.0
+        return delta
+
+    def merge(self, delta: dict):
+        for index, amount in delta['counts']:
+            if index >= len(self.counts):
+                self.__grow(index)
+            self.counts[index] += amount
+            self.total += amount
+        self.sum += delta['sum']
+        if delta['min'] is not None:
+            self.__min = min(self.__min, delta['min'])
+            self.__max = max(self.__max, delta['max'])
 
     @property
     def min_time(self):
-        return min(self.__times) if self.__times else None
+        return self.__min if self.total > 0 else None
     @property
     def max_time(self):
-        return max(self.__times) if self.__times else None
+        return self.__max if self.total > 0 else None
     @property
     def avg_time(self):
-        if not self.__times:
+        if self.total == 0:
             return None
-        return sum(self.__times) / len(self.__times)
+        return self.sum / self.total
+
+    ##──── the values of many percentiles with a single walk over the buckets (the last bucket also counts the values above max_value)
+    def percentiles(self, percentiles: list) -> list:
+        if self.total == 0:
+            return [None for percentile in percentiles]
+        ranks = sorted([(max(1, math.ceil(self.total * percentile / 100)), position) for position, percentile in enumerate(percentiles)])
+        values, cumulative, next_rank = [self.__max] * len(percentiles), 0, 0
+        for index, count in enumerate(self.counts):
+            if count == 0:
+                continue
+            cumulative += count
+            while next_rank < len(ranks) and cumulative >= ranks[next_rank][0]:
+                values[ranks[next_rank][1]] = self.__max if index == self.__max_index else min(max(self.__value(index), self.__min), self.__max)
+                next_rank += 1
+            if next_rank == len(ranks):
+                break
+        return values
 
     def percentile(self, percentile):
-        if not self.__times:
-            return None
-        k = (len(self.__sorted_times) - 1) * percentile / 100
-        f = int(k)
-        c = f + 1
-        if f == c or c >= len(self.__sorted_times):
-            return self.__sorted_times[f]
-        return self.__sorted_times[f] * (c - k) + self.__sorted_times[c] * (k - f)
+        return self.percentiles([percentile])[0]
+
+    ##──── the amount of values lower or equal to each limit in seconds (sorted), with the precision of the buckets
+    def cumulative_counts(self, limits: list) -> list:
+        counts, cumulative, start = [], 0, 0
+        for limit in limits:
+            end = min(self.__index(int(limit * 1000000)), self.__max_index) + 1
+            cumulative += sum(self.counts[start:end]) if end > start else 0
+            counts.append(cumulative)
+            start = max(start, end)
+        return counts
 
     def stats(self):
+        pct50, pct75, pct90, pct99, pct999, pct9999 = self.percentiles([50, 75, 90, 99, 99.9, 99.99])
         return {
             "min": '%.6f'%self.min_time, "avg": '%.6f'%self.avg_time, "max": '%.6f'%self.max_time,
-            "50pct": '%.6f'%self.percentile(50), "75pct": '%.6f'%self.percentile(75),
-            "90pct": '%.6f'%self.percentile(90), "99pct": '%.6f'%self.percentile(99)
+            "50pct": '%.6f'%pct50, "75pct": '%.6f'%pct75, "90pct": '%.6f'%pct90, "99pct": '%.6f'%pct99,
+            "99.9pct": '%.6f'%pct999, "99.99pct": '%.6f'%pct9999
         }
 
+##──── class to store the elapsed times and also the elapsed times of the current load stage (when "stages" are configured)
+class classStagedTimeStats(classTimeStats):
+    def __init__(self, significant_digits=G.default_histogram_significant_digits, max_value=G.default_histogram_max_value):
+        super().__init__(significant_digits=significant_digits, max_value=max_value)
+        self.stage_stats = classTimeStats(significant_digits=significant_digits, max_value=max_value)
+
+    def save(self, time_in_seconds: float):
+        super().save(time_in_seconds)
+        self.stage_stats.save(time_in_seconds)
+
+    def merge(self, delta: dict):
+        super().merge(delta)
+        self.stage_stats.merge(delta)
+
+    def new_stage(self) -> classTimeStats:
+        finished_stage_stats, self.stage_stats = self.stage_stats, classTimeStats(significant_digits=self.significant_digits, max_value=self.max_value)
+        return finished_stage_stats
+
+##──── class to store the average elapsed time of the requests by their position in the pipeline ('pipeline' engine)
+class classPipelineStats:
+    def __init__(self, depth: int):
+        self._lock = threading.Lock()
+        self.depth = depth
+        self.reset()
+
+    def save(self, elapsed_times: list):
+        with self._lock:
+            for position, elapsed_time in enumerate(elapsed_times):
+                self.counts[position] += 1
+                self.sums[position] += elapsed_time
+
+    def merge(self, deltas: list):
+        with self._lock:
+            for position, (amount, elapsed_time) in enumerate(zip(*deltas)):
+                self.counts[position] += amount
+                self.sums[position] += elapsed_time
+
+    def reset(self):
+        with self._lock:
+            self.counts, self.sums = [0] * self.depth, [0.0] * self.depth
+        return True
+
+    def asdeltas(self) -> list:
+        with self._lock:
+            return [list(self.counts), list(self.sums)]
+
+    def averages(self) -> list:
+        with self._lock:
+            return [(elapsed_time / amount) if amount > 0 else 0.0 for amount, elapsed_time in zip(self.counts, self.sums)]
+
+##──── class to store the cpu time spent by StressAnAPI (the client side) to make the requests
+class classClientCPUStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def add(self, cpu_time_ns: int, requests: int):
+        with self._lock:
+            self.cpu_time_ns += cpu_time_ns
+            self.requests += requests
+
+    def reset(self):
+        with self._lock:
+            self.cpu_time_ns, self.requests = 0, 0
+        return True
+
+    def asdeltas(self) -> list:
+        with self._lock:
+            return [self.cpu_time_ns, self.requests]
+
+    @property
+    def usec_per_request(self) -> float:
+        with self._lock:
+            return (self.cpu_time_ns / self.requests / 1000) if self.requests > 0 else 0.0
+
+##──── class to store the bytes received (the bodies of the responses) and sent (the requests), and the time spent reading the
+##──── bodies of the responses drained by "read_full_body", to calculate the download throughput
+class classBandwidthStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def add(self, bytes_in: int, bytes_out: int, transfer_bytes: int = 0, transfer_ns: int = 0):
+        with self._lock:
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.transfer_bytes += transfer_bytes
+            self.transfer_ns += transfer_ns
+
+    def reset(self):
+        with self._lock:
+            self.bytes_in, self.bytes_out, self.transfer_bytes, self.transfer_ns = 0, 0, 0, 0
+            self.__last_rates = [time.monotonic(), 0, 0]
+        return True
+
+    def asdeltas(self) -> list:
+        with self._lock:
+            return [self.bytes_in, self.bytes_out, self.transfer_bytes, self.transfer_ns]
+
+    ##──── the bytes/sec received and sent since the last call, like the requests/sec of AtomicAverageCounter.get_average()
+    def get_rates(self) -> list:
+        with self._lock:
+            now, (last_time, last_bytes_in, last_bytes_out) = time.monotonic(), self.__last_rates
+            elapsed = max(now - last_time, 0.000001)
+            self.__last_rates = [now, self.bytes_in, self.bytes_out]
+            return [(self.bytes_in - last_bytes_in) / elapsed, (self.bytes_out - last_bytes_out) / elapsed]
+
+    @property
+    def download_throughput(self) -> float:
+        with self._lock:
+            return (self.transfer_bytes * 1000000000 / self.transfer_ns) if self.transfer_ns > 0 else 0.0
+
+##──── The time of each phase of a request in nanoseconds, measured by laps of perf_counter_ns(): a phase ends at the lap with its
+##──── name and starts at the end of the previous one. The phases that did not happen (ex: dns, connect and tls on a reused
+##──── connection) stay at 0. The "ttfb" ends when the status line and the headers are received and the "transfer" when the body is read.
+class classRequestPhases:
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.values, self.mark = dict.fromkeys(G.request_phases,0), time.perf_counter_ns()
+
+    ##──── the next response of a pipeline starts where the previous one ended
+    def clear(self):
+        self.values = dict.fromkeys(G.request_phases,0)
+
+    def lap(self, phase: str):
+        now = time.perf_counter_ns()
+        self.values[phase], self.mark = now - self.mark, now
+
+    def text(self) -> str:
+        return ' '.join([f"{phase} {'%.6f'%(value / 1000000000)}" for phase,value in self.values.items() if value > 0])
+
+##──── class to store a histogram of the elapsed time of each phase of the requests (see classRequestPhases)
+class classPhaseStats:
+    def __init__(self):
+        self.time_stats = {phase:newTimeStats() for phase in G.request_phases}
+
+    def save(self, phases: classRequestPhases):
+        for phase, value in phases.values.items():
+            if value > 0:
+                self.time_stats[phase].save(value / 1000000000)
+
+    ##──── the changes since the last call, only of the phases with new requests
+    def drain(self) -> dict:
+        deltas = {phase:time_stats.drain() for phase,time_stats in self.time_stats.items()}
+        return {phase:delta for phase,delta in deltas.items() if delta['counts']}
+
+    def merge(self, deltas: dict):
+        for phase, delta in deltas.items():
+            self.time_stats[phase].merge(delta)
+
+    def reset(self):
+        [time_stats.reset() for time_stats in self.time_stats.values()]
+        return True
+
+    @property
+    def total(self) -> int:
+        return sum([time_stats.total for time_stats in self.time_stats.values()])
+
 ##──── class to store statistics about the returned status codes
 class classHttpStats:
     def __init__(self):
@@ -484,6 +1314,11 @@ class classHttpStats:
         with self._lock:
             self._dict[status_code] = self._dict.get(status_code, 0) + 1
 
+    def merge(self, status_codes: Dict):
+        with self._lock:
+            for status_code, amount in status_codes.items():
+                self._dict[status_code] = self._dict.get(status_code, 0) + amount
+
     def reset(self):
         with self._lock:
             self._dict.clear()
@@ -508,6 +1343,114 @@ class classHttpStats:
     def values(self) -> Dict:
         return {k: v for k, v in self._dict.items() if v > 0}
 
+##──── class to store the statistics of a single request thread (or event loop), so the threads don't contend on shared locks
+##──── Only the owner thread writes on it, and collectStatsShards() merges the changes since the last merge into the global stats.
+class classStatsShard:
+    def __init__(self, time_stats, lag_stats):
+        self.http_stats = classHttpStats()
+        self.time_stats = time_stats
+        self.lag_stats = lag_stats
+        self.client_cpu = classClientCPUStats()
+        self.bandwidth = classBandwidthStats()
+        self.phase_stats = classPhaseStats()
+        self.finished = False
+        self.sent = 0
+        self.patterns = {}
+        self.__last_sent = 0
+        self.__last_status_codes = {}
+        self.__last_client_cpu = [0,0]
+        self.__last_bandwidth = [0,0,0,0]
+
+    ##──── the changes since the last call, in the same format of the statistics sent by the worker processes
+    def drain(self) -> dict:
+        sent, status_codes, client_cpu, bandwidth = self.sent, dict(self.http_stats.asdict), self.client_cpu.asdeltas(), self.bandwidth.asdeltas()
+        delta_status_codes = {key:val - self.__last_status_codes.get(key,0) for key,val in status_codes.items() if val != self.__last_status_codes.get(key,0)}
+        delta = {'requests': sum(delta_status_codes.values()), 'status_codes': delta_status_codes,
+                 'times': self.time_stats.drain(), 'lags': self.lag_stats.drain(),
+                 'client_cpu': [val - last_val for val,last_val in zip(client_cpu,self.__last_client_cpu)],
+                 'bandwidth': [val - last_val for val,last_val in zip(bandwidth,self.__last_bandwidth)]}
+        delta['in_flight'] = (sent - self.__last_sent) - delta['requests']
+        if self.patterns and (pattern_deltas := drainPatternStats(self.patterns)):
+            delta['patterns'] = pattern_deltas
+        if (phase_deltas := self.phase_stats.drain()):
+            delta['phases'] = phase_deltas
+        self.__last_sent, self.__last_status_codes, self.__last_client_cpu, self.__last_bandwidth = sent, status_codes, client_cpu, bandwidth
+        return delta
+
+    def save_pattern(self, pattern: str, status_code: int, time_in_seconds: float):
+        getPatternStats(self.patterns,pattern).save(status_code,time_in_seconds)
+
+##──── class to store the statistics of the requests of one method+path pattern of the "scenario_file"
+class classPatternStats:
+    def __init__(self):
+        self.http_stats = classHttpStats()
+        self.time_stats = newTimeStats()
+        self.__last_status_codes = {}
+
+    def save(self, status_code: int, time_in_seconds: float):
+        self.http_stats.save(status_code)
+        self.time_stats.save(time_in_seconds)
+
+    def drain(self) -> dict:
+        status_codes = dict(self.http_stats.asdict)
+        delta = {'status_codes': {key:val - self.__last_status_codes.get(key,0) for key,val in status_codes.items() if val != self.__last_status_codes.get(key,0)},
+                 'times': self.time_stats.drain()}
+        self.__last_status_codes = status_codes
+        return delta
+
+    def merge(self, delta: dict):
+        self.http_stats.merge(delta['status_codes'])
+        self.time_stats.merge(delta['times'])
+
+    @property
+    def requests(self) -> int:
+        return sum(self.http_stats.asdict.values())
+    @property
+    def errors(self) -> int:
+        return sum([amount for code,amount in self.http_stats.asdict.items() if code not in G.config.success_status_codes])
+
+##──── The patterns above "scenario_max_patterns" are kept together, so the urls that are not normalized don't use unbounded memory
+def getPatternStats(patterns: dict, pattern: str) -> classPatternStats:
+    pattern_stats = patterns.get(pattern)
+    if pattern_stats is None:
+        if len(patterns) >= G.scenario_max_patterns:
+            pattern = G.scenario_other_pattern
+        pattern_stats = patterns.get(pattern) or patterns.setdefault(pattern,classPatternStats())
+    return pattern_stats
+
+def drainPatternStats(patterns: dict) -> dict:
+    deltas = {pattern:pattern_stats.drain() for pattern,pattern_stats in list(patterns.items())}
+    return {pattern:delta for pattern,delta in deltas.items() if delta['status_codes'] or delta['times']['counts']}
+
+##──── class to store statistics about the persistent connections of the 'pooled' engine
+class classConnectionStats:
+    def __init__(self):
+        self.opened = AtomicCounter()
+        self.closed = AtomicCounter()
+        self.reset()
+
+    def reset(self):
+        ##──── opened/closed are never reset because they are used to calculate the current open connections
+        self.requests = AtomicCounter()
+        self.reused = AtomicCounter()
+        self.reconnects = AtomicCounter()
+        return True
+
+    def asdeltas(self) -> list:
+        return [self.requests.value, self.reused.value, self.reconnects.value, self.opened.value, self.closed.value]
+
+    def merge(self, deltas: list):
+        for atomic_counter, amount in zip([self.requests, self.reused, self.reconnects, self.opened, self.closed], deltas):
+            atomic_counter.add(amount)
+
+    @property
+    def open_connections(self) -> int:
+        return self.opened.value - self.closed.value
+    @property
+    def reuse_ratio(self) -> float:
+        requests = self.requests.value
+        return (self.reused.value * 100 / requests) if requests > 0 else 0.0
+
 ##################################################################################################################################
 ##################################################################################################################################
 
@@ -711,6 +1654,66 @@ class elapsedTimer:
         self.time = None
         return timer_string if with_brackets else timer_string[1:-1]
 
+##──── Sleeps until the deadline (a time.monotonic() value) - time.sleep() is used until the last G.spin_threshold seconds ──────────
+##──── and then it spins, yielding the GIL to the other threads, to honour sub-millisecond inter-arrival times.
+def sleepUntil(deadline:float):
+    remaining = deadline - time.monotonic()
+    if remaining > G.spin_threshold:
+        time.sleep(remaining - G.spin_threshold)
+    while time.monotonic() < deadline:
+        time.sleep(0)
+
+##──── Open-loop scheduler: gives the intended send time of the next request on a fixed or poisson arrival timeline ─────────────
+##──── The timeline does not depend on the response times, so a slow server does not reduce the offered load.
+class classArrivalScheduler:
+    def __init__(self,rate:float,distribution:str='fixed',start_offset:float=0.0):
+        self._lock = threading.Lock()
+        self.distribution = distribution
+        self.rate, self.mean_interval = rate, 1.0 / rate
+        self.timeline = (1.0,0.0) # (scale,shift): the real time of a slot is scale * slot + shift
+        self.next_origin = time.monotonic() + start_offset
+
+    ##──── a slot is a time of the timeline at the first rate, and a new rate rescales the timeline from now, so the slots already given
+    ##──── to the waiting threads follow the new rate too (ex: a ramp from 0 req/sec doesn't wait the long interval of its first slots)
+    def set_rate(self,rate:float):
+        with self._lock:
+            current_time = time.monotonic()
+            scale, shift = self.timeline
+            new_scale = scale * self.rate / rate
+            self.timeline = (new_scale,current_time - new_scale * (current_time - shift) / scale)
+            self.rate = rate
+
+    def slot_time(self,slot:float)->float:
+        scale, shift = self.timeline
+        return scale * slot + shift
+
+    def next_slot(self)->float:
+        with self._lock:
+            slot = self.next_origin
+            self.next_origin += random.expovariate(1.0 / self.mean_interval) if self.distribution == 'poisson' else self.mean_interval
+            return slot
+
+    ##──── waits by steps of G.slot_retime_interval seconds, so a new rate moves the slot, and gives its intended time
+    def wait_slot(self,slot:float)->float:
+        while (remaining := self.slot_time(slot) - time.monotonic()) > G.slot_retime_interval:
+            time.sleep(min(remaining,G.slot_retime_interval))
+        intended_time = self.slot_time(slot)
+        sleepUntil(intended_time)
+        return intended_time
+
+    async def wait_slot_async(self,slot:float)->float:
+        while (remaining := self.slot_time(slot) - time.monotonic()) > G.slot_retime_interval:
+            await asyncio.sleep(min(remaining,G.slot_retime_interval))
+        intended_time = self.slot_time(slot)
+        await asyncio.sleep(max(0.0,intended_time - time.monotonic()))
+        return intended_time
+
+    ##──── after a pause, the timeline starts again from now instead of sending all the requests of the paused period
+    def restart(self):
+        with self._lock:
+            scale, shift = self.timeline
+            self.next_origin = max(self.next_origin,(time.monotonic() - shift) / scale)
+
 ##──── A decorator for cache with TTL - pip install cachettl ─────────────────────────────────────────────────────────────────────
 def cachettl(ttl=60, maxsize=None, typed=False):
     """A minimal version of cachettl decorator without methods cache_info() and cache_clear()"""
@@ -783,6 +1786,8 @@ class AtomicCounter:
         self._counter_access = itertools.count()
     def incr(self): # Increment the counter +1
         return next(self._counter)
+    def add(self,amount:int): # Increment the counter +amount (not atomic, use it from only one thread)
+        self._counter = itertools.count(next(self._counter)+amount)
     def reset(self):
         self._counter = itertools.count(self.start_number)
         self._counter_access = itertools.count()
@@ -812,6 +1817,7 @@ class AtomicAverageCounter:
     def start(self):
         self.__last_time = time.monotonic()
         self.mark = self.__mark
+        self.mark_many = self.__mark_many
         self.get_average = self.__get_average
         self.reset = self.__reset
         self.time_sum = 0.0
@@ -832,6 +1838,14 @@ class AtomicAverageCounter:
             self.time_sum += delta
             self.counter += 1
 
+    def mark_many(self,amount:int):...
+    def __mark_many(self,amount:int):
+        with self.__lock:
+            now = time.monotonic()
+            self.time_sum += now - self.__last_time
+            self.__last_time = now
+            self.counter += amount
+
     def get_average(self)->list:return [0.0, 0.0]
     def __get_average(self)->list:
         try:
@@ -907,6 +1921,21 @@ def int2ipv6(iplong):
     """Convert an integer to IPv6"""
     return socket.inet_ntop(socket.AF_INET6, binascii.unhexlify(hex(iplong)[2:].zfill(32)))
 
+##──── The values of the template variables %%randomipv4%%, %%randomipv6%%, %%randomprivateipv4%% and %%randomint:min:max%% ────
+def randomIPv4()->str:
+    return int2ipv4(random.randint(16777216,3758096383))
+
+def randomIPv6()->str:
+    return ':'.join([f'{random.randint(0, 0xffff):04x}' for _ in range(8)])
+
+def randomPrivateIPv4()->str:
+    return int2ipv4(random.choice([random.randint(167772160,184549375),random.randint(3232235520,3232301055),random.randint(2886729728,2887778303)]))
+
+##──── random.random() is about 2x faster than random.randint(), that is the most used variable
+def randomIntGenerator(val_min:int,val_max:int):
+    span, get_random = val_max - val_min + 1, random.random
+    return lambda: str(val_min + int(get_random() * span))
+
 def isValidIPv4(ipv4_address):
     """Try to convert the given ipv4_address to integer, if it fails, is invalid ;-)"""
     try:
@@ -1150,6 +2179,16 @@ def getTimeHumanReadable(start_time):
 ##──── Format a number like 123456789 into 123.456.789 ───────────────────────────────────────────────────────────────────────────
 def formatNumber(number):
     return '{:,d}'.format(number).replace(',','.')
+##──── Format a number of bytes like 1536 into 1.50 KiB ────────────────────────────────────────────────────────────────────────
+def getBytesHumanReadable(number_of_bytes)->str:
+    for unit in ['B','KiB','MiB','GiB']:
+        if number_of_bytes < 1024 or unit == 'GiB':
+            return f"{'%.0f'%(number_of_bytes)} {unit}" if unit == 'B' else f"{'%.2f'%(number_of_bytes)} {unit}"
+        number_of_bytes /= 1024
+##──── Stops the application from any thread (end of the stages, --duration): the main thread waits for G.event_quit, or polls it
+##──── between the keys, and exits with quit() like the ESC key, so the report is written and the thresholds are checked
+def requestQuit():
+    G.event_quit.set()
 ##──── To make asyncio/thread stop on first CTRL+C ───────────────────────────────────────────────────────────────────────────────
 def receivedSignalSTOP(signalSTOP, frame:str=''):
     try:
@@ -1157,7 +2196,8 @@ def receivedSignalSTOP(signalSTOP, frame:str=''):
         G.event_quit.set()
     finally:
         cursor.show()
-        os.system('stty sane')
+        if os.isatty(0): # the stdin is not a terminal in headless mode (CI pipelines)
+            os.system('stty sane')
         sys.exit(0)
 ##──── INTERCEPT THE BROKEN PIPE SIGNAL AND DON'T LET THE APPLICATION CRASH ──────────────────────────────────────────────────────
 def received_SIGPIPE(signalPIPE,frame=""):
@@ -1254,19 +2294,29 @@ def logDebugSyslog(message:str="",end:str="\n"):
     G.logger.debug(stripColor(message))
 
 def logEmpty(message:str="",end:str="\n"):pass
-def logResponseEmpty(text_id,method,url,response_code,response_body,elapsed_time):pass
-def logResponseSyslog(text_id,method,url,response_code,response_body,elapsed_time):
-    G.logger.info(f"{G.middot} {text_id} {method} {url} - {stripColor(getFormattedStatusCode(response_code))} {response_body.strip()} {elapsed_time}")
+def logResponseEmpty(text_id,method,url,response_code,response_body,elapsed_time,phases=None):pass
+def logResponseSyslog(text_id,method,url,response_code,response_body,elapsed_time,phases=None):
+    G.logger.info(f"{G.middot} {text_id} {method} {url} - {stripColor(getFormattedStatusCode(response_code))} {response_body.strip()} {elapsed_time}{'' if phases is None else ' ' + phases.text()}")
 
 # @showElapsedTimeAverageDecorator(window_size=5000)
-def logResponse(text_id,method,url,response_code,response_body,elapsed_time):pass
+def logResponse(text_id,method,url,response_code,response_body,elapsed_time,phases=None):pass
 # @showElapsedTimeAverageDecorator(window_size=5000)
-def _logResponse(text_id,method,url,response_code,response_body,elapsed_time):
+def _logResponse(text_id,method,url,response_code,response_body,elapsed_time,phases=None):
     with lock:
-        log(f"{G.middot} {text_id} {method} {url} - {getFormattedStatusCode(response_code)} {elapsed_time}")
-def _logResponseBody(text_id,method,url,response_code,response_body,elapsed_time):
+        log(f"{G.middot} {text_id} {method} {url} - {getFormattedStatusCode(response_code)} {elapsed_time}{'' if phases is None else ' ' + cGrey(phases.text())}")
+def _logResponseBody(text_id,method,url,response_code,response_body,elapsed_time,phases=None):
     with lock:
-        log(f"{G.middot} {text_id} {method} {url} - {getFormattedStatusCode(response_code)} {cDarkYellow(response_body.strip())} {elapsed_time}")
+        log(f"{G.middot} {text_id} {method} {url} - {getFormattedStatusCode(response_code)} {cDarkYellow(response_body.strip())} {elapsed_time}{'' if phases is None else ' ' + cGrey(phases.text())}")
+
+##──── Changes the function used to display each request (keys V and B) ──────────────────────────────────────────────────────────
+def setViewMode(view_mode:str):
+    G.view_mode = view_mode
+    if view_mode == 'body':
+        logResponse.__code__ = _logResponseBody.__code__
+    elif view_mode == 'response':
+        logResponse.__code__ = _logResponse.__code__
+    else:
+        logResponse.__code__ = logResponseEmpty.__code__
 
 ##──── Returns the current date time to be used with log to stdout functions ─────────────────────────────────────────────────────
 def getLogDateEmpty():return ""
@@ -1500,6 +2550,11 @@ def readKey():
     tty.setcbreak(sys.stdin.fileno())
     try:
         while True:
+            ##──── the keys are polled to stop the application when another thread requests it (see requestQuit)
+            if not select.select([sys.stdin],[],[],G.key_poll_interval)[0]:
+                if G.event_quit.is_set():
+                    return 'quit'
+                continue
             b = os.read(sys.stdin.fileno(), 3).decode()
             # print(repr(b))
             if len(b) == 3:
@@ -1538,13 +2593,13 @@ def readKey():
 
 def pause():
     if G.event_pause.is_set():
-        counterAverage.reset()
+        resetRequestRate()
         log(cGrey(line.middot1s))
         log(f">>> {cWhite(f'Resuming the application after {getTimeHumanReadable(G.event_pause_time)}')}")
         log(cGrey(line.middot1s))
         G.event_pause.clear()
     else:
-        counterAverage.reset()
+        resetRequestRate()
         G.event_pause_time = time.monotonic()
         log(cGrey(line.middot1s))
         log(f">>> {cWhite('PAUSE requested!')}")
@@ -1554,23 +2609,69 @@ def pause():
 def keyMemInfo():
     log(f">>> {__appname__} Memory usage: {memoryInfo.rss()} MiB - CPU usage: {cpuInfo.usage()}%")
 
+def changeVirtualClients(increase:bool):
+    step = max(1,G.config.clients // 10)
+    G.config.clients = G.config.clients + step if increase else max(1,G.config.clients - step)
+    if not runsRemoteWorkers():
+        G.thread_list[0].set_clients(G.config.clients)
+    arrow = G.bold_right if increase else G.bold_left
+    log(f"  {arrow} {'Increasing' if increase else 'Decreasing'} the virtual clients to {cWhite(G.config.clients)}... (step of {step})")
+
+##──── In open-loop mode the arrow keys up/down change the arrival rate (the total of all threads/processes) in steps of 10%
+def changeArrivalRate(increase:bool):
+    if G.config.replay_file != '': # the keys change the speed of the replay of the access log
+        setReplaySpeed(round(G.config.replay_speed * (1.1 if increase else 0.9),4))
+        arrow = G.light_down if increase else G.light_up
+        return log(f"  {arrow} {'Increasing' if increase else 'Decreasing'} the speed of the replay to {cWhite('%.2f'%(G.config.replay_speed))}x the original pace")
+    if G.stages_runner is not None: # the keys don't stop the stages, they change a factor applied over the rate of the stages
+        G.stage_rate_factor = round(G.stage_rate_factor * (1.1 if increase else 0.9),4)
+        arrow = G.light_down if increase else G.light_up
+        return log(f"  {arrow} {'Increasing' if increase else 'Decreasing'} the rate of the stages to {cWhite('%.0f'%(G.stage_rate_factor*100))}% of the configured rate")
+    limit_reached = '(faster)' if increase else '(slower)'
+    arrival_rate = G.config.arrival_rate * (1.1 if increase else 0.9)
+    if arrival_rate < 1.0:
+        arrival_rate, limit_reached = 1.0, '(limit reached!)'
+    setArrivalRate(arrival_rate)
+    arrow = G.light_down if increase else G.light_up
+    log(f"  {arrow} {'Increasing' if increase else 'Decreasing'} the arrival rate to {cWhite('%.1f'%(G.config.arrival_rate))} req/sec {limit_reached}")
+
+def setArrivalRate(arrival_rate:float):
+    G.config.arrival_rate = arrival_rate
+    if G.arrival_scheduler is not None:
+        G.arrival_scheduler.set_rate(arrival_rate / getLoadGenerators())
+
 def increaseThreads():
-    ThreadMakeRequests = threadMakeRequestsURLLib(timeStats=timeStats,httpStats=httpStats)
-    ThreadMakeRequests.setDaemon(False)
-    G.thread_list.append(ThreadMakeRequests)
-    ThreadMakeRequests.start()
-    log(f"  {G.bold_right} Creating one more thread... {getPluralString(len(G.thread_list),'thread','threads')} currently running")
+    if G.config.engine == 'asyncio':
+        return changeVirtualClients(increase=True)
+    if runsRemoteWorkers():
+        G.config.threads += 1
+        return log(f"  {G.bold_right} Creating one more thread per worker process... {getPluralString(G.config.threads,'thread','threads')} per process")
+    with G.thread_list_lock:
+        ThreadMakeRequests = newRequestThread()
+        ThreadMakeRequests.setDaemon(False)
+        G.thread_list.append(ThreadMakeRequests)
+        ThreadMakeRequests.start()
+        number_of_threads = len(G.thread_list)
+    log(f"  {G.bold_right} Creating one more thread... {getPluralString(number_of_threads,'thread','threads')} currently running")
 
 def decreaseThreads():
-    if len(G.thread_list) == 1:
-        unique_thread = G.thread_list[0]
-        thread_name,thread_id = unique_thread.identify()
-        log(f"  {G.light_circle} There is only 1 thread running ({thread_name} pid:{thread_id})... can't join it.")
-    else:
+    if G.config.engine == 'asyncio':
+        return changeVirtualClients(increase=False)
+    if runsRemoteWorkers():
+        if G.config.threads == 1:
+            return log(f"  {G.light_circle} There is only 1 thread running per worker process... can't join it.")
+        G.config.threads -= 1
+        return log(f"  {G.bold_left} Joining one thread per worker process... {getPluralString(G.config.threads,'thread','threads')} per process")
+    with G.thread_list_lock:
+        if len(G.thread_list) == 1:
+            unique_thread = G.thread_list[0]
+            thread_name,thread_id = unique_thread.identify()
+            return log(f"  {G.light_circle} There is only 1 thread running ({thread_name} pid:{thread_id})... can't join it.")
         thread_to_join = G.thread_list[0]
         thread_name,thread_id = thread_to_join.join()
         G.thread_list.pop(0)
-        log(f"  {G.bold_left} Joining thread '{thread_name}' pid:{thread_id}... {getPluralString(len(G.thread_list),'thread','threads')} currently running")
+        number_of_threads = len(G.thread_list)
+    log(f"  {G.bold_left} Joining thread '{thread_name}' pid:{thread_id}... {getPluralString(number_of_threads,'thread','threads')} currently running")
 
 def increaseTimeout():
     limit_reached = ''
@@ -1609,6 +2710,8 @@ def decreaseTimeout():
     log(f"  - Decreasing the request timeout to %.6f sec {limit_reached}"%(G.config.timeout))
 
 def increaseInterval():
+    if G.config.arrival_rate > 0 or G.config.replay_file != '':
+        return changeArrivalRate(increase=False)
     limit_reached = '(slower)'
     G.config.interval = round(G.config.interval, 5)
     if G.config.interval >= 5.0:
@@ -1627,6 +2730,8 @@ def increaseInterval():
     log(f"  {G.light_up} Increasing the interval between requests to %.6f sec {limit_reached}" % (G.config.interval))
 
 def decreaseInterval():
+    if G.config.arrival_rate > 0 or G.config.replay_file != '':
+        return changeArrivalRate(increase=True)
     limit_reached = '(faster)'
     G.config.interval = round(G.config.interval, 5)
     if G.config.interval > 0.1:
@@ -1660,9 +2765,22 @@ def decreaseBurst():
         limit_reached = '(limit reached!)'
     log(f"  {G.light_left} Decreasing the burst of requests to {getPluralString(G.config.burst,'request','requests')} {limit_reached}")
 
+##──── Restarts the average of requests/sec, merging the shards before so their pending requests stay out of the new average
+def resetRequestRate():
+    collectStatsShards()
+    counterAverage.reset()
+
 def resetStats():
+    collectStatsShards()
     httpStats.reset()
     timeStats.reset()
+    lagStats.reset()
+    connStats.reset()
+    pipelineStats.reset()
+    clientCPUStats.reset()
+    bandwidthStats.reset()
+    phaseStats.reset()
+    patternStats.clear()
     counter.reset()
     counterAverage.reset_counter()
     log(cGrey(line.middot1s))
@@ -1676,17 +2794,30 @@ def displayCurrentConfiguration():
     displayConfig()
     log(line.single)
 
+##──── the controller of --target-rps reads (and resets) counterAverage every second, so the displays read its last value instead
+def getRequestsPerSec()->float:
+    if G.target_rps_controller is not None:
+        return G.target_rps_controller.achieved_rps
+    return counterAverage.get_average()[0]
+
 def displayAverageTimeStats():
     if G.event_pause.is_set():
         log(f">>> Average: 0 requests/sec (PAUSED)")
     else:
-        requests_per_sec, sec_per_requests = counterAverage.get_average()
-        log(f">>> Average {'%.0f'%(requests_per_sec)} req/sec - Min/Avg/Max: {'%.6f'%(timeStats.min_time)}/{'%.6f'%(timeStats.avg_time)}/{'%.6f'%(timeStats.max_time)} - Total: {counter.value} reqs")
+        collectStatsShards()
+        requests_per_sec = getRequestsPerSec()
+        dispatch_lag = f" - Dispatch lag avg: {'%.6f'%(lagStats.avg_time or 0.0)}" if G.config.arrival_rate > 0 or G.config.replay_file != '' else ""
+        if G.target_rps_controller is not None:
+            dispatch_lag = f" - Target: {'%.0f'%(G.config.target_rps)} req/sec"
+        bytes_in_per_sec, bytes_out_per_sec = bandwidthStats.get_rates()
+        log(f">>> Average {'%.0f'%(requests_per_sec)} req/sec - In/Out: {getBytesHumanReadable(bytes_in_per_sec)}/s / {getBytesHumanReadable(bytes_out_per_sec)}/s - "
+            f"Min/Avg/Max: {'%.6f'%(timeStats.min_time)}/{'%.6f'%(timeStats.avg_time)}/{'%.6f'%(timeStats.max_time)} - Total: {counter.value} reqs{dispatch_lag}")
 
 def displayFullHttpStats():
     def remove9XXFromString(col_str): # remove errors 900 used by internal control
         return "###"+col_str[3:] if col_str.startswith('9') else col_str
     try:
+        collectStatsShards()
         with lock:
             log(line.single)
             log(f">>> {cWhite('Statistics of Success vs. Errors:')}")
@@ -1699,10 +2830,13 @@ def displayFullHttpStats():
             success = [val for key,val in httpStats.asdict.items() if key in G.config.success_status_codes]
             errors400 = [val for key,val in httpStats.asdict.items() if key >= 400 and key < 500]
             errors500 = [val for key,val in httpStats.asdict.items() if key >= 500 and key < 600]
-            conn_errors = [val for key,val in httpStats.asdict.items() if key >= 900]
+            conn_errors = [val for key,val in httpStats.asdict.items() if key >= 900 and key != G.assertion_error_code]
+            assertion_errors = [val for key,val in httpStats.asdict.items() if key == G.assertion_error_code]
             # print(sum(success),sum(errors),sum(conn_errors))
             x = [sum(success),sum(errors400),sum(errors500),sum(conn_errors)]
             y = ['Success','HTTP 4XX errors','HTTP 5XX errors','Connection errors']
+            if G.config.assertions: # the successful responses that failed an assertion
+                x, y = x + [sum(assertion_errors)], y + ['Assertion failures']
             a_chart = statChart().bar(x,y,width=(max_size//3)*2,with_percent=True, with_value=True).splitlines()
             [log(f"         {line}") for line in a_chart]
             log(line.middot1s)
@@ -1717,16 +2851,87 @@ def displayFullHttpStats():
                 col1_str = f"{col1_key}: {stats[col1_key]}" if col1_key else ''
                 col2_str = f"{col2_key}: {stats[col2_key]}" if col2_key else ''
                 log(f"      {remove9XXFromString(col1_str):<{max_col_size}} {remove9XXFromString(col2_str)}")
+            if G.config.engine in ['pooled','asyncio','pipeline']:
+                log(line.middot1s)
+                log(f">>> {cWhite('Statistics of the persistent connections:')}")
+                log("")
+                log(f"      Requests: {connStats.requests.value} - Reused connections: {connStats.reused.value} ({'%.2f'%(connStats.reuse_ratio)}%) "
+                    f"- Reconnects: {connStats.reconnects.value} - Open connections: {connStats.open_connections} (opened {connStats.opened.value} in total)")
+            if G.config.engine == 'pipeline':
+                log(line.middot1s)
+                log(f">>> {cWhite(f'Statistics of the pipeline (depth {pipelineStats.depth}) - average elapsed time by position:')}")
+                log("")
+                positions = "  ".join([f"#{position+1}: {'%.6f'%(average)}" for position, average in enumerate(pipelineStats.averages())])
+                [log(f"      {line}") for line in textwrap.wrap(positions, max_size, break_long_words=False)]
+            if (G.config.arrival_rate > 0 or G.config.replay_file != '') and lagStats.min_time is not None:
+                log(line.middot1s)
+                log(f">>> {cWhite(f'Open-loop dispatch lag (actual send time - intended send time) of {lagStats.total} requests:')}")
+                log("")
+                lag_stats = lagStats.stats()
+                if G.config.replay_file != '': # the lag is how much the replay is behind the timeline of the log
+                    target = f"Replay: {'%.2f'%(G.config.replay_speed)}x the pace of the log"
+                    if isinstance(G.arrival_scheduler,classReplayScheduler):
+                        target += f" (lookahead buffer empty {G.arrival_scheduler.stalls} times)"
+                else:
+                    target = f"Target: {'%.1f'%(G.config.arrival_rate)} req/sec ({G.config.arrival_distribution})"
+                log(f"      {target} - Min/Avg/Max: {lag_stats['min']}/{lag_stats['avg']}/{lag_stats['max']} "
+                    f"- 50th pct: {lag_stats['50pct']} - 90th pct: {lag_stats['90pct']} - 99th pct: {lag_stats['99pct']} - 99.9th pct: {lag_stats['99.9pct']}")
+                log(f"      {sFaint('The elapsed times below are measured from the intended send time (coordinated omission correction)')}")
             log(line.middot1s)
-            log(f">>> {cWhite(f'Statistics of elapsed time of the last {timeStats.window_size} requests:')}")
+            log(f">>> {cWhite('Client CPU time per request:')} {'%.1f'%(clientCPUStats.usec_per_request)} µs ({G.config.engine} engine - {clientCPUStats.requests} requests measured)")
+            load_seconds = (time.monotonic() - G.load_start_time) or 0.000001
+            bytes_in, bytes_out, transfer_bytes, transfer_ns = bandwidthStats.asdeltas()
+            download = f" - Download throughput: {getBytesHumanReadable(bandwidthStats.download_throughput)}/s while reading the bodies" if transfer_ns > 0 else ''
+            log(f">>> {cWhite('Bandwidth:')} In: {getBytesHumanReadable(bytes_in)} ({getBytesHumanReadable(bytes_in / load_seconds)}/s) - "
+                f"Out: {getBytesHumanReadable(bytes_out)} ({getBytesHumanReadable(bytes_out / load_seconds)}/s){download}")
+            log(line.middot1s)
+            log(f">>> {cWhite(f'Statistics of elapsed time of {timeStats.total} requests:')}")
             log("")
             stats = timeStats.stats()
-            min,avg,max,pct50,pct75,pct90,pct99 = stats.values()
+            min,avg,max,pct50,pct75,pct90,pct99,pct999,pct9999 = stats.values()
             min_avg_max = f"{min}  {avg}  {max}"
-            requests_per_sec, sec_per_requests = counterAverage.get_average()
-            requests_per_sec = 'Paused!' if G.event_pause.is_set() else '%.0f'%(requests_per_sec)
-            a = Table(cols=7,max_size=max_size,with_border=False,border_size=0).head(['Total','Req/Sec',' Min       Avg       Max'.center(len(min_avg_max)),'50th pct','75th pct','90th pct','99th pct']).row([counter.value,requests_per_sec,min_avg_max,pct50,pct75,pct90,pct99]).get_table()
+            requests_per_sec = 'Paused!' if G.event_pause.is_set() else '%.0f'%(getRequestsPerSec())
+            a = Table(cols=9,max_size=max_size,with_border=False,border_size=0).head(['Total','Req/Sec',' Min       Avg       Max'.center(len(min_avg_max)),'50th pct','75th pct','90th pct','99th pct','99.9th pct','99.99th pct']).row([counter.value,requests_per_sec,min_avg_max,pct50,pct75,pct90,pct99,pct999,pct9999]).get_table()
             [log(f"{line}") for line in a]
+            if phaseStats.total > 0:
+                log(line.middot1s)
+                log(f">>> {cWhite('Statistics of the phases of the requests:')} {sFaint('(dns, connect and tls only when a connection is opened)')}")
+                log("")
+                phases_table = Table(cols=8,max_size=max_size,with_border=False,border_size=0).head(['Phase','Requests','Min','Avg','Max','50th pct','90th pct','99th pct'])
+                for phase, phase_stats in phaseStats.time_stats.items():
+                    if phase_stats.total > 0:
+                        phase_pct50, phase_pct90, phase_pct99 = phase_stats.percentiles([50,90,99])
+                        phases_table.row([phase,phase_stats.total,'%.6f'%(phase_stats.min_time),'%.6f'%(phase_stats.avg_time),'%.6f'%(phase_stats.max_time),
+                                          '%.6f'%(phase_pct50),'%.6f'%(phase_pct90),'%.6f'%(phase_pct99)])
+                [log(f"{line}") for line in phases_table.get_table()]
+            if G.stages_runner is not None:
+                log(line.middot1s)
+                log(f">>> {cWhite('Statistics by load stage:')}")
+                log("")
+                stages_table = Table(cols=8,max_size=max_size,with_border=False,border_size=0).head(['Stage','Duration','Target/Sec','Req/Sec','Errors','50th pct','90th pct','99th pct'])
+                for report in G.stages_runner.get_reports():
+                    stages_table.row([report['name'],getTimeHumanReadable(time.monotonic()-report['duration']),'%.0f'%(report['target_rps']),'%.0f'%(report['rps']),
+                                      f"{report['errors']} ({'%.2f'%(report['errors_percent'])}%)",report['50pct'],report['90pct'],report['99pct']])
+                [log(f"{line}") for line in stages_table.get_table()]
+            if patternStats:
+                log(line.middot1s)
+                if G.config.flow:
+                    log(f">>> {cWhite(f'Statistics by step of the flow ({len(G.config.flow)} steps, the whole flow is the sum of the elapsed times of its steps):')}")
+                elif G.config.requests:
+                    log(f">>> {cWhite(f'Statistics by request of the requests mix ({len(G.config.requests)} requests):')}")
+                elif G.config.replay_file != '':
+                    log(f">>> {cWhite(f'Statistics by request pattern of the access log {G.config.replay_file}:')}")
+                else:
+                    log(f">>> {cWhite(f'Statistics by request pattern of the scenario file {G.config.scenario_file}:')}")
+                log("")
+                patterns_table = Table(cols=8,max_size=max_size,with_border=False,border_size=0).head(['Step' if G.config.flow else 'Request' if G.config.requests else 'Pattern','Requests','Errors','Status codes','Avg','50th pct','90th pct','99th pct'])
+                for pattern, pattern_stats in sorted(list(patternStats.items()),key=lambda item: -item[1].requests):
+                    pct50, pct90, pct99 = pattern_stats.time_stats.percentiles([50,90,99])
+                    requests, errors = pattern_stats.requests, pattern_stats.errors
+                    patterns_table.row([pattern,requests,f"{errors} ({'%.2f'%((errors * 100 / requests) if requests > 0 else 0.0)}%)",
+                                        ' '.join([f"{code}:{amount}" for code,amount in sorted(pattern_stats.http_stats.values.items())]) or '-',
+                                        *['-' if value is None else '%.6f'%(value) for value in [pattern_stats.time_stats.avg_time,pct50,pct90,pct99]]])
+                [log(f"{line}") for line in patterns_table.get_table()]
             log(line.single)
     except Exception as ERR:
         logDebug(f"httpStats.asdict: {httpStats.asdict}")
@@ -1744,10 +2949,12 @@ def displayHelp():
   {line.middot[:23]}
     {G.light_up}   -> Increases the time interval between requests in +10% (slower)
     {G.light_down}   -> Decreases the time interval between requests in -10% (faster)
+          (in open-loop mode with "arrival_rate", {G.light_up}/{G.light_down} decrease/increase the arrival rate in 10%)
     {G.light_right}   -> Increase the burst of requests (faster)
     {G.light_left}   -> Reduces the burst of requests (slower)
    +/-  -> Increase/Decrease the timeout in +/- 10%
-   < >  -> Increase/Decrease the number of threads
+   < >  -> Increase/Decrease the number of threads (or virtual clients with the asyncio engine)
+   [ ]  -> Decrease/Increase the target of req/sec in 10% (with "target_rps", that adjusts the threads, burst and interval)
     C   -> Displays information about the current configuration
     P   -> Pause/Resume the application
     M   -> Shows Memory usage and CPU usage information
@@ -1766,128 +2973,2902 @@ def displayHelp():
 ##################################################################################################################################
 ##################################################################################################################################
 
- #  #   ##   #  #  ####        ###   ####   ##   #  #  ####   ### #####   ###
- ####  #  #  # #   #           #  #  #     #  #  #  #  #     #      #    #
- ####  #  #  ##    ###         ###   ###   #  #  #  #  ###    ##    #     ##
- #  #  ####  # #   #           # #   #     #  #  #  #  #        #   #       #
- #  #  #  #  #  #  ####        #  #  ####   ##    ##   ####  ###    #    ###
-                                             ##
+ ###    ##   #####   ##         ####  ####  ####  ###   ####  ###    ###
+ #  #  #  #    #    #  #        #     #     #     #  #  #     #  #  #
+ #  #  #  #    #    #  #        ###   ###   ###   #  #  ###   ###    ##
+ #  #  ####    #    ####        #     #     #     #  #  #     # #      #
+ ###   #  #    #    #  #        #     ####  ####  ###   ####  #  #  ###
+
+##──── A data file (one value per line) that is memory mapped, so the pages are shared by the threads and by the forked worker
+##──── processes and only the lines that are used are read. The offsets of the lines are kept in an array('Q') index (8 bytes per
+##──── line) that is built once and cached next to the file ('<file>.stressanapi-idx'), it is reused while the file is unchanged.
+class classDataFeeder:
+    index_magic = b'SAPIIDX1'
+    index_header = struct.Struct('<8sQqQ') # magic, file size, file mtime_ns, number of offsets
+
+    def __init__(self, file_name:str):
+        self.file_name = file_name
+        self.index_file_name = f"{file_name}{G.data_feeder_index_suffix}"
+        with open(file_name,'rb') as f:
+            file_stat = os.fstat(f.fileno())
+            if file_stat.st_size == 0:
+                raise StressAnAPIException(f"The data file {file_name} is empty")
+            self.mmap = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        self.file_key = (file_stat.st_size, file_stat.st_mtime_ns)
+        self.offsets = self.load_index()
+        if self.offsets is None:
+            self.offsets = self.build_index()
+            self.save_index()
+        self.lines = len(self.offsets) - 1
+        self.sequential_counter, self.unique_counter = itertools.count(), itertools.count()
+        self.needs_quote = {}
+
+    ##──── the offsets of the start of each line plus the end of the file, so the line 'n' is mmap[offsets[n]:offsets[n+1]]
+    def build_index(self)->array:
+        offsets = array('Q',[0])
+        offsets.extend(match.end() for match in re.finditer(b'\n',self.mmap)) # a generator, the array is the only copy of the offsets
+        if offsets[-1] != len(self.mmap):
+            offsets.append(len(self.mmap))
+        return offsets
+
+    def load_index(self)->array:
+        try:
+            with open(self.index_file_name,'rb') as f:
+                magic, file_size, file_mtime_ns, length = self.index_header.unpack(f.read(self.index_header.size))
+                if magic != self.index_magic or (file_size, file_mtime_ns) != self.file_key:
+                    return None
+                offsets = array('Q')
+                offsets.frombytes(f.read(length * offsets.itemsize))
+                return offsets if len(offsets) == length else None
+        except Exception as ERR:
+            return None
 
-class threadMakeRequestsURLLib(threading.Thread):
-    def __init__(self,timeStats,httpStats):
-        threading.Thread.__init__(self)
-        self.stop = threading.Event()
-        self.timeStats = timeStats
-        self.httpStats = httpStats
-        zfill_len = len(str(len(G.thread_list))) if len(str(len(G.thread_list))) >= 2 else 2
-        self.text_id = f"[#{self.name.split('-')[1].zfill(zfill_len)}]"
-    def run(self):
-        self.method, self.url = G.config.method, G.config.url
-        if self.method == "GET":
-            self.post_data = b''
+    def save_index(self):
+        try:
+            with open(self.index_file_name,'wb') as f:
+                f.write(self.index_header.pack(self.index_magic,*self.file_key,len(self.offsets)))
+                self.offsets.tofile(f)
+        except Exception as ERR: # a read-only directory only costs the time to build the index again in the next run
+            logDebug(f"classDataFeeder: unable to save the index {self.index_file_name} - {str(ERR)}")
+
+    def get_line(self, line_number:int)->str:
+        return self.mmap[self.offsets[line_number]:self.offsets[line_number+1]].rstrip(b'\r\n').decode('utf-8',errors='replace')
+
+    ##──── 'filerand' returns a random line, 'fileseq' the lines in order (a cursor shared by the threads of the process) and
+    ##──── 'fileunique' only the lines of this load generator (process), so the processes and agents never send the same line
+    def get_value_generator(self, mode:str, quote=None):
+        if quote is not None and quote not in self.needs_quote: # the file is scanned once, usually the values don't need to be quoted
+            self.needs_quote[quote] = QUOTE_UNSAFE_BYTES[quote].search(self.mmap) is not None
+        if quote is quoteHeaderValue and self.needs_quote[quote]:
+            raise StressAnAPIException(f"The lines of the data file {self.file_name} can't be sent in a header, they must be latin-1 without CR/LF")
+        quote = quote if quote is not None and self.needs_quote[quote] else None
+        lines, get_line, get_random = self.lines, self.get_line, random.random
+        if mode == 'filerand':
+            get_value = lambda: get_line(int(get_random() * lines))
+        elif mode == 'fileseq':
+            sequential_counter = self.sequential_counter
+            get_value = lambda: get_line(next(sequential_counter) % lines)
         else:
-            self.post_data = str(json.dumps(G.config.post_data,sort_keys=False,ensure_ascii=False,separators=(",",":"))).encode()
-        self.template_var = self.extract_template_var(self.url)
-        if self.template_var == '%%randomipv4%%':
-            self.get_url = self.__get_url_random_ipv4
-        elif self.template_var == '%%randomipv6%%':
-            self.get_url = self.__get_url_random_ipv6
-        elif self.template_var == '%%randomprivateipv4%%':
-            self.get_url = self.__get_url_random_private_ipv4
-        elif self.template_var.startswith('%%randomint:'):
-            try:
-                self.template_var = self.extract_template_var(self.url)
-                _, self.random_min, self.random_max = self.template_var.replace("%","").split(":")
-            except Exception as ERR:
-                raise StressAnAPIException(f"Failed in config url: invalid url variable '{self.template_var}' - usage: %%randomint:val_min:val_max%% - {str(ERR)}")
+            ##──── the templates are also compiled to validate the configuration file, before G.config exists
+            generator_index, load_generators = (getLoadGeneratorIndex(), getLoadGenerators()) if G.config is not None else (0, 1)
+            unique_counter = self.unique_counter
+            partition_lines = max(1,(lines - generator_index + load_generators - 1) // load_generators) # the lines of this generator
+            get_value = lambda: get_line(min(lines - 1, generator_index + (next(unique_counter) % partition_lines) * load_generators))
+        return get_value if quote is None else lambda: quote(get_value())
+
+##──── The data files are opened only once per process, the forked worker processes share the pages of the main process
+def getDataFeeder(file_name:str)->classDataFeeder:
+    with G.data_feeders_lock:
+        if file_name not in G.data_feeders:
             try:
-                self.random_min = int(self.random_min)
-                self.random_max = int(self.random_max)
+                G.data_feeders[file_name] = classDataFeeder(file_name)
+            except StressAnAPIException:
+                raise
             except Exception as ERR:
-                raise StressAnAPIException(f"Failed in '{self.template_var}' - invalid integer values for min and max - usage: %%randomint:val_min:val_max%% - {str(ERR)}")
-            self.get_url = self.__get_url_random_int
-        
-        req = urllib.request.Request(url=self.url,method=self.method)
-        ##──── configure StressAnAPI useragent if the user has not configured any other
-        if 'user-agent' not in [key.lower() for key,val in G.config.headers.items()]:
-            req.add_header('User-Agent',G.default_user_agent)
-        ##─────────────────────────────────────────────────────────────────────────────
-        for header_key, header_value in G.config.headers.items():
-            req.add_header(header_key,header_value)
-            
-        while True:
-            if G.event_quit.is_set() or self.stop.is_set():
-                break
-            while G.event_pause.is_set():
-                time.sleep(1)
-                if self.stop.is_set():
-                    break
-            for I in range(G.config.burst):
-                if self.stop.is_set(): break
-                try:
-                    with elapsedTimer() as elapsed:
-                        req.full_url = next(self.get_url())
-                        req.data = self.post_data
-                        response_code,response_body = self.urllib_open(req,G.config.timeout)
-                    self.timeStats.save(elapsed.time)
-                except Exception as ERR:
-                    logDebug(f"urllib_get error: {str(ERR)}")
-                finally:
-                    counter.incr()
-                    logResponse(self.text_id,self.method,req.full_url,response_code,response_body,elapsed.text())
-            time.sleep(G.config.interval)
-
-    # @showElapsedTimeAverageDecorator(5000)
-    def urllib_open(self,urllib_request,timeout):
-        try:
-            with urllib.request.urlopen(urllib_request,timeout=timeout) as response:
-                response_code = response.getcode()
-                response_text = response.readline().strip().decode() if response_code not in [202,204] else '\b'
-        except Exception as ERR:
-            response_code,response_text = getErrorResponseCode(str(ERR)),shortenErrorMessage(str(ERR),128)
-            logDebug(f"urllib_open: {str(ERR)}")
-        finally:
-            counterAverage.mark()
-            self.httpStats.save(response_code)
-            return response_code,response_text
+                raise StressAnAPIException(f"Unable to open the data file {file_name} - {str(ERR)}") from None
+        return G.data_feeders[file_name]
 
-    def identify(self):
-        return self.name,self.native_id
+##──── The values of the data files are quoted for the place where they are rendered (the url or the json of the post_data)
+def quoteUrlValue(value:str)->str:
+    return urllib.parse.quote(value,safe="/:@!$&'()*+,;=-._~?%")
 
-    def join(self):
-        try:
-            self.stop.set()
-            threading.Thread.join(self)
-        except Exception as ERR:
-            log(f"Unable to join thread {self.name} - {self.native_id}")
-        return self.name,self.native_id
+def quoteJsonValue(value:str)->str:
+    return json.encoder.encode_basestring(value)[1:-1]
 
-    def extract_template_var(self,text_string):
-        try:
-            match = re.search(r"(\%\%.*\%\%)",text_string)
-            return match.group(1) if match else ''
-        except Exception as ERR:
-            logDebug(f"extract_template_var: {str(ERR)}")
-            return ''
-        
-    def __get_url_random_int(self):
-        yield self.url.replace(self.template_var,str(random.randint(self.random_min,self.random_max)))
-    def __get_url_random_ipv4(self):
-        yield self.url.replace(self.template_var,int2ipv4(random.randint(16777216,3758096383)))
-    def __get_url_random_ipv6(self):
-        yield self.url.replace(self.template_var,':'.join([f'{random.randint(0, 0xffff):04x}' for _ in range(8)]))
-    def __get_url_random_private_ipv4(self):
-        yield self.url.replace(self.template_var,int2ipv4(random.choice([random.randint(167772160,184549375),random.randint(3232235520,3232301055),random.randint(2886729728,2887778303)])))
-    @showElapsedTimeAverageDecorator()
-    def get_url(self):
-        yield self.url
+##──── The values of a header can't be quoted, so a data file is refused (see get_value_generator) when a line has a CR or a
+##──── character that is not latin-1 (the utf-8 of the file is only latin-1 with the lead bytes 0xC2/0xC3)
+def quoteHeaderValue(value:str)->str:
+    return value
 
+QUOTE_UNSAFE_BYTES = {quoteUrlValue:re.compile(rb"[^A-Za-z0-9/:@!$&'()*+,;=\-._~?%\r\n]"), quoteJsonValue:re.compile(rb'["\\\x00-\x09\x0b\x0c\x0e-\x1f]'),
+                      quoteHeaderValue:re.compile(rb"\r(?=[^\r\n])|[\xc4-\xff]|[\xc2\xc3](?![\x80-\xbf])|(?<![\xc2\xc3])[\x80-\xbf]")}
 
 ##################################################################################################################################
 ##################################################################################################################################
 
-  ##   ###    ###  ###    ##   ###    ###  ####        #  #  ####  #  #  #  #
- #  #  #  #  #     #  #  #  #  #  #  #     #           ####  #     ## #  #  #
+  ###   ###  ####  #  #   ##   ###   ###   ##         ####  ###  #     ####   ###
+ #     #     #     ## #  #  #  #  #   #   #  #        #      #   #     #     #
+  ##   #     ###   # ##  #  #  ###    #   #  #        ###    #   #     ###    ##
+    #  #     #     #  #  ####  # #    #   #  #        #      #   #     #        #
+ ###    ###  ####  #  #  #  #  #  #  ###   ##         #     ###  ####  ####  ###
+
+##──── A scenario file is a CSV with one request per row: method, url, headers (a json object) and body. The header line is optional
+##──── and a row with a single column is a url. The file is streamed by a generator, so only the current row is kept in memory and
+##──── the file can have any size, and it starts again from the first row when it ends. The relative urls are sent to the host of "url".
+class classScenarioUrl(str):
+    pattern = None # the method+path pattern of the statistics of the requests of this url
+
+class classScenarioRow:
+    __slots__ = ('method','url','path','headers','body')
+    def __init__(self,method:str,url:classScenarioUrl,path:str,headers:list,body:bytes):
+        self.method, self.url, self.path, self.headers, self.body = method, url, path, headers, body
+
+SCENARIO_COLUMNS = ['method','url','headers','body']
+SCENARIO_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{16,})$")
+
+##──── The numbers, the uuids and the long hex ids of the path are replaced by {id}, ex: "GET /api/v1/users/{id}/orders"
+def getRequestPattern(method:str,path:str)->str:
+    return f"{method} " + "/".join(['{id}' if SCENARIO_ID_SEGMENT.match(segment) else segment for segment in path.split('?',1)[0].split('/')])
+
+def parseScenarioRow(values:list,columns:list,base_origin:str,default_method:str)->classScenarioRow:
+    row = {column:(value if column == 'body' else value.strip()) for column,value in zip(columns,values)}
+    method = (row.get('method') or default_method).upper()
+    if method not in G.allowed_methods:
+        raise StressAnAPIException(f"Invalid method '{method}', must be one of {G.allowed_methods}")
+    url = base_origin + row['url'] if row.get('url','').startswith('/') else row.get('url','')
+    url_parts = urllib.parse.urlsplit(url)
+    if url_parts.scheme not in ['http','https'] or not url_parts.netloc:
+        raise StressAnAPIException(f"Invalid url '{url}', must be an absolute url or a path starting with '/'")
+    try:
+        headers = json.loads(row['headers']) if row.get('headers') else {}
+        assert isinstance(headers,dict)
+    except:
+        raise StressAnAPIException(f"Invalid headers, must be a json object - {row.get('headers')}") from None
+    path = url[len(f"{url_parts.scheme}://{url_parts.netloc}"):] or '/'
+    scenario_url = classScenarioUrl(url)
+    scenario_url.pattern = getRequestPattern(method,path)
+    return classScenarioRow(method,scenario_url,path,[(str(key),str(val)) for key,val in headers.items()],row.get('body','').encode())
+
+##──── Yields the rows of the scenario file forever, only the rows 'partition_index' of every 'partitions' rows are parsed. The invalid
+##──── rows are skipped while the test runs (they are checked when the configuration is loaded, with 'strict'). With 'with_index'
+##──── it yields (index,row), the index of the row in the partition in the current pass over the file (the invalid rows are counted).
+def readScenarioRows(file_name:str,base_url:str,default_method:str,partition_index:int=0,partitions:int=1,strict:bool=False,with_index:bool=False):
+    base_url_parts = urllib.parse.urlsplit(base_url)
+    base_origin = f"{base_url_parts.scheme}://{base_url_parts.netloc}"
+    while True:
+        rows, row_number = 0, -1
+        try:
+            with open(file_name,'r',newline='',encoding='utf-8') as f:
+                reader, header_columns = csv.reader(f), None
+                for values in reader:
+                    if not ''.join(values).strip() or values[0].startswith('#'):
+                        continue
+                    if row_number == -1 and header_columns is None and all([value.strip().lower() in SCENARIO_COLUMNS for value in values]):
+                        header_columns = [value.strip().lower() for value in values]
+                        if 'url' not in header_columns:
+                            raise StressAnAPIException(f"The header line of the scenario file {file_name} has no 'url' column")
+                        continue
+                    row_number += 1
+                    if row_number % partitions != partition_index:
+                        continue
+                    try:
+                        scenario_row = parseScenarioRow(values,header_columns or (['url'] if len(values) == 1 else SCENARIO_COLUMNS),base_origin,default_method)
+                    except StressAnAPIException as ERR:
+                        if strict:
+                            raise StressAnAPIException(f"Line {reader.line_num} of {file_name} - {stripColor(str(ERR))}") from None
+                        logDebug(f"readScenarioRows: line {reader.line_num} skipped - {stripColor(str(ERR))}")
+                        continue
+                    rows += 1
+                    yield (row_number // partitions,scenario_row) if with_index else scenario_row
+        except (OSError,UnicodeDecodeError,csv.Error) as ERR:
+            raise StressAnAPIException(f"Unable to read the scenario file {file_name} - {str(ERR)}") from None
+        if rows == 0:
+            if row_number >= 0 and partitions > row_number + 1: # more partitions than rows, each partition gets one row
+                partition_index, partitions = partition_index % (row_number + 1), row_number + 1
+                continue
+            raise StressAnAPIException(f"The scenario file {file_name} has no valid rows")
+
+##──── The rows of the scenario for the request threads: the threads of a process share the same cursor ("scenario_cursor": "shared")
+##──── or each thread reads its own partition of the rows ("partition"). The processes and the agents always read their own partition.
+##──── The file is read by a single reader per process: with "partition" it deals the rows to the queues of the thread partitions,
+##──── so the threads don't read and parse the whole file to keep one row of every 'threads' rows.
+class classScenarioReader:
+    def __init__(self,file_name:str,partition_index:int=0,partitions:int=1):
+        self.partition_index, self.partitions = partition_index, partitions
+        self.rows = readScenarioRows(file_name,G.config.url,G.config.method,partition_index,partitions,with_index=True)
+        self.lock = threading.Lock()
+        self.queues, self.last_index, self.pass_rows = {}, -1, None
+
+    def next_row(self)->classScenarioRow:
+        with self.lock:
+            return next(self.rows)[1]
+
+    ##──── the row 'index' goes to the thread partition 'index % thread_partitions', and when there are more thread partitions than
+    ##──── rows (known after the first pass over the file), to every thread partition 'index + n * pass_rows', so each one gets a row
+    def next_partition_row(self,thread_partition:int,thread_partitions:int)->classScenarioRow:
+        with self.lock:
+            queue = self.queues.get(thread_partition)
+            while not queue:
+                index, row = next(self.rows)
+                if index <= self.last_index:
+                    self.pass_rows = self.last_index + 1
+                self.last_index = index
+                if self.pass_rows is not None and self.pass_rows < thread_partitions:
+                    targets = range(index,thread_partitions,self.pass_rows)
+                else:
+                    targets = [index % thread_partitions]
+                for target in targets:
+                    if target not in self.queues:
+                        self.queues[target] = deque(maxlen=G.scenario_queue_size)
+                    self.queues[target].append(row)
+                queue = self.queues.get(thread_partition)
+            return queue.popleft()
+
+##──── The reader of a thread with "scenario_cursor": "partition", it takes the rows dealt to its partition by the reader of the process
+class classScenarioPartitionReader:
+    def __init__(self,scenario_reader:classScenarioReader,thread_partition:int,thread_partitions:int):
+        self.scenario_reader, self.thread_partition, self.thread_partitions = scenario_reader, thread_partition, thread_partitions
+
+    def next_row(self)->classScenarioRow:
+        return self.scenario_reader.next_partition_row(self.thread_partition,self.thread_partitions)
+
+def newScenarioReader()->classScenarioReader:
+    if G.config.replay_file != '': # the rows of the access log are given with their send time by the replay scheduler
+        return G.arrival_scheduler
+    with G.scenario_lock:
+        if G.scenario_reader is None:
+            G.scenario_reader = classScenarioReader(G.config.scenario_file,getLoadGeneratorIndex(),getLoadGenerators())
+        if G.config.scenario_cursor == 'shared':
+            return G.scenario_reader
+        if G.scenario_partitions == 0: # the threads added later (with the keys or by "target_rps") reuse the partitions
+            G.scenario_partitions = 1 if G.config.engine == 'asyncio' else G.config.threads
+        thread_partition = next(G.scenario_thread_counter) % G.scenario_partitions
+        return classScenarioPartitionReader(G.scenario_reader,thread_partition,G.scenario_partitions)
+
+##──── The rows of the scenario rendered into raw HTTP bytes for the 'pooled', 'asyncio' and 'pipeline' engines. Their connections
+##──── are opened to the host of "url", so the scheme and the host of the urls of the scenario are only used by the 'urllib' engine.
+class classScenarioWireTemplate:
+    def __init__(self,scenario:classScenarioReader,headers:list):
+        self.scenario, self.headers = scenario, headers
+
+    def render(self)->list: # returns [request_segments, url]
+        row = self.scenario.next_row()
+        if not row.headers:
+            return [buildRequestBytes(row.method,row.path,self.headers,row.body)], row.url
+        row_header_keys = [key.lower() for key,val in row.headers]
+        headers = [(key,val) for key,val in self.headers if key.lower() not in row_header_keys] + row.headers
+        return [buildRequestBytes(row.method,row.path,headers,row.body)], row.url
+
+##################################################################################################################################
+##################################################################################################################################
+
+  ##    ###   ###  ####   ###   ###        #      ##    ###        ###   ####  ###   #      ##   #   #
+ #  #  #     #     #     #     #           #     #  #  #           #  #  #     #  #  #     #  #   # #
+ #  #  #     #     ###    ##    ##         #     #  #  # ##        ###   ###   ###   #     #  #    #
+ ####  #     #     #        #     #        #     #  #  #  #        # #   #     #     #     ####    #
+ #  #   ###   ###  ####  ###   ###         ####   ##    ###        #  #  ####  #     ####  #  #    #
+
+##──── The nginx/Apache "combined" (or "common") access log format - the time can have a fraction of second ("%{msec}t")
+ACCESS_LOG_REGEX = re.compile(r'^\S+ \S+ \S+ \[(\d{2})/(\w{3})/(\d{4}):(\d{2}):(\d{2}):(\d{2})(\.\d+)? ([+-])(\d{2})(\d{2})\] "(\S+) (/\S*)[^"]*"')
+ACCESS_LOG_MONTHS = {month:index for index,month in enumerate(['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec'],1)}
+
+def getAccessLogTime(match)->float:
+    day, month, year, hour, minute, second, fraction, zone_sign, zone_hour, zone_minute = match.groups()[:10]
+    zone_offset = (int(zone_hour) * 3600 + int(zone_minute) * 60) * (-1 if zone_sign == '-' else 1)
+    return calendar.timegm((int(year),ACCESS_LOG_MONTHS.get(month,1),int(day),int(hour),int(minute),int(second))) - zone_offset + (float(fraction) if fraction else 0.0)
+
+##──── Yields [log_time, row] forever, where log_time is the time of the line in seconds since the first line of the log. The lines
+##──── of the methods that are not supported (HEAD, OPTIONS...) and the lines in other formats are skipped. When the log ends, it
+##──── starts again from the first line one second after the last line, so the timeline never goes back.
+def readAccessLogRows(file_name:str,base_url:str,partition_index:int=0,partitions:int=1):
+    base_url_parts = urllib.parse.urlsplit(base_url)
+    base_origin = f"{base_url_parts.scheme}://{base_url_parts.netloc}"
+    time_offset = 0.0
+    while True:
+        rows, line_number, first_time, last_time = 0, -1, None, 0.0
+        try:
+            with open(file_name,'r',encoding='utf-8',errors='replace') as f:
+                for line in f:
+                    match = ACCESS_LOG_REGEX.match(line)
+                    if match is None or match.group(11) not in G.allowed_methods:
+                        continue
+                    log_time = getAccessLogTime(match)
+                    if first_time is None:
+                        first_time = log_time
+                    line_number, last_time = line_number + 1, max(last_time,log_time - first_time)
+                    if line_number % partitions != partition_index:
+                        continue
+                    method, path = match.group(11), match.group(12)
+                    url = classScenarioUrl(base_origin + path)
+                    url.pattern = getRequestPattern(method,path)
+                    rows += 1
+                    yield [time_offset + log_time - first_time, classScenarioRow(method,url,path,[],b'')]
+        except OSError as ERR:
+            raise StressAnAPIException(f"Unable to read the access log {file_name} - {str(ERR)}") from None
+        if rows == 0:
+            if line_number >= 0 and partitions > line_number + 1: # more partitions than requests, each partition gets one request
+                partition_index, partitions = partition_index % (line_number + 1), line_number + 1
+                continue
+            raise StressAnAPIException(f"The access log {file_name} has no requests in the combined log format")
+        time_offset += last_time + 1.0
+
+##──── Open-loop scheduler of the access log replay: the intended send time of each request is the time of its line in the log
+##──── divided by "replay_speed". A reader thread parses the log into a lookahead buffer, so the parsing never delays a request.
+##──── next_slot() gives the row to the thread (or virtual client) that asked for the slot, with a context variable, so next_row()
+##──── returns the request of that slot even if other threads took the next slots meanwhile.
+class classReplayScheduler:
+    def __init__(self,file_name:str,speed:float,partition_index:int=0,partitions:int=1):
+        self.condition = threading.Condition()
+        self.speed = speed
+        self.rows = readAccessLogRows(file_name,G.config.url,partition_index,partitions)
+        self.buffer = deque()
+        self.stalls = 0
+        self.last_row = None
+        self.anchor_time, self.anchor_log_time, self.last_time = time.monotonic(), 0.0, 0.0
+        self.slot_rows = contextvars.ContextVar('slot_rows')
+        threading.Thread(target=self.read_ahead,daemon=True,name='replay-reader').start()
+
+    def read_ahead(self):
+        try:
+            while True:
+                with self.condition:
+                    while len(self.buffer) >= G.replay_lookahead:
+                        self.condition.wait(0.5)
+                rows = list(itertools.islice(self.rows,G.replay_read_batch)) # parsed without holding the lock
+                if not rows:
+                    return
+                with self.condition:
+                    self.buffer.extend(rows)
+                    self.condition.notify_all()
+        except StressAnAPIException as ERR: # the log was removed or changed while the test runs
+            log(cWarning(f"  {G.light_circle} {stripColor(str(ERR))} - the replay is finished"))
+            G.event_quit.set()
+            with self.condition:
+                self.condition.notify_all()
+
+    def intended_time(self,log_time:float)->float:
+        return self.anchor_time + (log_time - self.anchor_log_time) / self.speed
+
+    ##──── waits (without holding the lock) while the next request is not due, so a long gap in the log can be stopped or paused,
+    ##──── except in the event loop of the 'asyncio' engine, where the virtual clients wait with asyncio.sleep() and are cancelled
+    def next_slot(self)->float:
+        stop = getattr(threading.current_thread(),'stop',None)
+        wait_due = not isinstance(threading.current_thread(),threadMakeRequestsAsyncio)
+        with self.condition:
+            if not self.buffer:
+                self.stalls += 1
+            while True:
+                if G.event_quit.is_set() or (stop is not None and stop.is_set()):
+                    row, intended_time = self.buffer.popleft()[1] if self.buffer else self.last_row, time.monotonic()
+                    if row is not None:
+                        break
+                elif self.buffer and (not wait_due or self.intended_time(self.buffer[0][0]) - time.monotonic() < G.replay_max_wait):
+                    log_time, row = self.buffer.popleft()
+                    intended_time = self.last_time = max(self.last_time,self.intended_time(log_time))
+                    break
+                self.condition.wait(G.replay_max_wait / 2)
+            if len(self.buffer) < G.replay_lookahead // 2:
+                self.condition.notify_all()
+            self.last_row = row
+        slot_rows = self.slot_rows.get(None)
+        if slot_rows is None:
+            slot_rows = deque()
+            self.slot_rows.set(slot_rows)
+        slot_rows.append(row)
+        return intended_time
+
+    def next_row(self)->classScenarioRow:
+        return self.slot_rows.get().popleft()
+
+    ##──── the slot is the intended time: the speed changes are applied to the rows not given yet
+    def slot_time(self,slot:float)->float:
+        return slot
+
+    def wait_slot(self,slot:float)->float:
+        sleepUntil(slot)
+        return slot
+
+    async def wait_slot_async(self,slot:float)->float:
+        await asyncio.sleep(max(0.0,slot - time.monotonic()))
+        return slot
+
+    ##──── the timeline continues from the current position of the log at the new speed
+    def set_speed(self,speed:float):
+        with self.condition:
+            now = time.monotonic()
+            self.anchor_log_time += (now - self.anchor_time) * self.speed
+            self.anchor_time, self.speed = now, speed
+            self.condition.notify_all()
+
+    ##──── after a pause, the replay continues from the next line of the log instead of sending all the lines of the paused period
+    def restart(self):
+        with self.condition:
+            if self.buffer and self.intended_time(self.buffer[0][0]) < time.monotonic():
+                self.anchor_time += time.monotonic() - self.intended_time(self.buffer[0][0])
+            self.condition.notify_all()
+
+def setReplaySpeed(replay_speed:float):
+    G.config.replay_speed = replay_speed
+    if isinstance(G.arrival_scheduler,classReplayScheduler):
+        G.arrival_scheduler.set_speed(replay_speed)
+
+##################################################################################################################################
+##################################################################################################################################
+
+ ###   ####   ##   #  #  ####   ###  #####        #  #  ###  #  #
+ #  #  #     #  #  #  #  #     #       #          ####   #   #  #
+ ###   ###   #  #  #  #  ###    ##     #          ####   #    ##
+ # #   #     # ##  #  #  #        #    #          #  #   #   #  #
+ #  #  ####   ###   ##   ####  ###     #          #  #  ###  #  #
+
+##──── The "requests" mix: each request is chosen with the weights of the mix by an alias table (Vose's method), so choosing a request
+##──── costs one random number and one comparison whatever the number of requests. The table is built once per request thread.
+class classAliasSampler:
+    def __init__(self,weights:list):
+        self.count = len(weights)
+        scaled = [weight * self.count / sum(weights) for weight in weights]
+        self.probabilities, self.aliases = [1.0] * self.count, list(range(self.count))
+        small = [index for index,probability in enumerate(scaled) if probability < 1.0]
+        large = [index for index,probability in enumerate(scaled) if probability >= 1.0]
+        while small and large:
+            index_small, index_large = small.pop(), large.pop()
+            self.probabilities[index_small], self.aliases[index_small] = scaled[index_small], index_large
+            scaled[index_large] -= 1.0 - scaled[index_small]
+            (small if scaled[index_large] < 1.0 else large).append(index_large)
+        ##──── the indexes left in 'small' or 'large' (rounding errors) keep a probability of 1.0
+
+    def sample(self)->int:
+        value = random.random() * self.count
+        index = int(value)
+        return index if value - index < self.probabilities[index] else self.aliases[index]
+
+##──── Returns the url with the name of the request (or the method+path pattern) of its statistics
+def getPatternUrl(url:str,pattern:str)->classScenarioUrl:
+    pattern_url = classScenarioUrl(url)
+    pattern_url.pattern = pattern
+    return pattern_url
+
+##──── One request of the mix compiled once, like the request of "url": the templates of its url, body and headers. The url without
+##──── template variables is kept with the name of the request, so the statistics by request cost nothing more per request.
+class classMixRequest:
+    def __init__(self,request:dict):
+        self.name, self.method, self.headers = request['name'], request['method'], request['headers']
+        self.url = getPatternUrl(request['url'],self.name)
+        self.url_template = classStringTemplate(self.url,quoteUrlValue)
+        self.post_data, self.post_data_template = getPostDataTemplate(self.method,request['post_data'])
+        self.header_templates = getHeaderTemplates(self.headers)
+        self.req = None # the urllib.request.Request of the 'urllib' engine
+
+##──── The requests of the mix rendered into raw HTTP bytes for the 'pooled', 'asyncio' and 'pipeline' engines
+class classRequestMixWireTemplate:
+    def __init__(self,wire_templates:list,sampler:classAliasSampler):
+        self.wire_templates, self.sample = wire_templates, sampler.sample
+
+    def render(self)->list: # returns [request_segments, url]
+        wire_template = self.wire_templates[self.sample()]
+        request_segments, url = wire_template.render()
+        if url.__class__ is classScenarioUrl:
+            return request_segments, url
+        return request_segments, getPatternUrl(url,wire_template.url.pattern)
+
+##################################################################################################################################
+##################################################################################################################################
+
+ ####  #      ##   #  #   ###
+ #     #     #  #  #  #  #
+ ###   #     #  #  ####   ##
+ #     #     #  #  ####     #
+ #     ####   ##   #  #  ###
+
+##──── A "flow" is a sequence of steps sent in order by each virtual user (a thread, or a virtual client of the 'asyncio' engine), ex: a
+##──── login followed by the requests with the token of the login. Each step is compiled once per thread like the request of "url", and
+##──── the values extracted from its response are kept in the session of the virtual user and rendered with %%var:name%% in the next steps.
+FLOW_VARIABLES = contextvars.ContextVar('flow_variables')
+FLOW_JSON_PATH_REGEX = re.compile(r"\[(\d+)\]|([^.\[\]]+)")
+SET_COOKIE_MAX_AGE_REGEX = re.compile(r"max-age\s*=\s*(-?\d+)",re.I)
+SET_COOKIE_EXPIRES_REGEX = re.compile(r"expires\s*=\s*([^;]+)",re.I)
+
+##──── The variables are read from the session of the current virtual user, in the context of its thread or of its asyncio task
+def getFlowVariableGenerator(name:str,quote=None):
+    if quote is None:
+        return lambda: FLOW_VARIABLES.get()[name]
+    return lambda: quote(FLOW_VARIABLES.get()[name])
+
+##──── Returns the extractor of a variable: the keys of a json path (ex: "data.items[0].id"), a compiled regex (its first group or the
+##──── whole match) or the lowercase name of a response header. Only what is extracted is parsed, the json only when a json path is used.
+def newFlowExtractor(variable:str,kind:str,argument:str)->list:
+    if kind == 'json':
+        return [variable,kind,getJsonPathKeys(argument)]
+    elif kind == 'regex':
+        try:
+            return [variable,kind,re.compile(argument.encode())]
+        except re.error as ERR:
+            raise StressAnAPIException(f"Invalid regex '{argument}' - {str(ERR)}") from None
+    return [variable,kind,argument.strip().lower().encode('latin-1',errors='replace')]
+
+def getThinkTimeText(think_time:list)->str:
+    return f"{'%.2f'%(think_time[0])}s" if think_time[0] == think_time[1] else f"{'%.2f'%(think_time[0])}-{'%.2f'%(think_time[1])}s"
+
+def getJsonPathKeys(path:str)->list:
+    keys = [int(index) if index else key for index,key in FLOW_JSON_PATH_REGEX.findall(path[1:] if path.startswith('$') else path)]
+    if not keys:
+        raise StressAnAPIException(f"Invalid json path '{path}', ex: data.token or $.items[0].id")
+    return keys
+
+def getJsonPathValue(document,keys:list)->str:
+    for key in keys:
+        document = document[key]
+    return document if isinstance(document,str) else json.dumps(document)
+
+def isExpiredCookie(attributes:str)->bool:
+    if (max_age := SET_COOKIE_MAX_AGE_REGEX.search(attributes)) is not None:
+        return int(max_age.group(1)) <= 0
+    if (expires := SET_COOKIE_EXPIRES_REGEX.search(attributes)) is not None and (expires_time := email.utils.parsedate(expires.group(1))) is not None:
+        return calendar.timegm(expires_time) < time.time()
+    return False
+
+##──── The headers of a urllib response like the headers of parseResponseHead(): lowercase bytes keys and the Set-Cookie joined by '\n'
+def getResponseHeadersDict(message)->dict:
+    headers = {}
+    for key, val in message.items():
+        key, val = key.lower().encode('latin-1',errors='replace'), val.encode('latin-1',errors='replace')
+        headers[key] = headers[key] + b'\n' + val if key == b'set-cookie' and key in headers else val
+    return headers
+
+##──── A step of the flow compiled once: the templates of its url, headers and body, and its extractors
+class classFlowStep:
+    def __init__(self,step:dict,headers:list):
+        self.name, self.method, self.url = step['name'], step['method'], step['url']
+        self.url_template = getStringTemplate(self.url,quoteUrlValue)
+        self.post_data, self.post_data_template = getPostDataTemplate(self.method,step['post_data'])
+        self.headers = [(header_key,header_value,getStringTemplate(header_value)) for header_key,header_value in headers]
+        self.cookie_index = next((index for index,(header_key,header_value) in enumerate(headers) if header_key.lower() == 'cookie'),None)
+        self.extractors = [newFlowExtractor(variable,*list(extractor.items())[0]) for variable,extractor in step['extract'].items()]
+        self.parse_json = any([kind == 'json' for variable,kind,argument in self.extractors])
+        self.read_body = any([kind in ['json','regex'] for variable,kind,argument in self.extractors])
+        self.think_time_min, self.think_time_max = step['think_time']
+
+    def render(self,cookies:str)->list: # returns [method, url, headers, body]
+        url = self.url if self.url_template is None else self.url_template.render()
+        headers = [(header_key,header_value if header_template is None else header_template.render()) for header_key,header_value,header_template in self.headers]
+        if cookies: # the cookies of the session are added to the "Cookie" header of the step, if any
+            if self.cookie_index is None:
+                headers.append(('Cookie',cookies))
+            else:
+                headers[self.cookie_index] = ('Cookie',f"{headers[self.cookie_index][1]}; {cookies}")
+        body = self.post_data if self.post_data_template is None else self.post_data_template.render().encode()
+        return [self.method,url,headers,body]
+
+    def think_time(self)->float:
+        return self.think_time_min if self.think_time_min == self.think_time_max else random.uniform(self.think_time_min,self.think_time_max)
+
+##──── The session of a virtual user: the values extracted and the cookies received, cleared when the flow starts again. The cookie jar
+##──── is simple, the next steps send all the cookies received (the attributes Domain and Path are not checked).
+class classFlowSession:
+    def __init__(self):
+        self.variables, self.cookies = {}, {}
+        FLOW_VARIABLES.set(self.variables)
+
+    def start(self):
+        self.variables.clear()
+        self.cookies.clear()
+
+    def render(self,step:classFlowStep)->list:
+        return step.render('; '.join([f"{name}={value}" for name,value in self.cookies.items()]) if self.cookies else '')
+
+    ##──── returns the status code of the step, or 905 when a value to extract is not found in a successful response
+    def process(self,step:classFlowStep,response_code:int,headers:dict,body:bytes)->int:
+        if b'set-cookie' in headers:
+            self.save_cookies(headers[b'set-cookie'].decode('latin-1'))
+        if not step.extractors or response_code not in G.config.success_status_codes:
+            return response_code
+        try:
+            document = json.loads(body) if step.parse_json else None
+            for variable, kind, argument in step.extractors:
+                if kind == 'json':
+                    self.variables[variable] = getJsonPathValue(document,argument)
+                elif kind == 'regex':
+                    self.variables[variable] = argument.search(body).group(1 if argument.groups else 0).decode(errors='replace')
+                else:
+                    self.variables[variable] = headers[argument].decode('latin-1')
+        except Exception as ERR:
+            logDebug(f"classFlowSession.process: value not found in the response of the step '{step.name}' - {str(ERR)}")
+            return G.flow_extraction_error_code
+        return response_code
+
+    def save_cookies(self,set_cookie:str):
+        for cookie in set_cookie.split('\n'):
+            name_value, _, attributes = cookie.partition(';')
+            name, _, value = name_value.partition('=')
+            if name.strip() == '':
+                continue
+            if isExpiredCookie(attributes):
+                self.cookies.pop(name.strip(),None)
+            else:
+                self.cookies[name.strip()] = value.strip()
+
+##################################################################################################################################
+##################################################################################################################################
+
+  ##    ###   ###  ####  ###   #####  ###   ##   #  #   ###
+ #  #  #     #     #     #  #    #     #   #  #  ## #  #
+ #  #   ##    ##   ###   ###     #     #   #  #  # ##   ##
+ ####     #     #  #     # #     #     #   #  #  #  #     #
+ #  #  ###   ###   ####  #  #    #    ###   ##   #  #  ###
+
+##──── The "assertions" of the responses: a response with a success status code (see "success_status_codes") that fails an assertion is
+##──── counted with the status code 906. With "assertions_sample_rate" < 1 only a sample of the responses is checked, to bound the cpu
+##──── cost under heavy load. Only what the assertions need is read and parsed: the body is decoded as json only by the "json" assertions.
+def newResponseAssertion(assertion:dict)->list: # returns [kind, argument, expected, description]
+    kind = [key for key in assertion.keys() if key in G.allowed_assertions][0]
+    value, expected = assertion[kind], assertion.get('equals')
+    description = f"{kind} {json.dumps(value,ensure_ascii=False)}" + (f" equals {json.dumps(expected,ensure_ascii=False)}" if 'equals' in assertion else '')
+    if kind in ['contains','not_contains']:
+        return [kind,str(value).encode(),None,description]
+    elif kind == 'regex':
+        try:
+            return [kind,re.compile(str(value).encode()),None,description]
+        except re.error as ERR:
+            raise StressAnAPIException(f"Invalid regex '{value}' - {str(ERR)}") from None
+    elif kind == 'json':
+        return [kind,getJsonPathKeys(str(value)),None if 'equals' not in assertion else expected if isinstance(expected,str) else json.dumps(expected),description]
+    elif kind == 'body_size':
+        try:
+            size_min, size_max = [int(size) for size in value]
+            assert 0 <= size_min <= size_max
+        except:
+            raise StressAnAPIException(f"Invalid body size '{value}', must be [min, max] bytes") from None
+        return [kind,[size_min,size_max],None,description]
+    return [kind,str(value).strip().lower().encode('latin-1',errors='replace'),None if 'equals' not in assertion else str(expected).encode('latin-1',errors='replace'),description]
+
+class classResponseAssertions:
+    def __init__(self,assertions:list,sample_rate:float):
+        self.assertions = [newResponseAssertion(assertion) for assertion in assertions]
+        self.sample_rate = sample_rate
+        self.parse_json = any([kind == 'json' for kind,argument,expected,description in self.assertions])
+        self.read_body = any([kind != 'header' for kind,argument,expected,description in self.assertions])
+        self.read_headers = any([kind == 'header' for kind,argument,expected,description in self.assertions])
+
+    def sample(self)->bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    ##──── returns [response_code, response_text], with the status code 906 and the assertion that failed in the text
+    def check(self,response_code:int,headers:dict,body:bytes,response_text:str)->list:
+        if response_code not in G.config.success_status_codes:
+            return [response_code,response_text]
+        try:
+            document = json.loads(body) if self.parse_json else None
+        except ValueError:
+            return [G.assertion_error_code,"Assertion failed: the body is not a valid json"]
+        for kind, argument, expected, description in self.assertions:
+            if kind == 'contains':
+                failed = argument not in body
+            elif kind == 'not_contains':
+                failed = argument in body
+            elif kind == 'regex':
+                failed = argument.search(body) is None
+            elif kind == 'json':
+                try:
+                    failed = getJsonPathValue(document,argument) != expected and expected is not None
+                except (KeyError,IndexError,TypeError):
+                    failed = True
+            elif kind == 'body_size':
+                failed = not (argument[0] <= len(body) <= argument[1])
+            else:
+                failed = argument not in headers or (expected is not None and headers[argument] != expected)
+            if failed:
+                return [G.assertion_error_code,f"Assertion failed: {description}"]
+        return [response_code,response_text]
+
+##──── Validates the "assertions" and returns them with only the keys of each kind of assertion
+def validateAssertions(assertions)->list:
+    if not isinstance(assertions,list):
+        raise StressAnAPIConfigException(f'Error in "assertions", must be a List not {str(type(assertions))}') from None
+    new_assertions = []
+    for index, assertion in enumerate(assertions):
+        kinds = [key for key in assertion.keys() if key in G.allowed_assertions] if isinstance(assertion,dict) else []
+        if len(kinds) != 1 or [key for key in assertion.keys() if key not in kinds + ['equals']] or ('equals' in assertion and kinds[0] not in ['json','header']):
+            raise StressAnAPIConfigException(f'Invalid assertion #{index+1}, must be a Dict with one of {G.allowed_assertions} ("equals" only with "json" and "header") - "{assertion}"') from None
+        try:
+            newResponseAssertion(assertion)
+        except StressAnAPIException as ERR:
+            raise StressAnAPIConfigException(f'Invalid assertion #{index+1} - {stripColor(str(ERR))}') from None
+        new_assertions.append(dict(assertion))
+    return new_assertions
+
+##################################################################################################################################
+##################################################################################################################################
+
+  ###   ##   #  #  #  #  ####   ###  #####  ###   ##   #  #        ###    ##    ##   #
+ #     #  #  ## #  ## #  #     #       #     #   #  #  ## #        #  #  #  #  #  #  #
+ #     #  #  # ##  # ##  ###   #       #     #   #  #  # ##        ###   #  #  #  #  #
+ #     #  #  #  #  #  #  #     #       #     #   #  #  #  #        #     #  #  #  #  #
+  ###   ##   #  #  #  #  ####   ###    #    ###   ##   #  #        #      ##    ##   ####
+
+##──── Raised when a reused keep-alive connection was closed by the server before sending any response
+class classRemoteDisconnected(ConnectionError):...
+
+##──── Returns a shared SSL context (created only once) for https connections ───────────────────────────────────────────────────
+@functools.lru_cache(maxsize=1)
+def getSSLContext():
+    return ssl.create_default_context()
+
+##──── Build the raw bytes of an HTTP/1.1 request ────────────────────────────────────────────────────────────────────────────────
+def buildRequestBytes(method:str,path:str,headers:list,body:bytes=b'')->bytes:
+    return (buildRequestHead(method,path,headers)+getContentLengthHeader(method,body)+"\r\n").encode('latin-1') + body
+
+##──── The request line and the headers, without the Content-Length and the blank line that ends the head
+def buildRequestHead(method:str,path:str,headers:list)->str:
+    return f"{method} {path} HTTP/1.1\r\n" + "".join([f"{key}: {val}\r\n" for key,val in headers])
+
+def getContentLengthHeader(method:str,body:bytes)->str:
+    return f"Content-Length: {len(body)}\r\n" if body or method in ['POST','PUT','PATCH'] else ""
+
+##──── The size of a request of the 'urllib' engine: the request line, the headers and the body (without the headers added by http.client)
+def getUrllibRequestSize(request:urllib.request.Request)->int:
+    return (len(request.get_method()) + len(request.selector) + 12 + sum([len(key) + len(val) + 4 for key,val in request.header_items()]) + 2
+            + len(request.data or b''))
+
+##──── Returns the first line of a response body to be displayed with the V/B keys ───────────────────────────────────────────────
+def getResponseText(response_code:int,body:bytes)->str:
+    return body.split(b'\n',1)[0].strip().decode(errors='replace') if response_code not in [202,204] else '\b'
+
+##──── Returns the list of headers of the configuration (or of a request of the mix) plus the required Host, User-Agent and Accept-Encoding
+def getRequestHeaders(netloc:str,config_headers:dict=None)->list:
+    config_headers = G.config.headers if config_headers is None else config_headers
+    header_keys = [key.lower() for key in config_headers.keys()]
+    headers = [('Host',netloc)] if 'host' not in header_keys else []
+    if 'user-agent' not in header_keys:
+        headers.append(('User-Agent',G.default_user_agent))
+    if 'accept-encoding' not in header_keys:
+        headers.append(('Accept-Encoding','identity'))
+    return headers + list(config_headers.items())
+
+##──── Parse the status line and the header lines of a response - returns [status_code, headers, keep_alive] ────────────────────
+def parseResponseHead(status_line:bytes,header_lines:list)->list:
+    try:
+        version, status_code, *junk = status_line.split(None,2)
+        status_code = int(status_code)
+    except Exception as ERR:
+        raise ConnectionError(f"Invalid status line received: {status_line[:64]}") from None
+    headers = {}
+    for header_line in header_lines:
+        key, _, val = header_line.partition(b':')
+        key = key.strip().lower()
+        if key == b'set-cookie' and key in headers: # all the cookies are kept for the sessions of the "flow"
+            headers[key] += b'\n' + val.strip()
+        else:
+            headers[key] = val.strip()
+    connection = headers.get(b'connection',b'').lower()
+    keep_alive = (connection != b'close') if version == b'HTTP/1.1' else (connection == b'keep-alive')
+    return [status_code,headers,keep_alive]
+
+##──── A string with any number of template variables, compiled once into literal segments and value generators, so each
+##──── render is a single join (or a concatenation when there is only one variable) without searching the string again.
+class classStringTemplate:
+    variables_regex = re.compile(r"%%(.+?)%%")
+
+    def __init__(self,text:str,quote=None):
+        self.text = text
+        self.variables, self.parts, self.slots = [], [], []
+        position = 0
+        for index, match in enumerate(self.variables_regex.finditer(text)):
+            self.parts.append(text[position:match.start()])
+            self.slots.append((len(self.parts),self.get_value_generator(match.group(0),quote[index] if isinstance(quote,list) else quote)))
+            self.parts.append(None)
+            self.variables.append(match.group(0))
+            position = match.end()
+        self.parts.append(text[position:])
+        if len(self.slots) == 0:
+            self.render = self.__render_static
+        elif len(self.slots) == 1:
+            self.prefix, self.get_value, self.suffix = self.parts[0], self.slots[0][1], self.parts[2]
+            self.render = self.__render_single
+
+    ##──── the values of the data files are quoted with 'quote' (see quoteUrlValue and quoteJsonValue), the random values never need it.
+    ##──── 'quote' can also be a list with the quote of each variable of the text (see classRequestWireTemplate)
+    @staticmethod
+    def get_value_generator(variable:str,quote=None):
+        name, *args = variable.strip('%').split(':',1) if variable.startswith(('%%filerand:','%%fileseq:','%%fileunique:')) else variable.strip('%').split(':')
+        if name in ['filerand','fileseq','fileunique']:
+            return getDataFeeder(args[0]).get_value_generator(name,quote)
+        elif name == 'randomipv4' and not args:
+            return randomIPv4
+        elif name == 'randomipv6' and not args:
+            return randomIPv6
+        elif name == 'randomprivateipv4' and not args:
+            return randomPrivateIPv4
+        elif name == 'var' and len(args) == 1 and args[0]:
+            return getFlowVariableGenerator(args[0],quote)
+        elif name == 'randomint':
+            try:
+                val_min, val_max = [int(value) for value in args]
+                assert val_min <= val_max
+            except Exception as ERR:
+                raise StressAnAPIException(f"Invalid template variable '{variable}' - usage: %%randomint:val_min:val_max%% with integer values and val_min <= val_max") from None
+            return randomIntGenerator(val_min,val_max)
+        raise StressAnAPIException(f"Unknown template variable '{variable}' - use %%randomipv4%%, %%randomipv6%%, %%randomprivateipv4%%, %%randomint:val_min:val_max%%, "
+                                   f"%%filerand:file%%, %%fileseq:file%%, %%fileunique:file%% or %%var:name%% (flow)")
+
+    def render(self)->str:
+        parts = self.parts[:]
+        for slot, get_value in self.slots:
+            parts[slot] = get_value()
+        return ''.join(parts)
+
+    def __render_static(self)->str:
+        return self.text
+
+    def __render_single(self)->str:
+        return self.prefix + self.get_value() + self.suffix
+
+##──── Returns the compiled template of a string, or None when the string has no template variables
+def getStringTemplate(text:str,quote=None)->classStringTemplate:
+    string_template = classStringTemplate(text,quote)
+    return string_template if string_template.variables else None
+
+##──── Returns the json of the "post_data" and its compiled template (None without template variables), a GET request has no body
+def getPostDataTemplate(method:str,post_data:dict)->list:
+    if method == "GET":
+        return [b'',None]
+    post_data_json = str(json.dumps(post_data,sort_keys=False,ensure_ascii=False,separators=(",",":")))
+    return [post_data_json.encode(),getStringTemplate(post_data_json,quoteJsonValue)]
+
+##──── Returns the compiled templates of the header values with template variables
+def getHeaderTemplates(headers:dict)->list:
+    return [(header_key,header_template) for header_key,header_value in headers.items() if (header_template := getStringTemplate(header_value,quoteHeaderValue)) is not None]
+
+##──── A request rendered only once into raw HTTP bytes, where only the template variables of the url, of the headers and of the
+##──── body (post_data) are rendered per request. The head is compiled as a single string template where the first slots are the
+##──── variables of the path, so the same values are used in the url. The body is a json compiled once, json.dumps() is never
+##──── called per request. The rendered request is a list of bytes segments to be sent with a single sendmsg() (or joined for sendall/ssl).
+class classRequestWireTemplate:
+    def __init__(self,method:str,url:str,url_prefix_len:int,headers:list,body:bytes,url_template:classStringTemplate=None,body_template:classStringTemplate=None):
+        self.url = url
+        path = url[url_prefix_len:] or '/'
+        self.url_template = classStringTemplate(url,quoteUrlValue) if url_template is None else url_template
+        if self.url_template.variables and '%%' in url[:url_prefix_len]:
+            raise StressAnAPIException(f"The template variables in the host of the url are only supported by the 'urllib' engine - {url}")
+        ##──── the variables of the path are quoted like the url of the 'urllib' engine, and the values of the headers are checked
+        head = buildRequestHead(method,path,headers)
+        path_variables = len(classStringTemplate.variables_regex.findall(path))
+        head_variables = len(classStringTemplate.variables_regex.findall(head))
+        self.head_template = classStringTemplate(head,[quoteUrlValue] * path_variables + [quoteHeaderValue] * (head_variables - path_variables))
+        self.body_template = body_template if body_template is not None and body_template.variables else None
+        self.head_end = (getContentLengthHeader(method,body)+"\r\n").encode('latin-1') + body
+        if not self.head_template.variables and self.body_template is None:
+            self.segments = [buildRequestBytes(method,path,headers,body)]
+        elif len(self.head_template.slots) == 1 and len(self.url_template.slots) == 1 and self.body_template is None:
+            ##──── the most common template: only one variable in the url
+            self.prefix, self.get_value = self.head_template.prefix.encode('latin-1'), self.head_template.get_value
+            self.suffix = self.head_template.suffix.encode('latin-1') + self.head_end
+            self.url_prefix, self.url_suffix = self.url_template.prefix, self.url_template.suffix
+            self.render = self.__render_single
+        else:
+            self.url_slots_end = 2 * len(self.url_template.slots)
+            self.render = self.__render_template
+
+    def render(self)->list: # returns [request_segments, url]
+        return self.segments, self.url
+
+    def __render_template(self)->list:
+        head_parts, url_parts = self.head_template.parts[:], self.url_template.parts[:]
+        for slot, get_value in self.head_template.slots:
+            head_parts[slot] = get_value()
+        url_parts[1::2] = head_parts[1:self.url_slots_end:2]
+        if self.body_template is None:
+            return [''.join(head_parts).encode('latin-1'),self.head_end], ''.join(url_parts)
+        body = self.body_template.render().encode()
+        return [''.join(head_parts).encode('latin-1'),b'Content-Length: %d\r\n\r\n' % len(body),body], ''.join(url_parts)
+
+    def __render_single(self)->list:
+        value = self.get_value()
+        return [self.prefix,value.encode('latin-1'),self.suffix], self.url_prefix + value + self.url_suffix
+
+##──── Read an HTTP/1.x response from a buffered reader - returns [status_code, headers, body, keep_alive] ───────────────────────
+def readHttpResponse(rfile,method:str='GET',phases:classRequestPhases=None)->list:
+    status_line = rfile.readline(65537)
+    if not status_line:
+        raise classRemoteDisconnected("Remote end closed connection without response")
+    header_lines = []
+    while True:
+        header_line = rfile.readline(65537)
+        if header_line in (b'\r\n',b'\n',b''):
+            break
+        header_lines.append(header_line)
+    status_code,headers,keep_alive = parseResponseHead(status_line,header_lines)
+    if status_code < 200: # ignore an interim response (ex: 100 Continue) and read the final one
+        return readHttpResponse(rfile,method,phases)
+    if phases is not None:
+        phases.lap('ttfb')
+    if method == 'HEAD' or status_code in [204,304]:
+        body = b''
+    elif b'chunked' in headers.get(b'transfer-encoding',b'').lower():
+        body = readChunkedBody(rfile)
+    elif b'content-length' in headers:
+        content_length = int(headers[b'content-length'])
+        body = rfile.read(content_length)
+        if len(body) < content_length:
+            raise classRemoteDisconnected("Remote end closed connection without response")
+    else:
+        body, keep_alive = rfile.read(), False
+    if phases is not None:
+        phases.lap('transfer')
+    return [status_code,headers,body,keep_alive]
+
+##──── The same as readHttpResponse() but reading from an asyncio.StreamReader ───────────────────────────────────────────────────
+async def readHttpResponseAsync(reader,method:str='GET',phases:classRequestPhases=None)->list:
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        raise classRemoteDisconnected("Remote end closed connection without response") from None
+    status_line, *header_lines = head[:-4].split(b'\r\n')
+    status_code,headers,keep_alive = parseResponseHead(status_line,header_lines)
+    if status_code < 200:
+        return await readHttpResponseAsync(reader,method,phases)
+    if phases is not None:
+        phases.lap('ttfb')
+    try:
+        if method == 'HEAD' or status_code in [204,304]:
+            body = b''
+        elif b'chunked' in headers.get(b'transfer-encoding',b'').lower():
+            chunks = []
+            while (chunk_size := int((await reader.readline()).split(b';',1)[0],16)) > 0:
+                chunks.append(await reader.readexactly(chunk_size))
+                await reader.readline()
+            while (await reader.readline()) not in (b'\r\n',b'\n',b''): # discard the trailers
+                pass
+            body = b''.join(chunks)
+        elif b'content-length' in headers:
+            body = await reader.readexactly(int(headers[b'content-length']))
+        else:
+            body, keep_alive = await reader.read(), False
+    except asyncio.IncompleteReadError:
+        raise classRemoteDisconnected("Remote end closed connection without response") from None
+    if phases is not None:
+        phases.lap('transfer')
+    return [status_code,headers,body,keep_alive]
+
+def readChunkedBody(rfile)->bytes:
+    chunks = []
+    while True:
+        chunk_size = int(rfile.readline(65537).split(b';',1)[0],16)
+        if chunk_size == 0:
+            while rfile.readline(65537) not in (b'\r\n',b'\n',b''): # discard the trailers
+                pass
+            return b''.join(chunks)
+        chunks.append(rfile.read(chunk_size))
+        rfile.readline(65537)
+
+##──── socket.create_connection() with the "dns" and the "connect" phases of the request timed apart (see classRequestPhases)
+def createTimedConnection(address:tuple,timeout,source_address=None,phases:classRequestPhases=None)->socket.socket:
+    if phases is None:
+        return socket.create_connection(address,timeout,source_address)
+    addresses = socket.getaddrinfo(address[0],address[1],0,socket.SOCK_STREAM)
+    phases.lap('dns')
+    for index, (family,socktype,proto,canonname,sockaddr) in enumerate(addresses):
+        try:
+            sock = socket.create_connection(sockaddr[:2],timeout,source_address)
+            break
+        except OSError:
+            if index == len(addresses) - 1:
+                raise
+    phases.lap('connect')
+    return sock
+
+##──── The same as createTimedConnection() for the virtual clients of the 'asyncio' engine, with the "tls" phase timed apart when
+##──── the StreamWriter has start_tls() (python 3.11+), otherwise the tls handshake is counted in the "connect" phase
+async def openTimedConnectionAsync(host:str,port:int,ssl_context,phases:classRequestPhases)->list:
+    addresses = await asyncio.get_running_loop().getaddrinfo(host,port,type=socket.SOCK_STREAM)
+    phases.lap('dns')
+    start_tls = ssl_context is not None and hasattr(asyncio.StreamWriter,'start_tls')
+    for index, (family,socktype,proto,canonname,sockaddr) in enumerate(addresses):
+        try:
+            if ssl_context is None or start_tls:
+                reader, writer = await asyncio.open_connection(sockaddr[0],sockaddr[1])
+            else:
+                reader, writer = await asyncio.open_connection(sockaddr[0],sockaddr[1],ssl=ssl_context,server_hostname=host)
+            break
+        except OSError:
+            if index == len(addresses) - 1:
+                raise
+    phases.lap('connect')
+    if start_tls:
+        await writer.start_tls(ssl_context,server_hostname=host)
+        phases.lap('tls')
+    return [reader,writer]
+
+##──── A persistent HTTP/1.1 connection (keep-alive) used by the connection pool ─────────────────────────────────────────────────
+class classHttpConnection:
+    def __init__(self,scheme:str,host:str,port:int,pool_options:dict,connStats,phases:classRequestPhases=None):
+        self.scheme, self.host, self.port = scheme, host, port
+        self.pool_options = pool_options
+        self.connStats = connStats
+        self.phases = phases
+        self.sock, self.rfile, self.timeout = None, None, None
+        self.requests, self.last_used = 0, time.monotonic()
+
+    def connect(self,timeout):
+        self.sock = createTimedConnection((self.host,self.port),timeout,None,self.phases)
+        if self.pool_options['tcp_nodelay']:
+            self.sock.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        if self.pool_options['send_buffer'] > 0:
+            self.sock.setsockopt(socket.SOL_SOCKET,socket.SO_SNDBUF,self.pool_options['send_buffer'])
+        if self.pool_options['recv_buffer'] > 0:
+            self.sock.setsockopt(socket.SOL_SOCKET,socket.SO_RCVBUF,self.pool_options['recv_buffer'])
+        if self.scheme == 'https':
+            self.sock = getSSLContext().wrap_socket(self.sock,server_hostname=self.host)
+            if self.phases is not None:
+                self.phases.lap('tls')
+        self.rfile = self.sock.makefile('rb')
+        self.timeout, self.requests, self.last_used = timeout, 0, time.monotonic()
+        self.connStats.opened.incr()
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.rfile.close()
+                self.sock.close()
+            except Exception as ERR:
+                logDebug(f"classHttpConnection.close: {str(ERR)}")
+            finally:
+                self.sock, self.rfile = None, None
+                self.connStats.closed.incr()
+
+    def is_expired(self)->bool:
+        max_requests = self.pool_options['max_requests']
+        return (max_requests > 0 and self.requests >= max_requests) or (time.monotonic() - self.last_used > self.pool_options['max_idle_time'])
+
+    def send(self,request_segments:list,timeout:float):
+        if self.sock is None:
+            self.connect(timeout)
+        elif self.timeout != timeout:
+            self.sock.settimeout(timeout)
+            self.timeout = timeout
+        if self.scheme == 'https' or not hasattr(self.sock,'sendmsg'): # ssl sockets and windows don't have sendmsg()
+            self.sock.sendall(b''.join(request_segments))
+        else:
+            bytes_sent = self.sock.sendmsg(request_segments)
+            if bytes_sent < sum(map(len,request_segments)):
+                self.sock.sendall(b''.join(request_segments)[bytes_sent:])
+
+    def read_response(self,method:str)->list:
+        response = readHttpResponse(self.rfile,method,self.phases)
+        self.requests += 1
+        self.last_used = time.monotonic()
+        return response
+
+    def request(self,request_segments:list,method:str,timeout:float)->list:
+        self.send(request_segments,timeout)
+        return self.read_response(method)
+
+##──── A bounded pool of persistent connections owned by a single request thread (no locks needed) ─────────────────────────────
+##──── The connections are used in round-robin, so the requests are spread over 'pool_size' connections of the server.
+class classConnectionPool:
+    def __init__(self,url:str,pool_options:dict,connStats,phases:classRequestPhases=None):
+        url_parts = urllib.parse.urlsplit(url)
+        self.scheme, self.host = url_parts.scheme, url_parts.hostname
+        self.port = url_parts.port if url_parts.port is not None else (443 if self.scheme == 'https' else 80)
+        self.pool_options = pool_options
+        self.connStats = connStats
+        self.phases = phases
+        self.__connections = deque()
+
+    def __new_connection(self)->classHttpConnection:
+        return classHttpConnection(self.scheme,self.host,self.port,self.pool_options,self.connStats,self.phases)
+
+    def acquire(self)->classHttpConnection:
+        if len(self.__connections) < self.pool_options['pool_size']:
+            return self.__new_connection()
+        conn = self.__connections.popleft()
+        if conn.sock is not None and conn.is_expired():
+            conn.close()
+        return conn
+
+    def request(self,request_segments:list,method:str,timeout:float)->list:
+        if self.phases is not None:
+            self.phases.start()
+        conn = self.acquire()
+        reused = conn.sock is not None
+        try:
+            try:
+                response = conn.request(request_segments,method,timeout)
+            except (classRemoteDisconnected,BrokenPipeError,ConnectionResetError) as ERR:
+                if not reused:
+                    raise
+                ##──── the server closed the idle connection, so reconnect and send the request again
+                logDebug(f"classConnectionPool.request: reconnecting after {str(ERR)}")
+                conn.close()
+                self.connStats.reconnects.incr()
+                reused = False
+                response = conn.request(request_segments,method,timeout)
+        except Exception:
+            conn.close()
+            raise
+        finally:
+            self.__connections.append(conn)
+            self.connStats.requests.incr()
+            if reused:
+                self.connStats.reused.incr()
+        if not response[3]: # the server does not want to keep the connection alive
+            conn.close()
+        return response
+
+    def close(self):
+        while self.__connections:
+            self.__connections.popleft().close()
+
+##################################################################################################################################
+##################################################################################################################################
+
+ #  #   ##   #  #  ####        ###   ####   ##   #  #  ####   ### #####   ###
+ ####  #  #  # #   #           #  #  #     #  #  #  #  #     #      #    #
+ ####  #  #  ##    ###         ###   ###   #  #  #  #  ###    ##    #     ##
+ #  #  ####  # #   #           # #   #     #  #  #  #  #        #   #       #
+ #  #  #  #  #  #  ####        #  #  ####   ##    ##   ####  ###    #    ###
+                                             ##
+
+##──── The connections of the 'urllib' engine with the "dns", "connect" and "tls" phases of the requests timed apart
+class classPhaseHTTPConnection(http.client.HTTPConnection):
+    def __init__(self,*args,phases:classRequestPhases=None,**kwargs):
+        super().__init__(*args,**kwargs)
+        self._create_connection = functools.partial(createTimedConnection,phases=phases)
+        self.phases = phases
+
+class classPhaseHTTPSConnection(classPhaseHTTPConnection,http.client.HTTPSConnection):
+    def connect(self):
+        super().connect() # the tls handshake is made after the "connect" phase
+        self.phases.lap('tls')
+
+class classPhaseHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self,phases:classRequestPhases):
+        super().__init__()
+        self.phases = phases
+
+    def http_open(self,req):
+        return self.do_open(classPhaseHTTPConnection,req,phases=self.phases)
+
+class classPhaseHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self,phases:classRequestPhases):
+        super().__init__()
+        self.phases = phases
+
+    def https_open(self,req):
+        return self.do_open(classPhaseHTTPSConnection,req,context=self._context,phases=self.phases)
+
+class threadMakeRequestsURLLib(threading.Thread):
+    def __init__(self,stats:classStatsShard):
+        threading.Thread.__init__(self)
+        self.stop = threading.Event()
+        self.stats = stats
+        self.timeStats = stats.time_stats
+        self.httpStats = stats.http_stats
+        zfill_len = len(str(len(G.thread_list))) if len(str(len(G.thread_list))) >= 2 else 2
+        self.text_id = f"[#{self.name.split('-')[1].zfill(zfill_len)}]"
+    def run(self):
+        self.prepare_url_template()
+        self.prepare_request()
+        if self.flow_steps:
+            return self.run_flow()
+        if G.arrival_scheduler is not None:
+            return self.run_open_loop()
+        url = self.url
+            
+        while True:
+            if G.event_quit.is_set() or self.stop.is_set():
+                break
+            while G.event_pause.is_set():
+                time.sleep(1)
+                if self.stop.is_set():
+                    break
+            cpu_start_time, requests = time.thread_time_ns(), 0
+            for I in range(G.config.burst):
+                if self.stop.is_set(): break
+                self.stats.sent += 1
+                try:
+                    with elapsedTimer() as elapsed:
+                        url,response_code,response_body = self.make_request(G.config.timeout)
+                    self.timeStats.save(elapsed.time)
+                except Exception as ERR:
+                    logDebug(f"urllib_get error: {str(ERR)}")
+                finally:
+                    requests += 1
+                    if self.request_patterns:
+                        self.save_pattern(url,response_code,elapsed.time)
+                    logResponse(self.text_id,self.method,url,response_code,response_body,elapsed.text(),self.phases)
+            self.stats.client_cpu.add(time.thread_time_ns()-cpu_start_time,requests)
+            time.sleep(G.config.interval)
+        self.close()
+
+    ##──── open-loop: each request is sent at the intended time given by the arrival scheduler, and the elapsed time is
+    ##──── measured from the intended time, so the time waiting for a free thread is included (coordinated omission)
+    def run_open_loop(self):
+        url = self.url
+        while not (G.event_quit.is_set() or self.stop.is_set()):
+            if G.event_pause.is_set():
+                while G.event_pause.is_set() and not self.stop.is_set():
+                    time.sleep(0.1)
+                G.arrival_scheduler.restart()
+                continue
+            intended_time = G.arrival_scheduler.wait_slot(G.arrival_scheduler.next_slot())
+            cpu_start_time = time.thread_time_ns()
+            self.stats.lag_stats.save(time.monotonic() - intended_time)
+            self.stats.sent += 1
+            try:
+                url,response_code,response_body = self.make_request(G.config.timeout)
+            except Exception as ERR:
+                logDebug(f"urllib_get error: {str(ERR)}")
+            finally:
+                elapsed_time = time.monotonic() - intended_time
+                self.timeStats.save(elapsed_time)
+                self.stats.client_cpu.add(time.thread_time_ns()-cpu_start_time,1)
+                if self.request_patterns:
+                    self.save_pattern(url,response_code,elapsed_time)
+                logResponse(self.text_id,self.method,url,response_code,response_body,'[%.6f]'%(elapsed_time),self.phases)
+        self.close()
+
+    def prepare_url_template(self):
+        self.method, self.url = G.config.method, G.config.url
+        self.post_data, self.post_data_template = getPostDataTemplate(self.method,G.config.post_data)
+        self.url_template = classStringTemplate(self.url,quoteUrlValue)
+        self.header_templates = getHeaderTemplates(G.config.headers)
+        self.scenario = newScenarioReader() if G.config.scenario_file != '' or G.config.replay_file != '' else None
+        self.mix = [classMixRequest(request) for request in G.config.requests]
+        self.mix_sampler = classAliasSampler([request['weight'] for request in G.config.requests]) if self.mix else None
+        self.flow_steps = [classFlowStep(step,self.flow_headers(step['headers'])) for step in G.config.flow]
+        self.assertions = classResponseAssertions(G.config.assertions,G.config.assertions_sample_rate) if G.config.assertions else None
+        self.phases = classRequestPhases() if G.config.phase_timing else None
+        self.request_patterns = self.scenario is not None or bool(self.mix) # the statistics by request of the scenario or of the mix (the flow saves its own)
+
+    ##──── the "flow": each thread is a virtual user that sends the steps in order, with the think times between the steps. The flow
+    ##──── stops at the first step that fails, and the whole flow is counted with the sum of the elapsed times of its steps.
+    def run_flow(self):
+        session = classFlowSession()
+        while not (G.event_quit.is_set() or self.stop.is_set()):
+            while G.event_pause.is_set() and not self.stop.is_set():
+                time.sleep(0.1)
+            cpu_start_time, requests = time.thread_time_ns(), 0
+            for I in range(G.config.burst):
+                session.start()
+                flow_code, flow_time = None, 0.0
+                for index, step in enumerate(self.flow_steps):
+                    if self.stop.is_set():
+                        flow_code = None # a flow interrupted by the end of the thread is not counted
+                        break
+                    method,url,headers,body = session.render(step)
+                    self.stats.sent += 1
+                    start_time = time.monotonic()
+                    response_code,response_headers,response_body,response_text = self.flow_open(step,method,url,headers,body,G.config.timeout)
+                    elapsed_time = time.monotonic() - start_time
+                    self.timeStats.save(elapsed_time)
+                    requests += 1
+                    flow_code = self.save_flow_step(session,step,method,url,response_code,response_headers,response_body,response_text,elapsed_time,self.phases)
+                    flow_time += elapsed_time
+                    if flow_code not in G.config.success_status_codes:
+                        break
+                    ##──── the think time is the pause after the step, also after the last one before the flow starts again
+                    if (think_time := step.think_time()) > 0 and self.stop.wait(think_time) and index < len(self.flow_steps) - 1:
+                        flow_code = None
+                        break
+                if flow_code is not None:
+                    self.stats.save_pattern(G.flow_pattern,flow_code,flow_time)
+            self.stats.client_cpu.add(time.thread_time_ns()-cpu_start_time,requests)
+            time.sleep(G.config.interval)
+        self.close()
+
+    ##──── the statistics by step and the log of a step of the "flow", returns the status code of the step for the flow
+    def save_flow_step(self,session,step,method,url,response_code,response_headers,response_body,response_text,elapsed_time,phases=None)->int:
+        flow_code = session.process(step,response_code,response_headers,response_body)
+        self.stats.save_pattern(step.name,flow_code,elapsed_time)
+        logResponse(self.text_id,method,url,response_code,response_text,'[%.6f]'%(elapsed_time),phases)
+        return flow_code
+
+    ##──── the headers of a step of the "flow", with the StressAnAPI useragent if the user has not configured any other
+    def flow_headers(self,headers:dict)->list:
+        return ([] if 'user-agent' in [key.lower() for key in headers.keys()] else [('User-Agent',G.default_user_agent)]) + list(headers.items())
+
+    ##──── a step of the "flow", the whole body is read only when a value is extracted from it
+    def flow_open(self,step,method,url,headers,body,timeout)->list:
+        response_headers, response_body = {}, b''
+        try:
+            request = urllib.request.Request(url=url,data=body if body or method != 'GET' else None,headers=dict(headers),method=method)
+            if self.phases is not None:
+                self.phases.start()
+            try:
+                response = self.open_url(request,timeout=timeout)
+            except urllib.error.HTTPError as ERR: # an error response is a response of the flow too (ex: 401 of a login)
+                response = ERR
+            if self.phases is not None:
+                self.phases.lap('ttfb')
+            check_response = self.assertions is not None and self.assertions.sample()
+            response_text, body_size, transfer_ns = None, None, 0
+            with response:
+                response_code, response_headers = response.getcode(), getResponseHeadersDict(response.headers)
+                if step.read_body or (check_response and self.assertions.read_body):
+                    response_body = response.read()
+                elif self.body_buffer is not None: # "read_full_body" and the body is not used: drained into the buffer of the thread
+                    response_text,body_size,transfer_ns = self.drain_body(response,response_code)
+                else:
+                    response_body = response.readline()
+            body_size = len(response_body) if body_size is None else body_size
+            self.stats.bandwidth.add(body_size,getUrllibRequestSize(request),body_size if transfer_ns > 0 else 0,transfer_ns) # only the bytes read
+            if self.phases is not None:
+                self.phases.lap('transfer')
+                self.stats.phase_stats.save(self.phases)
+            response_text = getResponseText(response_code,response_body) if response_text is None else response_text
+            if check_response:
+                response_code,response_text = self.assertions.check(response_code,response_headers,response_body,response_text)
+        except Exception as ERR:
+            response_code,response_text = getErrorResponseCode(str(ERR)),shortenErrorMessage(str(ERR),128)
+            logDebug(f"flow_open: {str(ERR)}")
+        self.httpStats.save(response_code)
+        return [response_code,response_headers,response_body,response_text]
+
+    def prepare_request(self):
+        self.req = self.new_urllib_request(self.url,self.method,G.config.headers)
+        self.body_buffer = memoryview(bytearray(G.body_buffer_size)) if G.config.read_full_body else None
+        ##──── with "phase_timing" the requests are opened with the handlers that time the phases of the connection
+        self.open_url = urllib.request.build_opener(classPhaseHTTPHandler(self.phases),classPhaseHTTPSHandler(self.phases)).open if self.phases is not None else urllib.request.urlopen
+        for mix_request in self.mix:
+            mix_request.req = self.new_urllib_request(mix_request.url,mix_request.method,mix_request.headers)
+
+    def new_urllib_request(self,url:str,method:str,headers:dict)->urllib.request.Request:
+        req = urllib.request.Request(url=url,method=method)
+        ##──── configure StressAnAPI useragent if the user has not configured any other
+        if 'user-agent' not in [key.lower() for key,val in headers.items()]:
+            req.add_header('User-Agent',G.default_user_agent)
+        ##─────────────────────────────────────────────────────────────────────────────
+        for header_key, header_value in headers.items():
+            req.add_header(header_key,header_value)
+        return req
+
+    def make_request(self,timeout):
+        if self.scenario is not None:
+            return self.make_scenario_request(timeout)
+        if self.mix:
+            return self.make_mix_request(timeout)
+        self.req.full_url = url = self.url_template.render()
+        self.req.data = self.post_data if self.post_data_template is None else self.post_data_template.render().encode()
+        for header_key, header_template in self.header_templates:
+            self.req.add_header(header_key,header_template.render())
+        return url,*self.urllib_open(self.req,timeout)
+
+    ##──── the next row of the "scenario_file", the headers of the row replace the headers of the configuration with the same name
+    def make_scenario_request(self,timeout):
+        row = self.scenario.next_row()
+        request = urllib.request.Request(url=row.url,data=row.body if row.body or row.method != 'GET' else None,headers=self.req.headers,method=row.method)
+        for header_key, header_value in row.headers:
+            request.add_header(header_key,header_value)
+        return row.url,*self.urllib_open(request,timeout)
+
+    ##──── a request of the "requests" mix chosen with the weights of the mix, rendered like the request of "url"
+    def make_mix_request(self,timeout):
+        mix_request = self.mix[self.mix_sampler.sample()]
+        req = mix_request.req
+        if mix_request.url_template.variables:
+            req.full_url = url = getPatternUrl(mix_request.url_template.render(),mix_request.name)
+        else:
+            url = mix_request.url
+        req.data = mix_request.post_data if mix_request.post_data_template is None else mix_request.post_data_template.render().encode()
+        for header_key, header_template in mix_request.header_templates:
+            req.add_header(header_key,header_template.render())
+        return url,*self.urllib_open(req,timeout)
+
+    ##──── the statistics by method+path pattern of the requests of the "scenario_file", or by request of the "requests" mix
+    def save_pattern(self,url,response_code,elapsed_time):
+        if isinstance(url,classScenarioUrl):
+            self.stats.save_pattern(url.pattern,response_code,elapsed_time)
+
+    ##──── the wire template of the 'pooled', 'asyncio' and 'pipeline' engines, or the rows of the "scenario_file", or the "requests" mix
+    def new_wire_template(self):
+        if self.scenario is not None:
+            return classScenarioWireTemplate(self.scenario,self.headers)
+        if self.mix: # the requests of the mix use the host of "url" (checked by validateRequestMix)
+            netloc = urllib.parse.urlsplit(self.url).netloc
+            return classRequestMixWireTemplate([classRequestWireTemplate(mix_request.method,mix_request.url,self.url_prefix_len,getRequestHeaders(netloc,mix_request.headers),
+                                                                         mix_request.post_data,mix_request.url_template,mix_request.post_data_template) for mix_request in self.mix],self.mix_sampler)
+        return classRequestWireTemplate(self.method,self.url,self.url_prefix_len,self.headers,self.post_data,self.url_template,self.post_data_template)
+
+    def close(self):
+        pass
+
+    # @showElapsedTimeAverageDecorator(5000)
+    def urllib_open(self,urllib_request,timeout):
+        try:
+            if self.phases is not None:
+                self.phases.start()
+            try:
+                response = self.open_url(urllib_request,timeout=timeout)
+            except urllib.error.HTTPError as ERR: # a non-2xx response is timed and measured like the others (see flow_open)
+                response = ERR
+            with response:
+                if self.phases is not None:
+                    self.phases.lap('ttfb')
+                response_code, body_size, transfer_ns = response.getcode(), 0, 0
+                ##──── the bytes received are the bytes read, without "read_full_body" only the first line of the body
+                if self.assertions is not None and self.assertions.sample(): # the whole body is read only for the assertions
+                    body = response.read() if self.assertions.read_body or self.body_buffer is not None else response.readline()
+                    body_size = len(body)
+                    headers = getResponseHeadersDict(response.headers) if self.assertions.read_headers else {}
+                    response_code,response_text = self.assertions.check(response_code,headers,body,getResponseText(response_code,body))
+                elif self.body_buffer is not None:
+                    response_text,body_size,transfer_ns = self.drain_body(response,response_code)
+                elif response_code not in [202,204]:
+                    first_line = response.readline()
+                    response_text, body_size = first_line.strip().decode(), len(first_line)
+                else:
+                    response_text = '\b'
+                self.stats.bandwidth.add(body_size,getUrllibRequestSize(urllib_request),body_size if transfer_ns > 0 else 0,transfer_ns)
+                if self.phases is not None:
+                    self.phases.lap('transfer')
+                    self.stats.phase_stats.save(self.phases)
+        except Exception as ERR:
+            response_code,response_text = getErrorResponseCode(str(ERR)),shortenErrorMessage(str(ERR),128)
+            logDebug(f"urllib_open: {str(ERR)}")
+        finally:
+            self.httpStats.save(response_code)
+            return response_code,response_text
+
+    ##──── "read_full_body": the body is drained into the buffer of the thread, that is reused by all the responses (no allocation
+    ##──── per response), so the elapsed time includes the transfer of the whole body - returns [response_text, body_size, transfer_ns]
+    def drain_body(self,response,response_code)->list:
+        transfer_start, body_size, first_line = time.perf_counter_ns(), 0, b''
+        while (length := response.readinto(self.body_buffer)) > 0:
+            if body_size == 0:
+                first_line = self.body_buffer[:min(length,1024)].tobytes().split(b'\n',1)[0]
+            body_size += length
+        return [getResponseText(response_code,first_line),body_size,time.perf_counter_ns() - transfer_start]
+
+    def identify(self):
+        return self.name,self.native_id
+
+    def join(self):
+        try:
+            self.stop.set()
+            threading.Thread.join(self)
+            self.stats.finished = True
+        except Exception as ERR:
+            log(f"Unable to join thread {self.name} - {self.native_id}")
+        return self.name,self.native_id
+
+    def extract_template_var(self,text_string):
+        try:
+            match = classStringTemplate.variables_regex.search(text_string)
+            return match.group(0) if match else ''
+        except Exception as ERR:
+            logDebug(f"extract_template_var: {str(ERR)}")
+            return ''
+
+##──── The 'pooled' engine: keeps a bounded pool of persistent HTTP/1.1 connections per thread ───────────────────────────────────
+class threadMakeRequestsPooled(threadMakeRequestsURLLib):
+    def prepare_request(self):
+        url_parts = urllib.parse.urlsplit(self.url)
+        self.url_prefix_len = len(f"{url_parts.scheme}://{url_parts.netloc}")
+        self.headers = getRequestHeaders(url_parts.netloc)
+        self.wire_template = self.new_wire_template()
+        self.pool = classConnectionPool(self.url,G.config.connection_pool,connStats,self.phases)
+
+    def make_request(self,timeout):
+        request_segments,url = self.wire_template.render()
+        return url,*self.pool_open(request_segments,timeout)
+
+    def flow_headers(self,headers:dict)->list:
+        return getRequestHeaders(urllib.parse.urlsplit(self.url).netloc,headers)
+
+    def flow_open(self,step,method,url,headers,body,timeout)->list:
+        response_headers, response_body = {}, b''
+        try:
+            request_bytes = buildRequestBytes(method,url[self.url_prefix_len:] or '/',headers,body)
+            response_code,response_headers,response_body,keep_alive = self.pool.request([request_bytes],method,timeout)
+            self.stats.bandwidth.add(len(response_body),len(request_bytes))
+            if self.phases is not None:
+                self.stats.phase_stats.save(self.phases)
+            response_text = getResponseText(response_code,response_body)
+            if self.assertions is not None and self.assertions.sample():
+                response_code,response_text = self.assertions.check(response_code,response_headers,response_body,response_text)
+        except Exception as ERR:
+            response_code,response_text = getErrorResponseCode(str(ERR)),shortenErrorMessage(str(ERR),128)
+            logDebug(f"flow_open: {str(ERR)}")
+        self.httpStats.save(response_code)
+        return [response_code,response_headers,response_body,response_text]
+
+    def pool_open(self,request_segments,timeout):
+        try:
+            response_code,headers,body,keep_alive = self.pool.request(request_segments,self.method,timeout)
+            self.stats.bandwidth.add(len(body),sum(map(len,request_segments)))
+            if self.phases is not None:
+                self.stats.phase_stats.save(self.phases)
+            response_text = getResponseText(response_code,body)
+            if self.assertions is not None and self.assertions.sample():
+                response_code,response_text = self.assertions.check(response_code,headers,body,response_text)
+        except Exception as ERR:
+            response_code,response_text = getErrorResponseCode(str(ERR)),shortenErrorMessage(str(ERR),128)
+            logDebug(f"pool_open: {str(ERR)}")
+        finally:
+            self.httpStats.save(response_code)
+            return response_code,response_text
+
+    def close(self):
+        self.pool.close()
+
+##──── asyncio raises TimeoutError without a message and "Connect call failed" for a refused connection, so the errors are
+##──── renamed to get the same response codes of the other engines (see getErrorResponseCode)
+def getAsyncErrorMessage(ERR:Exception)->str:
+    if isinstance(ERR,asyncio.TimeoutError):
+        return "timed out"
+    elif isinstance(ERR,ConnectionRefusedError):
+        return f"Connection refused - {str(ERR)}"
+    return str(ERR)
+
+##──── The persistent connection of a virtual client of the 'asyncio' engine, reopened after "pool_max_requests" requests or
+##──── "pool_max_idle_time" seconds. The connection is closed when a request fails, and the next request opens a new one.
+class classAsyncConnection:
+    def __init__(self,open_connection,close_connection,phases:classRequestPhases=None):
+        self.open_connection, self.close_connection, self.phases = open_connection, close_connection, phases
+        self.reader, self.writer, self.requests, self.last_used = None, None, 0, time.monotonic()
+        self.max_requests, self.max_idle_time = G.config.connection_pool['max_requests'], G.config.connection_pool['max_idle_time']
+
+    async def request(self,request_segments:list,method:str,timeout:float,start_time:float)->list:
+        if self.writer is not None and ((self.max_requests > 0 and self.requests >= self.max_requests) or (start_time - self.last_used > self.max_idle_time)):
+            self.close()
+        reused = self.writer is not None
+        if self.phases is not None:
+            self.phases.start()
+        try:
+            try:
+                if self.writer is None:
+                    self.reader, self.writer = await self.open_connection(timeout,self.phases)
+                    self.requests = 0
+                response = await asyncio.wait_for(self.send(request_segments,method),timeout)
+            except (classRemoteDisconnected,BrokenPipeError,ConnectionResetError) as ERR:
+                if not reused:
+                    raise
+                ##──── the server closed the idle connection, so reconnect and send the request again
+                self.close()
+                reused = False
+                connStats.reconnects.incr()
+                self.reader, self.writer = await self.open_connection(timeout,self.phases)
+                self.requests = 0
+                response = await asyncio.wait_for(self.send(request_segments,method),timeout)
+            self.requests, self.last_used = self.requests + 1, time.monotonic()
+            if not response[3]: # the server does not want to keep the connection alive
+                self.close()
+        except Exception:
+            self.close()
+            raise
+        finally:
+            connStats.requests.incr()
+            if reused:
+                connStats.reused.incr()
+        return response
+
+    ##──── drain() waits while the transport buffer is over its high-water mark (ex: a large body), the timeout covers the send too
+    async def send(self,request_segments:list,method:str)->list:
+        self.writer.writelines(request_segments)
+        await self.writer.drain()
+        return await readHttpResponseAsync(self.reader,method,self.phases)
+
+    def close(self):
+        if self.writer is not None:
+            self.close_connection(self.writer)
+            self.writer = None
+
+##──── The 'asyncio' engine: a single thread with an event loop driving many concurrent virtual clients ─────────────────────────
+##──── Each virtual client keeps its own persistent connection and follows the same burst/interval logic of a request thread.
+class threadMakeRequestsAsyncio(threadMakeRequestsURLLib):
+    def __init__(self,stats:classStatsShard):
+        super().__init__(stats)
+        self.loop = None
+        self.clients = []
+
+    def run(self):
+        self.prepare_url_template()
+        self.prepare_request()
+        asyncio.run(self.main())
+
+    def prepare_request(self):
+        url_parts = urllib.parse.urlsplit(self.url)
+        self.url_prefix_len = len(f"{url_parts.scheme}://{url_parts.netloc}")
+        self.headers = getRequestHeaders(url_parts.netloc)
+        self.wire_template = self.new_wire_template()
+        self.requests = 0
+        self.host = url_parts.hostname
+        self.port = url_parts.port if url_parts.port is not None else (443 if url_parts.scheme == 'https' else 80)
+        self.ssl_context = getSSLContext() if url_parts.scheme == 'https' else None
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.__set_clients(G.config.clients)
+        cpu_start_time, requests = time.thread_time_ns(), 0
+        while not (G.event_quit.is_set() or self.stop.is_set()):
+            await asyncio.sleep(0.1)
+            ##──── all virtual clients run in this thread, so its cpu time is shared by all the requests made
+            cpu_time, requests_done = time.thread_time_ns(), self.requests
+            self.stats.client_cpu.add(cpu_time-cpu_start_time,requests_done-requests)
+            cpu_start_time, requests = cpu_time, requests_done
+        self.__set_clients(0)
+        await asyncio.sleep(0)
+
+    def __set_clients(self,number_of_clients:int):
+        while len(self.clients) < number_of_clients:
+            self.clients.append(self.loop.create_task(self.virtual_client_flow() if self.flow_steps else self.virtual_client()))
+        while len(self.clients) > number_of_clients:
+            self.clients.pop().cancel()
+
+    ##──── Thread safe: called by the keyboard thread to change the number of virtual clients
+    def set_clients(self,number_of_clients:int):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.__set_clients,number_of_clients)
+
+    def flow_headers(self,headers:dict)->list:
+        return getRequestHeaders(urllib.parse.urlsplit(self.url).netloc,headers)
+
+    async def open_connection(self,timeout,phases:classRequestPhases=None):
+        if phases is None:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host,self.port,ssl=self.ssl_context),timeout)
+        else:
+            reader, writer = await asyncio.wait_for(openTimedConnectionAsync(self.host,self.port,self.ssl_context,phases),timeout)
+        sock, pool_options = writer.get_extra_info('socket'), G.config.connection_pool
+        if pool_options['tcp_nodelay']:
+            sock.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        if pool_options['send_buffer'] > 0:
+            sock.setsockopt(socket.SOL_SOCKET,socket.SO_SNDBUF,pool_options['send_buffer'])
+        if pool_options['recv_buffer'] > 0:
+            sock.setsockopt(socket.SOL_SOCKET,socket.SO_RCVBUF,pool_options['recv_buffer'])
+        connStats.opened.incr()
+        return reader, writer
+
+    def close_connection(self,writer):
+        try:
+            writer.close()
+        except Exception as ERR:
+            logDebug(f"close_connection: {str(ERR)}")
+        finally:
+            connStats.closed.incr()
+
+    async def virtual_client(self):
+        connection = classAsyncConnection(self.open_connection,self.close_connection,classRequestPhases() if G.config.phase_timing else None)
+        scheduler = G.arrival_scheduler
+        try:
+            while True:
+                if G.event_pause.is_set():
+                    while G.event_pause.is_set():
+                        await asyncio.sleep(0.1)
+                    if scheduler is not None:
+                        scheduler.restart()
+                for I in range(G.config.burst if scheduler is None else 1):
+                    if scheduler is not None: # open-loop: wait for the intended send time (the event loop can't spin)
+                        start_time = await scheduler.wait_slot_async(scheduler.next_slot())
+                        self.stats.lag_stats.save(time.monotonic() - start_time)
+                    request_segments,url = self.wire_template.render()
+                    self.stats.sent += 1
+                    if scheduler is None:
+                        start_time = time.monotonic()
+                    try:
+                        response_code,headers,body,keep_alive = await connection.request(request_segments,self.method,G.config.timeout,start_time)
+                        self.stats.bandwidth.add(len(body),sum(map(len,request_segments)))
+                        if connection.phases is not None:
+                            self.stats.phase_stats.save(connection.phases)
+                        response_text = getResponseText(response_code,body)
+                        if self.assertions is not None and self.assertions.sample():
+                            response_code,response_text = self.assertions.check(response_code,headers,body,response_text)
+                        self.timeStats.save(connection.last_used - start_time)
+                    except Exception as ERR:
+                        error_message = getAsyncErrorMessage(ERR)
+                        response_code,response_text = getErrorResponseCode(error_message),shortenErrorMessage(error_message,128)
+                        logDebug(f"virtual_client: {error_message}")
+                        self.timeStats.save(time.monotonic() - start_time) # the errors are timed like with the other engines
+                    self.requests += 1
+                    self.httpStats.save(response_code)
+                    if self.request_patterns:
+                        self.save_pattern(url,response_code,time.monotonic()-start_time)
+                    logResponse(self.text_id,self.method,url,response_code,response_text,'[%.6f]'%(time.monotonic()-start_time),connection.phases)
+                if scheduler is None:
+                    await asyncio.sleep(G.config.interval)
+        finally:
+            connection.close()
+
+    ##──── the "flow" of a virtual client, see threadMakeRequestsURLLib.run_flow()
+    async def virtual_client_flow(self):
+        connection, session = classAsyncConnection(self.open_connection,self.close_connection,classRequestPhases() if G.config.phase_timing else None), classFlowSession()
+        try:
+            while True:
+                while G.event_pause.is_set():
+                    await asyncio.sleep(0.1)
+                for I in range(G.config.burst):
+                    session.start()
+                    flow_code, flow_time = None, 0.0
+                    for index, step in enumerate(self.flow_steps):
+                        method,url,headers,body = session.render(step)
+                        self.stats.sent += 1
+                        start_time, response_headers, response_body = time.monotonic(), {}, b''
+                        try:
+                            request_bytes = buildRequestBytes(method,url[self.url_prefix_len:] or '/',headers,body)
+                            response_code,response_headers,response_body,keep_alive = await connection.request([request_bytes],method,G.config.timeout,start_time)
+                            self.stats.bandwidth.add(len(response_body),len(request_bytes))
+                            if connection.phases is not None:
+                                self.stats.phase_stats.save(connection.phases)
+                            response_text = getResponseText(response_code,response_body)
+                            if self.assertions is not None and self.assertions.sample():
+                                response_code,response_text = self.assertions.check(response_code,response_headers,response_body,response_text)
+                            self.timeStats.save(connection.last_used - start_time)
+                        except Exception as ERR:
+                            error_message = getAsyncErrorMessage(ERR)
+                            response_code,response_text = getErrorResponseCode(error_message),shortenErrorMessage(error_message,128)
+                            logDebug(f"virtual_client_flow: {error_message}")
+                            self.timeStats.save(time.monotonic() - start_time)
+                        elapsed_time = time.monotonic() - start_time
+                        self.requests += 1
+                        self.httpStats.save(response_code)
+                        flow_code = self.save_flow_step(session,step,method,url,response_code,response_headers,response_body,response_text,elapsed_time,connection.phases)
+                        flow_time += elapsed_time
+                        if flow_code not in G.config.success_status_codes:
+                            break
+                        if (think_time := step.think_time()) > 0:
+                            await asyncio.sleep(think_time)
+                    if flow_code is not None:
+                        self.stats.save_pattern(G.flow_pattern,flow_code,flow_time)
+                await asyncio.sleep(G.config.interval)
+        finally:
+            connection.close()
+
+##──── The 'pipeline' engine: each thread writes 'pipeline_depth' requests back-to-back in one connection before reading the responses
+##──── The responses are matched to the requests in order and the elapsed time of each request starts at its own send time.
+class threadMakeRequestsPipeline(threadMakeRequestsPooled):
+    def run(self):
+        self.prepare_url_template()
+        self.prepare_request()
+        while True:
+            if G.event_quit.is_set() or self.stop.is_set():
+                break
+            if G.event_pause.is_set():
+                while G.event_pause.is_set():
+                    time.sleep(1)
+                    if self.stop.is_set():
+                        break
+                if G.arrival_scheduler is not None:
+                    G.arrival_scheduler.restart()
+            for I in range(G.config.burst if G.arrival_scheduler is None else 1):
+                if self.stop.is_set(): break
+                self.make_pipelined_requests(G.config.timeout)
+            if G.arrival_scheduler is None:
+                time.sleep(G.config.interval)
+        self.close()
+
+    def prepare_request(self):
+        url_parts = urllib.parse.urlsplit(self.url)
+        self.url_prefix_len = len(f"{url_parts.scheme}://{url_parts.netloc}")
+        self.headers = getRequestHeaders(url_parts.netloc)
+        port = url_parts.port if url_parts.port is not None else (443 if url_parts.scheme == 'https' else 80)
+        self.wire_template = self.new_wire_template()
+        self.conn = classHttpConnection(url_parts.scheme,url_parts.hostname,port,G.config.connection_pool,connStats,self.phases)
+        self.depth = G.config.pipeline_depth
+
+    def send_pipeline(self,requests:list,timeout:float,responses:list,intended_times:list=None):
+        send_times = []
+        if self.phases is not None:
+            self.phases.start()
+        for index, request_segments in enumerate(requests):
+            self.conn.send(request_segments,timeout)
+            send_times.append(time.monotonic() if intended_times is None else intended_times[index])
+        self.stats.bandwidth.add(0,sum([sum(map(len,request_segments)) for request_segments in requests]))
+        for send_time in send_times:
+            response_code,headers,body,keep_alive = self.conn.read_response(self.method)
+            self.stats.bandwidth.add(len(body),0)
+            if self.phases is not None: # the "ttfb" of the next responses starts at the end of the previous one
+                self.stats.phase_stats.save(self.phases)
+                self.phases.clear()
+            response_text = getResponseText(response_code,body)
+            if self.assertions is not None and self.assertions.sample():
+                response_code,response_text = self.assertions.check(response_code,headers,body,response_text)
+            responses.append([response_code,response_text,time.monotonic()-send_time])
+            if not keep_alive: # the server will close the connection, the remaining requests are lost
+                self.conn.close()
+                raise classRemoteDisconnected("Remote end closed connection without response")
+
+    def make_pipelined_requests(self,timeout:float):
+        intended_times = None
+        if G.arrival_scheduler is not None:
+            ##──── open-loop: the pipeline is sent when its last request is due, and each elapsed time starts at its intended time
+            slots = [G.arrival_scheduler.next_slot() for I in range(self.depth)]
+            G.arrival_scheduler.wait_slot(slots[-1])
+            intended_times = [G.arrival_scheduler.slot_time(slot) for slot in slots]
+            dispatch_time = time.monotonic()
+            for intended_time in intended_times:
+                self.stats.lag_stats.save(dispatch_time - intended_time)
+        cpu_start_time = time.thread_time_ns()
+        requests, urls = zip(*[self.wire_template.render() for I in range(self.depth)])
+        self.stats.sent += self.depth
+        responses, start_time = [], time.monotonic() if intended_times is None else intended_times[0]
+        if self.conn.sock is not None and self.conn.is_expired():
+            self.conn.close()
+        reused = self.conn.sock is not None
+        try:
+            try:
+                self.send_pipeline(requests,timeout,responses,intended_times)
+            except (classRemoteDisconnected,BrokenPipeError,ConnectionResetError) as ERR:
+                if not reused or len(responses) > 0:
+                    raise
+                ##──── the server closed the idle connection, so reconnect and send the pipeline again
+                logDebug(f"make_pipelined_requests: reconnecting after {str(ERR)}")
+                self.conn.close()
+                connStats.reconnects.incr()
+                reused = False
+                self.send_pipeline(requests,timeout,responses,intended_times)
+        except Exception as ERR:
+            ##──── the requests without a response are counted as errors
+            response_code,response_text = getErrorResponseCode(str(ERR)),shortenErrorMessage(str(ERR),128)
+            logDebug(f"make_pipelined_requests: {str(ERR)}")
+            self.conn.close()
+            responses = responses + [[response_code,response_text,time.monotonic()-start_time]] * (len(urls) - len(responses))
+        for url, (response_code,response_text,elapsed_time) in zip(urls,responses):
+            self.timeStats.save(elapsed_time)
+            self.httpStats.save(response_code)
+            connStats.requests.incr()
+            if reused:
+                connStats.reused.incr()
+            if self.request_patterns:
+                self.save_pattern(url,response_code,elapsed_time)
+            logResponse(self.text_id,self.method,url,response_code,response_text,'[%.6f]'%(elapsed_time))
+        pipelineStats.save([elapsed_time for response_code,response_text,elapsed_time in responses])
+        self.stats.client_cpu.add(time.thread_time_ns()-cpu_start_time,len(urls))
+
+    def close(self):
+        self.conn.close()
+
+REQUEST_ENGINES = {'urllib':threadMakeRequestsURLLib, 'pooled':threadMakeRequestsPooled, 'asyncio':threadMakeRequestsAsyncio,
+                   'pipeline':threadMakeRequestsPipeline}
+
+##──── Creates a new request thread using the engine defined in the configuration file ─────────────────────────────────────────────
+def newRequestThread():
+    return REQUEST_ENGINES[G.config.engine](stats=newStatsShard())
+
+
+##################################################################################################################################
+##################################################################################################################################
+
+ #      ##    ##   ###          ###  #####   ##    ###  ####   ###
+ #     #  #  #  #  #  #        #       #    #  #  #     #     #
+ #     #  #  #  #  #  #         ##     #    #  #  # ##  ###    ##
+ #     #  #  ####  #  #           #    #    ####  #  #  #        #
+ ####   ##   #  #  ###         ###     #    #  #   ###  ####  ###
+
+##──── Returns the arrival rate of a stage after 'elapsed' seconds ──────────────────────────────────────────────────────────────
+def getStageRate(stage:dict,elapsed:float)->float:
+    if stage['type'] == 'ramp':
+        return stage['from'] + (stage['to'] - stage['from']) * min(1.0,elapsed / stage['duration'])
+    elif stage['type'] == 'wave': # starts at 'min', reaches 'max' at the half of each period
+        return stage['min'] + (stage['max'] - stage['min']) * (1 - math.cos(2 * math.pi * elapsed / stage['period'])) / 2
+    return stage['rate']
+
+def describeStage(stage:dict)->str:
+    if stage['type'] == 'ramp':
+        rate = f"from {'%.0f'%(stage['from'])} to {'%.0f'%(stage['to'])} req/sec"
+    elif stage['type'] == 'wave':
+        rate = f"between {'%.0f'%(stage['min'])} and {'%.0f'%(stage['max'])} req/sec with a period of {'%.1f'%(stage['period'])}s"
+    else:
+        rate = f"at {'%.0f'%(stage['rate'])} req/sec"
+    return f"{stage['name']} ({rate} for {getTimeHumanReadable(time.monotonic()-stage['duration'])})"
+
+##──── Follows the "stages" of the configuration file changing the arrival rate, and keeps the statistics of each stage ─────────
+##──── The time of the stages doesn't run while the application is paused.
+class classStagesRunner:
+    def __init__(self,stages:list):
+        self.stages = stages
+        self.reports = []
+        self.index = 0
+        self.start_stage()
+
+    def start_stage(self):
+        stage = self.stages[self.index]
+        self.elapsed, self.offered_requests = 0.0, 0.0
+        collectStatsShards()
+        self.start_requests, self.start_status_codes = counter.value, dict(httpStats.asdict)
+        timeStats.new_stage()
+        log(f"  {G.bold_right} Starting the stage {self.index+1}/{len(self.stages)} - {describeStage(stage)}")
+
+    def finish_stage(self):
+        collectStatsShards()
+        report = self.get_report(timeStats.new_stage())
+        self.reports.append(report)
+        log(f"  {G.bold_right} Finished the stage {self.index+1}/{len(self.stages)} '{report['name']}' - {'%.0f'%(report['rps'])} req/sec "
+            f"(target {'%.0f'%(report['target_rps'])}) - Errors: {'%.2f'%(report['errors_percent'])}% - 99th pct: {report['99pct']}")
+        self.index += 1
+
+    def get_report(self,stage_time_stats)->dict:
+        stage = self.stages[self.index]
+        requests = max(0,counter.value - self.start_requests)
+        status_codes = {code:amount - self.start_status_codes.get(code,0) for code,amount in dict(httpStats.asdict).items()}
+        errors = sum([amount for code,amount in status_codes.items() if code not in G.config.success_status_codes and amount > 0])
+        duration = max(self.elapsed,0.000001)
+        report = {'name':stage['name'], 'type':stage['type'], 'duration':self.elapsed, 'requests':requests,
+                  'rps':requests / duration, 'target_rps':self.offered_requests / duration,
+                  'errors':errors, 'errors_percent':(errors * 100 / requests) if requests > 0 else 0.0}
+        if stage_time_stats.min_time is None:
+            report.update({key:'-' for key in ['min','avg','max','50pct','75pct','90pct','99pct','99.9pct','99.99pct']})
+        else:
+            report.update(stage_time_stats.stats())
+        return report
+
+    ##──── the reports of the finished stages plus a partial report of the current stage
+    def get_reports(self)->list:
+        collectStatsShards()
+        if self.index < len(self.stages) and self.elapsed > 0:
+            return self.reports + [self.get_report(timeStats.stage_stats)]
+        return list(self.reports)
+
+    ##──── returns False when all the stages are finished
+    def tick(self,elapsed:float)->bool:
+        stage = self.stages[self.index]
+        self.offered_requests += getStageRate(stage,self.elapsed) * G.stage_rate_factor * elapsed
+        self.elapsed += elapsed
+        if self.elapsed >= stage['duration']:
+            self.finish_stage()
+            if self.index == len(self.stages):
+                return False
+            self.start_stage()
+        arrival_rate = max(G.stage_min_rate,getStageRate(self.stages[self.index],self.elapsed) * G.stage_rate_factor)
+        if abs(arrival_rate - G.config.arrival_rate) > G.config.arrival_rate * 0.001:
+            setArrivalRate(arrival_rate)
+            if runsRemoteWorkers():
+                broadcastControlState()
+        return True
+
+def threadStages():
+    last_time = time.monotonic()
+    while not G.event_quit.is_set():
+        time.sleep(G.stages_tick_interval)
+        current_time = time.monotonic()
+        elapsed, last_time = current_time - last_time, current_time
+        if G.event_pause.is_set():
+            continue
+        try:
+            if not G.stages_runner.tick(elapsed):
+                break
+        except Exception as ERR:
+            logDebug(f"threadStages: {str(ERR)}")
+    if not G.event_quit.is_set():
+        log(f"  {G.bold_right} {cWhite('All the stages are finished!')}")
+        displayFullHttpStats()
+        requestQuit()
+
+def startStages():
+    G.stages_runner = classStagesRunner(G.config.stages)
+    threading.Thread(target=threadStages,daemon=True).start()
+
+##################################################################################################################################
+##################################################################################################################################
+
+ #####   ##   ###    ###  ####  #####        ###   ###    ###
+   #    #  #  #  #  #     #       #          #  #  #  #  #
+   #    #  #  ###   # ##  ###     #          ###   ###    ##
+   #    ####  # #   #  #  #       #          # #   #        #
+   #    #  #  #  #   ###  ####    #          #  #  #     ###
+
+##──── Returns [concurrency, burst, interval] of the closed loop to make 'rate' req/sec with an elapsed time of 'latency' ───────
+##──── The concurrency (threads or virtual clients per process) follows the Little's law to keep them busy ~70% of the time,
+##──── and the burst is increased when the interval would be too short for an accurate time.sleep().
+def getClosedLoopSettings(rate:float,latency:float,max_concurrency:int)->list:
+    latency = max(latency,0.00005)
+    rate_per_process = max(rate / getLoadGenerators(),0.1)
+    concurrency = min(max_concurrency,max(1,math.ceil(rate_per_process * latency / G.target_rps_busy_ratio)))
+    idle_time_per_request = concurrency / rate_per_process - latency
+    if idle_time_per_request <= 0:
+        return [concurrency, 1, 0.00001]
+    burst = min(300,max(1,math.ceil(G.target_rps_min_sleep / idle_time_per_request)))
+    return [concurrency, burst, round(max(0.00001,burst * idle_time_per_request),6)]
+
+##──── PID controller that tunes the interval, the burst and the threads (or virtual clients) to hold the achieved rate on target
+##──── The PID works over the relative error, and its output is a factor applied to the target to get the rate asked to the threads.
+class classTargetRPSController:
+    def __init__(self,target_rps:float,max_concurrency:int):
+        self.target_rps = target_rps
+        self.max_concurrency = max_concurrency
+        self.factor, self.integral, self.last_error = 1.0, 0.0, 0.0
+        self.achieved_rps, self.below_target_ticks, self.saturation = 0.0, 0, None
+        collectStatsShards()
+        self.min_latency, self.latency, self.last_time_totals = None, 0.001, (timeStats.total, timeStats.sum)
+        self.last_client_cpu_ns, self.last_status_codes = clientCPUStats.asdeltas()[0], dict(httpStats.asdict)
+
+    def set_target(self,target_rps:float):
+        self.target_rps = target_rps
+        self.below_target_ticks = 0
+
+    def tick(self,elapsed:float):
+        collectStatsShards()
+        self.achieved_rps = counterAverage.get_average()[0]
+        ##──── the average elapsed time of the requests finished since the last tick
+        time_totals = (timeStats.total, timeStats.sum)
+        if time_totals[0] > self.last_time_totals[0]:
+            self.latency = (time_totals[1] - self.last_time_totals[1]) / (time_totals[0] - self.last_time_totals[0])
+        self.last_time_totals, latency = time_totals, self.latency
+        self.min_latency = latency if self.min_latency is None else min(self.min_latency,latency)
+        error = (self.target_rps - self.achieved_rps) / self.target_rps
+        at_the_limit = (self.current_concurrency() >= self.max_concurrency and G.config.interval <= 0.00001)
+        if not (at_the_limit and error > 0): # anti-windup
+            self.integral = max(-G.target_rps_max_integral,min(G.target_rps_max_integral,self.integral + error * elapsed))
+        derivative = (error - self.last_error) / elapsed
+        self.last_error = error
+        kp, ki, kd = G.target_rps_pid_gains
+        self.factor = max(0.05,min(20.0,1.0 + kp * error + ki * self.integral + kd * derivative))
+        concurrency, G.config.burst, G.config.interval = getClosedLoopSettings(self.target_rps * self.factor,latency,self.max_concurrency)
+        self.set_concurrency(concurrency)
+        if runsRemoteWorkers():
+            broadcastControlState()
+        logDebug(f"targetRPS: target {self.target_rps} achieved {'%.1f'%(self.achieved_rps)} factor {'%.3f'%(self.factor)} latency {'%.6f'%(latency)} "
+                 f"concurrency {concurrency} burst {G.config.burst} interval {G.config.interval}")
+        self.check_saturation(elapsed,latency,at_the_limit)
+
+    def current_concurrency(self)->int:
+        return getConcurrency()
+
+    def set_concurrency(self,concurrency:int):
+        if concurrency == self.current_concurrency():
+            return
+        log(f"  {G.bold_right} Target of {cWhite('%.0f'%(self.target_rps))} req/sec: using {cWhite(concurrency)} "
+            f"{'virtual clients' if G.config.engine == 'asyncio' else 'threads'}{' per process' if runsRemoteWorkers() else ''} - "
+            f"Burst: {cWhite(G.config.burst)} - Interval: {cWhite('%.6f'%(G.config.interval))}")
+        if G.config.engine == 'asyncio':
+            G.config.clients = concurrency
+            if not runsRemoteWorkers():
+                G.thread_list[0].set_clients(concurrency)
+        elif runsRemoteWorkers():
+            G.config.threads = concurrency
+        else:
+            G.config.threads = concurrency
+            setNumberOfThreads(concurrency)
+
+    ##──── When the target is not reached for a while, tells if the client (CPU/concurrency) or the server (latency/errors) is saturated
+    def check_saturation(self,elapsed:float,latency:float,at_the_limit:bool):
+        client_cpu_ns, status_codes = clientCPUStats.asdeltas()[0], dict(httpStats.asdict)
+        client_cpu_usage = (client_cpu_ns - self.last_client_cpu_ns) / 1000000000 / elapsed / getLoadGenerators()
+        status_codes_delta = {code:amount - self.last_status_codes.get(code,0) for code,amount in status_codes.items()}
+        requests = sum([amount for amount in status_codes_delta.values() if amount > 0])
+        errors = sum([amount for code,amount in status_codes_delta.items() if code not in G.config.success_status_codes and amount > 0])
+        error_ratio = (errors / requests) if requests > 0 else 0.0
+        self.last_client_cpu_ns, self.last_status_codes = client_cpu_ns, status_codes
+        if self.achieved_rps >= self.target_rps * (1 - G.target_rps_tolerance):
+            if self.saturation is not None:
+                log(f"  {G.bold_right} The target of {cWhite('%.0f'%(self.target_rps))} req/sec was reached - {'%.0f'%(self.achieved_rps)} req/sec")
+            self.below_target_ticks, self.saturation = 0, None
+            return
+        self.below_target_ticks += 1
+        if self.below_target_ticks < G.target_rps_saturation_ticks:
+            return
+        if error_ratio > G.target_rps_max_error_ratio or latency > self.min_latency * G.target_rps_max_latency_growth:
+            saturation = 'server'
+            reason = (f"the server is saturated - the average elapsed time went from {'%.6f'%(self.min_latency)} to {'%.6f'%(latency)} "
+                      f"and {'%.2f'%(error_ratio*100)}% of the last requests failed")
+        elif at_the_limit or client_cpu_usage >= G.target_rps_max_client_cpu:
+            saturation = 'client'
+            reason = (f"the client is saturated - CPU usage of {'%.0f'%(client_cpu_usage*100)}% per process with {self.current_concurrency()} "
+                      f"{'virtual clients' if G.config.engine == 'asyncio' else 'threads'} (use more \"processes\" or increase \"target_rps_max_concurrency\")")
+        else:
+            return
+        if saturation != self.saturation:
+            self.saturation = saturation
+            log(cWarning(f"  {G.light_circle} The target of {'%.0f'%(self.target_rps)} req/sec is unreachable ({'%.0f'%(self.achieved_rps)} req/sec): {reason}"))
+
+def threadTargetRPSController():
+    last_time = time.monotonic()
+    while not G.event_quit.is_set():
+        time.sleep(G.target_rps_tick_interval)
+        current_time = time.monotonic()
+        elapsed, last_time = current_time - last_time, current_time
+        if G.event_pause.is_set():
+            continue
+        try:
+            G.target_rps_controller.tick(elapsed)
+        except Exception as ERR:
+            logDebug(f"threadTargetRPSController: {str(ERR)}")
+
+def startTargetRPSController():
+    G.target_rps_controller = classTargetRPSController(G.config.target_rps,G.config.target_rps_max_concurrency)
+    threading.Thread(target=threadTargetRPSController,daemon=True).start()
+
+##──── The [ and ] keys nudge the target of req/sec in steps of 10%
+def changeTargetRPS(increase:bool):
+    if G.target_rps_controller is None:
+        return log(f"  {G.light_circle} The keys [ and ] only work with the \"target_rps\" option")
+    G.config.target_rps = max(1.0,G.config.target_rps * (1.1 if increase else 0.9))
+    G.target_rps_controller.set_target(G.config.target_rps)
+    log(f"  {G.bold_right if increase else G.bold_left} {'Increasing' if increase else 'Decreasing'} the target to {cWhite('%.0f'%(G.config.target_rps))} req/sec")
+
+##################################################################################################################################
+##################################################################################################################################
+
+ ####  ###  #  #  ###         #  #   ##   #  #
+ #      #   ## #  #  #        ####  #  #  #  #
+ ###    #   # ##  #  #        ####  #  #   ##
+ #      #   #  #  #  #        #  #  ####  #  #
+ #     ###  #  #  ###         #  #  #  #  #  #
+
+##──── Bounded search of the maximum offered load: the rate is doubled while the SLOs are met, and then a binary search is made
+##──── between the last rate that passed and the first rate that failed, until the difference is lower than the precision.
+class classMaxThroughputSearch:
+    def __init__(self,start_rate:float,max_rate:float,precision:float):
+        self.start_rate, self.max_rate, self.precision = start_rate, max_rate, precision / 100
+        self.passed_rate, self.failed_rate = 0.0, None
+        self.steps = []
+
+    ##──── returns None when the search is finished
+    def next_rate(self)->float:
+        if len(self.steps) >= G.find_max_max_steps:
+            return None
+        elif len(self.steps) == 0:
+            return self.start_rate
+        elif self.failed_rate is None:
+            return None if self.passed_rate >= self.max_rate else min(self.max_rate,self.passed_rate * 2)
+        elif (self.failed_rate - self.passed_rate) <= self.failed_rate * self.precision or self.failed_rate <= 1.0:
+            return None
+        return (self.passed_rate + self.failed_rate) / 2
+
+    def save(self,step:dict):
+        self.steps.append(step)
+        if step['passed']:
+            self.passed_rate = max(self.passed_rate,step['rate'])
+        else:
+            self.failed_rate = step['rate'] if self.failed_rate is None else min(self.failed_rate,step['rate'])
+
+##──── Offers 'rate' req/sec for the warm up time plus the step duration, and checks the SLOs with the statistics of the step
+def runFindMaxStep(step_number:int,rate:float)->dict:
+    if step_number > 1:
+        ##──── a short pause lets the server drain its queues, and drops the backlog of the open-loop timeline of the last step
+        G.event_pause.set()
+        if runsRemoteWorkers():
+            broadcastControlState()
+        G.event_quit.wait(G.find_max_cooldown_time)
+        G.event_pause.clear()
+    setArrivalRate(rate)
+    if runsRemoteWorkers():
+        broadcastControlState()
+    log(f"  {G.bold_right} Step {step_number}: offering {cWhite('%.1f'%(rate))} req/sec for {'%.1f'%(G.find_max_warmup_time + G.config.find_max_step_duration)}s "
+        f"({'%.1f'%(G.find_max_warmup_time)}s of warm up)")
+    G.event_quit.wait(G.find_max_warmup_time)
+    collectStatsShards()
+    httpStats.reset()
+    timeStats.reset()
+    lagStats.reset()
+    start_time, start_requests = time.monotonic(), counter.value
+    G.event_quit.wait(G.config.find_max_step_duration)
+    collectStatsShards()
+    elapsed_time = time.monotonic() - start_time
+    achieved_rate = (counter.value - start_requests) / elapsed_time
+    status_codes = dict(httpStats.asdict)
+    requests = sum(status_codes.values())
+    ##──── the 9xx codes (except the failed assertions) are errors of the client (timeouts, connections, ...), not of the server
+    client_errors = sum([amount for code,amount in status_codes.items() if code >= 900 and code != G.assertion_error_code])
+    errors = sum([amount for code,amount in status_codes.items() if code not in G.config.success_status_codes]) - client_errors
+    error_ratio = (errors * 100 / requests) if requests > 0 else 0.0
+    client_error_ratio = (client_errors * 100 / requests) if requests > 0 else 0.0
+    p99 = timeStats.percentile(99)
+    if requests == 0 or p99 is None:
+        result = 'FAIL: no responses'
+    elif p99 > G.config.slo_p99:
+        result = 'FAIL: p99'
+    elif error_ratio > G.config.slo_error_ratio:
+        result = 'FAIL: errors'
+    elif client_error_ratio > G.config.slo_error_ratio: # the generator is saturated, the rate is not measured
+        result = 'FAIL: client errors'
+    elif achieved_rate < rate * (1 - G.find_max_max_shortfall): # the SLOs are met but the client could not offer the rate
+        result = 'FAIL: client'
+    else:
+        result = 'PASS'
+    step = {'step':step_number, 'rate':rate, 'achieved_rate':achieved_rate, 'requests':requests, 'p99':p99,
+            'error_ratio':error_ratio, 'client_error_ratio':client_error_ratio, 'passed':result == 'PASS', 'result':result}
+    log(f"  {G.bold_right if step['passed'] else G.light_circle} Step {step_number}: {result} - achieved {'%.1f'%(achieved_rate)} req/sec - "
+        f"99th pct: {'-' if p99 is None else '%.6f'%(p99)} - Errors: {'%.2f'%(error_ratio)}% - Client errors: {'%.2f'%(client_error_ratio)}%")
+    return step
+
+def displayFindMaxReport(search:classMaxThroughputSearch):
+    max_size = (classTerminal().max_width-ansiLen(getLogDate())-10)
+    log(line.single)
+    log(f">>> {cWhite('Steps of the search of the maximum throughput:')} (SLOs: 99th pct <= {'%.6f'%(G.config.slo_p99)}s and errors <= {'%.2f'%(G.config.slo_error_ratio)}%)")
+    log("")
+    steps_table = Table(cols=7,max_size=max_size,with_border=False,border_size=0).head(['Step','Offered/Sec','Achieved/Sec','Requests','99th pct','Errors','Result'])
+    for step in search.steps:
+        steps_table.row([step['step'],'%.1f'%(step['rate']),'%.1f'%(step['achieved_rate']),step['requests'],
+                         '-' if step['p99'] is None else '%.6f'%(step['p99']),f"{'%.2f'%(step['error_ratio'])}%",step['result']])
+    [log(f"{line}") for line in steps_table.get_table()]
+    log(line.middot1s)
+    if search.passed_rate > 0:
+        log(f">>> {cWhite('Maximum sustainable rate:')} {cWhite('%.1f'%(search.passed_rate))} req/sec")
+    else:
+        log(cWarning(f">>> No rate met the SLOs - try a lower \"find_max_start_rate\""))
+        G.exit_code = 1
+    log(line.single)
+    print(f"max_sustainable_rps={'%.1f'%(search.passed_rate)}",flush=True) # always to stdout, without colors, to be used in scripts
+
+##──── The --find-max mode: runs without keyboard in open-loop mode, searching the maximum rate that meets the SLOs ─────────────
+def startFindMax():
+    ignored_options = G.config.stages or G.config.target_rps > 0 or G.config.replay_file != ''
+    G.config.stages, G.config.target_rps, G.config.replay_file = [], 0, ''
+    search = classMaxThroughputSearch(G.config.find_max_start_rate,G.config.find_max_max_rate,G.config.find_max_precision)
+    G.config.arrival_rate = search.start_rate
+    displayStartupInfo()
+    if ignored_options:
+        log(cWarning(f"  {G.light_circle} The options \"stages\", \"target_rps\" and \"replay_file\" are ignored in --find-max mode"))
+    log(f">>> Searching the maximum throughput from {cWhite('%.1f'%(search.start_rate))} to {cWhite('%.1f'%(search.max_rate))} req/sec "
+        f"with steps of {'%.1f'%(G.config.find_max_step_duration)}s - SLOs: 99th pct <= {cWhite('%.6f'%(G.config.slo_p99))}s and errors <= {cWhite('%.2f'%(G.config.slo_error_ratio))}%")
+    log(cGrey(line.middot1s))
+
+    threading.Thread(target=threadGarbageCollector,daemon=True).start()
+    startLoadGenerators()
+
+    try:
+        rate = search.next_rate()
+        while rate is not None and not G.event_quit.is_set():
+            search.save(runFindMaxStep(len(search.steps)+1,rate))
+            rate = search.next_rate()
+        displayFindMaxReport(search)
+    except (KeyboardInterrupt,SystemExit):
+        pass
+    finally:
+        quit()
+
+##################################################################################################################################
+##################################################################################################################################
+
+ #  #  ####   ##   ###   #     ####   ###   ###        #  #   ##   ###   ####
+ #  #  #     #  #  #  #  #     #     #     #           ####  #  #  #  #  #
+ ####  ###   #  #  #  #  #     ###    ##    ##         ####  #  #  #  #  ###
+ #  #  #     ####  #  #  #     #        #     #        #  #  #  #  #  #  #
+ #  #  ####  #  #  ###   ####  ####  ###   ###         #  #   ##   ###   ####
+
+##──── --duration stops the application like the end of the stages: displays the statistics and requests the exit (see requestQuit)
+def threadRunDuration(duration:float):
+    if not G.event_quit.wait(duration):
+        try:
+            log(f"  {G.bold_right} The duration of {getPluralString(duration,'second','seconds')} has finished")
+            displayFullHttpStats()
+        finally:
+            requestQuit()
+
+def displayProgressLine():
+    collectStatsShards()
+    requests_per_sec = getRequestsPerSec()
+    status_codes = dict(httpStats.asdict)
+    requests = sum(status_codes.values())
+    errors = sum([amount for code,amount in status_codes.items() if code not in G.config.success_status_codes])
+    p99 = timeStats.percentile(99)
+    log(f">>> [{getTimeHumanReadable(G.load_start_time)}] {'%.0f'%(requests_per_sec)} req/sec{' (PAUSED)' if G.event_pause.is_set() else ''} - Total: {counter.value} reqs - "
+        f"Errors: {errors} ({'%.2f'%((errors * 100 / requests) if requests > 0 else 0.0)}%) - 99th pct: {'-' if p99 is None else '%.6f'%(p99)}")
+
+##──── The data of displayFullHttpStats() as a dict, used by the --report file
+def getRunReport()->dict:
+    collectStatsShards()
+    duration = max(time.monotonic() - G.load_start_time,0.000001)
+    status_codes = {code:amount for code,amount in sorted(dict(httpStats.asdict).items()) if amount > 0}
+    requests = sum(status_codes.values())
+    errors = sum([amount for code,amount in status_codes.items() if code not in G.config.success_status_codes])
+    def getTimeStatsReport(time_stats)->dict:
+        percentiles = [50,75,90,95,99,99.9,99.99]
+        return {'count':time_stats.total, 'min':time_stats.min_time, 'avg':time_stats.avg_time, 'max':time_stats.max_time,
+                **{f"{percentile}pct":value for percentile,value in zip(percentiles,time_stats.percentiles(percentiles))}}
+    report = {'application':f"{__appname__} v{__version__}", 'config_file':G.config.config_file, 'url':G.config.url, 'method':G.config.method,
+              'engine':G.config.engine, 'processes':G.config.processes, 'agents':G.agents_addresses,
+              'start_time':dt.fromtimestamp(time.time() - duration).strftime(G.date_format_no_milisec), 'duration':round(duration,3),
+              'requests':counter.value, 'requests_per_sec':round(counter.value / duration,3),
+              'status_codes':{str(code):amount for code,amount in status_codes.items()},
+              'summary':{'success':sum([amount for code,amount in status_codes.items() if code in G.config.success_status_codes]),
+                         'http_4xx_errors':sum([amount for code,amount in status_codes.items() if 400 <= code < 500]),
+                         'http_5xx_errors':sum([amount for code,amount in status_codes.items() if 500 <= code < 600]),
+                         'connection_errors':sum([amount for code,amount in status_codes.items() if code >= 900 and code != G.assertion_error_code]),
+                         'assertion_failures':status_codes.get(G.assertion_error_code,0),
+                         'errors':errors, 'error_ratio':round((errors * 100 / requests) if requests > 0 else 0.0,6)},
+              'elapsed_time':getTimeStatsReport(timeStats),
+              'client_cpu_usec_per_request':round(clientCPUStats.usec_per_request,3)}
+    bytes_in, bytes_out, transfer_bytes, transfer_ns = bandwidthStats.asdeltas()
+    report['bandwidth'] = {'bytes_in':bytes_in, 'bytes_out':bytes_out, 'bytes_in_per_sec':round(bytes_in / duration,3), 'bytes_out_per_sec':round(bytes_out / duration,3),
+                           'download_throughput':round(bandwidthStats.download_throughput,3)}
+    if G.config.arrival_rate > 0 or G.config.replay_file != '':
+        report['dispatch_lag'] = getTimeStatsReport(lagStats)
+    if phaseStats.total > 0:
+        report['phases'] = {phase:getTimeStatsReport(phase_stats) for phase,phase_stats in phaseStats.time_stats.items() if phase_stats.total > 0}
+    if G.config.replay_file != '':
+        report['replay'] = {'file':G.config.replay_file, 'speed':G.config.replay_speed}
+    if G.config.engine in ['pooled','asyncio','pipeline']:
+        report['connections'] = {'requests':connStats.requests.value, 'reused':connStats.reused.value, 'reuse_ratio':round(connStats.reuse_ratio,3),
+                                 'reconnects':connStats.reconnects.value, 'open':connStats.open_connections, 'opened':connStats.opened.value}
+    if G.config.engine == 'pipeline':
+        report['pipeline_averages'] = pipelineStats.averages()
+    if G.stages_runner is not None:
+        report['stages'] = G.stages_runner.get_reports()
+    if patternStats:
+        report['patterns'] = {pattern:{'requests':pattern_stats.requests, 'errors':pattern_stats.errors,
+                                       'status_codes':{str(code):amount for code,amount in sorted(pattern_stats.http_stats.values.items())},
+                                       'elapsed_time':getTimeStatsReport(pattern_stats.time_stats)} for pattern,pattern_stats in list(patternStats.items())}
+    report['thresholds'] = checkThresholds(report)
+    report['passed'] = all([threshold['passed'] for threshold in report['thresholds']])
+    return report
+
+##──── The thresholds of the headless mode: the SLOs of the latency and errors, and the minimum throughput (0 = disabled)
+def checkThresholds(report:dict)->list:
+    thresholds = []
+    for key, value, higher_is_better in [('slo_p95',report['elapsed_time']['95pct'],False),('slo_p99',report['elapsed_time']['99pct'],False),
+                                         ('slo_error_ratio',report['summary']['error_ratio'],False),('slo_min_rps',report['requests_per_sec'],True)]:
+        limit = getattr(G.config,key)
+        if key in G.config.slo_thresholds and (limit > 0 or key == 'slo_error_ratio'):
+            passed = value is not None and (value >= limit if higher_is_better else value <= limit)
+            thresholds.append({'name':key, 'limit':limit, 'value':value, 'passed':passed})
+    return thresholds
+
+##──── Called at the exit of the application: logs the thresholds, writes the --report file and sets the exit code (headless)
+def finishRunReport():
+    if not (G.headless or G.report_file != '') or G.load_start_time is None:
+        return
+    try:
+        report = getRunReport()
+        if G.headless:
+            log(line.middot)
+            for threshold in report['thresholds']:
+                log(f"  {G.bold_right if threshold['passed'] else G.light_circle} {threshold['name']}: {'%.6f'%(threshold['value'] or 0.0)} "
+                    f"({'>=' if threshold['name'] == 'slo_min_rps' else '<='} {'%.6f'%(threshold['limit'])}) - {'PASS' if threshold['passed'] else cWarning('FAIL')}")
+            if not report['passed']:
+                G.exit_code = 1
+        if G.report_file != '':
+            with open(G.report_file,'w') as f:
+                json.dump(report,f,indent=3)
+            log(f"  {G.bold_right} Report written to {cWhite(G.report_file)}")
+    except Exception as ERR:
+        log(cWarning(f"  {G.light_circle} Unable to write the report - {str(ERR)}"))
+
+def startHeadless():
+    displayStartupInfo()
+    run_until = f"for {getPluralString(G.run_duration,'second','seconds')}" if G.run_duration > 0 else "until CTRL+C or SIGTERM"
+    log(cWhite(f"Running in headless mode {run_until} - a progress line every {getPluralString(G.headless_progress_interval,'second','seconds')}".center(classTerminal().width)))
+    log(cGrey(line.middot1s))
+
+    threading.Thread(target=threadGarbageCollector,daemon=True).start()
+
+    startLoadGenerators()
+    if G.config.stages:
+        startStages()
+    if G.config.target_rps > 0:
+        startTargetRPSController()
+    if G.run_duration > 0:
+        threading.Thread(target=threadRunDuration,args=(G.run_duration,),daemon=True).start()
+
+    try:
+        while not G.event_quit.wait(G.headless_progress_interval):
+            displayProgressLine()
+    except (KeyboardInterrupt,SystemExit):
+        pass
+    finally:
+        quit()
+
+##################################################################################################################################
+##################################################################################################################################
+
+ #####  ###  #  #  ####         ###  ####  ###   ###  ####   ###
+   #     #   ####  #           #     #     #  #   #   #     #
+   #     #   ####  ###          ##   ###   ###    #   ###    ##
+   #     #   #  #  #              #  #     # #    #   #        #
+   #    ###  #  #  ####        ###   ####  #  #  ###  ####  ###
+
+##──── Records a bucket per second with the requests, the status codes and a summary of the elapsed times in a bounded ring.
+##──── The deltas of the shards and of the worker processes are merged here too (see mergeStatsDelta), so a bucket only has
+##──── the requests finished in its second, and the buckets are not affected by the reset of the statistics (key 'R').
+class classTimeSeriesRecorder:
+    columns = ['time','elapsed','requests','rps','errors','avg','50pct','90pct','99pct','max','bytes_in','bytes_out']
+
+    def __init__(self,max_seconds:int,file_name:str=''):
+        self.ring = deque(maxlen=max_seconds)
+        self.file_name = file_name
+        self.second_stats, self.requests, self.status_codes, self.bandwidth = newTimeStats(), 0, defaultdict(int), [0,0]
+        self.last_time = time.monotonic()
+        if self.file_name != '':
+            open(self.file_name,'a').close() # fails early if the file can not be written
+
+    ##──── called by mergeStatsDelta() with G.stats_lock acquired
+    def merge(self,delta:dict):
+        self.second_stats.merge(delta['times'])
+        self.requests += delta['requests']
+        for status_code, amount in delta['status_codes'].items():
+            self.status_codes[status_code] += amount
+        if 'bandwidth' in delta:
+            self.bandwidth = [self.bandwidth[0] + delta['bandwidth'][0],self.bandwidth[1] + delta['bandwidth'][1]]
+
+    ##──── closes the bucket of the current second, each bucket is an array of doubles (see columns) plus the status codes
+    def close_second(self):
+        collectStatsShards()
+        with G.stats_lock:
+            second_stats, requests, status_codes, (bytes_in, bytes_out) = self.second_stats, self.requests, dict(self.status_codes), self.bandwidth
+            self.second_stats, self.requests, self.status_codes, self.bandwidth = newTimeStats(), 0, defaultdict(int), [0,0]
+        now = time.monotonic()
+        elapsed, self.last_time = max(now - self.last_time,0.000001), now
+        errors = sum([amount for status_code,amount in status_codes.items() if status_code not in G.config.success_status_codes])
+        pct50, pct90, pct99, pct100 = second_stats.percentiles([50,90,99,100])
+        bucket = array('d',[time.time(),elapsed,requests,requests / elapsed,errors,second_stats.avg_time or 0.0,pct50 or 0.0,pct90 or 0.0,pct99 or 0.0,pct100 or 0.0,bytes_in,bytes_out])
+        self.ring.append((bucket,status_codes))
+        if self.file_name != '':
+            try:
+                with open(self.file_name,'a') as f:
+                    f.write(json.dumps(self.get_row(bucket,status_codes),separators=(',',':')) + '\n')
+            except Exception as ERR:
+                logDebug(f"classTimeSeriesRecorder.close_second: {str(ERR)}")
+
+    def get_row(self,bucket:array,status_codes:dict)->dict:
+        row = {column:round(value,6) for column,value in zip(self.columns,bucket)}
+        row.update({'time':round(row['time'],3),'requests':int(row['requests']),'errors':int(row['errors']),'bytes_in':int(row['bytes_in']),'bytes_out':int(row['bytes_out']),
+                    'status_codes':{str(status_code):amount for status_code,amount in sorted(status_codes.items()) if amount != 0}})
+        return row
+
+    def get_rows(self)->list:
+        return [self.get_row(bucket,status_codes) for bucket,status_codes in list(self.ring)]
+
+    ##──── the format is given by the extension of the file: .csv (a column per status code) or .json (a list of rows)
+    def export(self,file_name:str):
+        rows = self.get_rows()
+        if file_name.lower().endswith('.json'):
+            with open(file_name,'w') as f:
+                json.dump(rows,f,indent=1)
+        else:
+            status_codes = sorted({int(status_code) for row in rows for status_code in row['status_codes'].keys()})
+            with open(file_name,'w',newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.columns + [f"status_{status_code}" for status_code in status_codes])
+                for row in rows:
+                    writer.writerow([row[column] for column in self.columns] + [row['status_codes'].get(str(status_code),0) for status_code in status_codes])
+        log(f"  {G.bold_right} Exported {getPluralString(len(rows),'second','seconds')} of time series to {cWhite(file_name)}")
+
+def threadTimeSeriesRecorder():
+    next_time = time.monotonic()
+    while not G.event_quit.is_set():
+        next_time += 1.0
+        if G.event_quit.wait(max(0.0,next_time - time.monotonic())):
+            break
+        try:
+            G.time_series.close_second()
+        except Exception as ERR:
+            logDebug(f"threadTimeSeriesRecorder: {str(ERR)}")
+
+def startTimeSeriesRecorder():
+    G.time_series = classTimeSeriesRecorder(G.config.timeseries_max_seconds,G.config.timeseries_file)
+    threading.Thread(target=threadTimeSeriesRecorder,daemon=True).start()
+
+##──── Called at the exit of the application, the last (partial) second is also recorded
+def exportTimeSeries():
+    if G.time_series is None or G.config.timeseries_export == '':
+        return
+    try:
+        G.time_series.close_second()
+        G.time_series.export(G.config.timeseries_export)
+    except Exception as ERR:
+        log(cWarning(f"  {G.light_circle} Unable to export the time series to {G.config.timeseries_export} - {str(ERR)}"))
+
+##################################################################################################################################
+##################################################################################################################################
+
+ ###   ###    ##   #  #  ####  #####  #  #  ####  #  #   ###        #  #  ####  #####  ###   ###   ###   ###
+ #  #  #  #  #  #  ####  #       #    #  #  #     #  #  #           ####  #       #    #  #   #   #     #
+ ###   ###   #  #  ####  ###     #    ####  ###   #  #   ##         ####  ###     #    ###    #   #      ##
+ #     # #   #  #  #  #  #       #    #  #  #     #  #     #        #  #  #       #    # #    #   #        #
+ #     #  #   ##   #  #  ####    #    #  #  ####   ##   ###         #  #  ####    #    #  #  ###   ###  ###
+
+##──── Pre-aggregated snapshot of the metrics in the Prometheus text format, rebuilt once per second by its own thread.
+##──── The scrapes only return the last snapshot, so a scrape never touches the statistics read by the request threads.
+class classMetricsExporter:
+    def __init__(self, listen_address:str):
+        self.listen_address = listen_address
+        self.snapshot = b''
+        self.__last_requests, self.__last_time = 0, time.monotonic()
+
+    def update(self):
+        collectStatsShards()
+        now, requests = time.monotonic(), counter.value
+        elapsed, self.__last_time = max(now - self.__last_time,0.000001), now
+        achieved_rps = max(0,requests - self.__last_requests) / elapsed # the statistics can be reset with the key 'R'
+        self.__last_requests = requests
+        with G.stats_lock:
+            status_codes = dict(httpStats.asdict)
+            buckets, total, time_sum = timeStats.cumulative_counts(G.metrics_histogram_buckets), timeStats.total, timeStats.sum
+        metrics = [
+            ('stressanapi_offered_requests_per_second','gauge','The offered rate (open-loop arrival rate, target rate or the closed-loop upper bound)',[('',getOfferedRate())]),
+            ('stressanapi_achieved_requests_per_second','gauge','The requests finished per second since the last snapshot',[('',achieved_rps)]),
+            ('stressanapi_requests_in_flight','gauge','The requests sent and still waiting for a response',[('',max(0,inFlightStats.value))]),
+            ('stressanapi_requests_total','counter','The requests finished (reset with the key R)',[('',requests)]),
+            ('stressanapi_responses_total','counter','The responses by status code (9xx are connection errors)',
+                [(f'{{code="{code}"}}',amount) for code,amount in sorted(status_codes.items()) if amount > 0]),
+            ('stressanapi_response_bytes_total','counter','The bytes of the bodies of the responses received',[('',bandwidthStats.bytes_in)]),
+            ('stressanapi_request_bytes_total','counter','The bytes of the requests sent',[('',bandwidthStats.bytes_out)]),
+            ('stressanapi_request_duration_seconds','histogram','The elapsed time of the requests',
+                [(f'_bucket{{le="{limit}"}}',amount) for limit,amount in zip(G.metrics_histogram_buckets,buckets)] +
+                [('_bucket{le="+Inf"}',total),('_sum',time_sum),('_count',total)]),
+            ('stressanapi_load_generators','gauge','The processes making requests (processes x agents)',[('',getLoadGenerators())]),
+            ('stressanapi_concurrency','gauge','The request threads (or virtual clients of the asyncio engine) per process',[('',getConcurrency())]),
+            ('stressanapi_interval_seconds','gauge','The interval between the bursts of requests',[('',G.config.interval)]),
+            ('stressanapi_burst','gauge','The requests of each burst',[('',G.config.burst)]),
+            ('stressanapi_timeout_seconds','gauge','The timeout of the requests',[('',G.config.timeout)]),
+            ('stressanapi_paused','gauge','1 when the requests are paused',[('',int(G.event_pause.is_set()))]),
+            ('stressanapi_client_cpu_seconds_per_request','gauge','The cpu time of the client side per request',[('',clientCPUStats.usec_per_request / 1000000)]),
+            ('process_cpu_seconds_total','counter','The cpu time of the main process of StressAnAPI',[('',time.process_time())]),
+            ('process_resident_memory_bytes','gauge','The resident memory of the main process of StressAnAPI',[('',getResidentMemory())]),
+        ]
+        lines = []
+        for name, metric_type, help_text, samples in metrics:
+            lines.extend([f"# HELP {name} {help_text}",f"# TYPE {name} {metric_type}"])
+            lines.extend([f"{name}{labels} {formatMetricValue(value)}" for labels,value in samples])
+        self.snapshot = ('\n'.join(lines) + '\n').encode()
+
+class classMetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ['/metrics','/']:
+            self.send_error(404)
+            return
+        snapshot = G.metrics_exporter.snapshot
+        self.send_response(200)
+        self.send_header('Content-Type','text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length',str(len(snapshot)))
+        self.end_headers()
+        self.wfile.write(snapshot)
+
+    def log_message(self, format, *args):
+        logDebug(f"metrics {self.address_string()} - {format%args}")
+
+def formatMetricValue(value)->str:
+    if isinstance(value,float):
+        return 'NaN' if math.isnan(value) else '+Inf' if value == math.inf else repr(value)
+    return str(value)
+
+##──── The resident memory without running 'ps' (Linux), it falls back to the memoryInfo class
+def getResidentMemory()->int:
+    try:
+        with open('/proc/self/statm','r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return int(memoryInfo.rss() * 1048576)
+
+def threadMetricsSnapshot():
+    while not G.event_quit.wait(G.metrics_snapshot_interval):
+        try:
+            G.metrics_exporter.update()
+        except Exception as ERR:
+            logDebug(f"threadMetricsSnapshot: {str(ERR)}")
+
+def startMetricsServer():
+    G.metrics_exporter = classMetricsExporter(G.config.metrics_listen)
+    G.metrics_exporter.update()
+    try:
+        server = http.server.ThreadingHTTPServer(parseHostPort(G.config.metrics_listen),classMetricsRequestHandler)
+    except Exception as ERR:
+        raise StressAnAPIException(f"Unable to listen the metrics endpoint at {G.config.metrics_listen} - {str(ERR)}") from None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    threading.Thread(target=threadMetricsSnapshot,daemon=True).start()
+    log(f"  {G.bold_right} Prometheus metrics available at {cWhite(f'http://{G.config.metrics_listen}/metrics')}")
+
+##################################################################################################################################
+##################################################################################################################################
+
+ #  #   ##   ###   #  #  ####  ###         ###   ###    ##    ###  ####   ###   ###  ####   ###
+ #  #  #  #  #  #  # #   #     #  #        #  #  #  #  #  #  #     #     #     #     #     #
+ ####  #  #  ###   ##    ###   ###         ###   ###   #  #  #     ###    ##    ##   ###    ##
+ ####  #  #  # #   # #   #     # #         #     # #   #  #  #     #        #     #  #        #
+ #  #   ##   #  #  #  #  ####  #  #        #     #  #   ##    ###  ####  ###   ###   ####  ###
+
+##──── Collects the statistics of a worker process since the last call of collect() ─────────────────────────────────────────────
+class classStatsDeltaCollector:
+    def __init__(self):
+        self.__last_requests = 0
+        self.__last_status_codes = {}
+        self.__last_connections = [0,0,0,0,0]
+        self.__last_pipeline = pipelineStats.asdeltas()
+        self.__last_client_cpu = [0,0]
+        self.__last_bandwidth = [0,0,0,0]
+        self.__last_in_flight = 0
+
+    def collect(self)->dict:
+        collectStatsShards()
+        requests, status_codes, connections, pipeline = counter.value, dict(httpStats.asdict), connStats.asdeltas(), pipelineStats.asdeltas()
+        client_cpu, bandwidth = clientCPUStats.asdeltas(), bandwidthStats.asdeltas()
+        delta = {'requests': requests - self.__last_requests,
+                 'status_codes': {key:val - self.__last_status_codes.get(key,0) for key,val in status_codes.items() if val != self.__last_status_codes.get(key,0)},
+                 'times': timeStats.drain(),
+                 'lags': lagStats.drain(),
+                 'connections': [val - last_val for val,last_val in zip(connections,self.__last_connections)],
+                 'pipeline': [[val - last_val for val,last_val in zip(values,last_values)] for values,last_values in zip(pipeline,self.__last_pipeline)],
+                 'client_cpu': [val - last_val for val,last_val in zip(client_cpu,self.__last_client_cpu)],
+                 'bandwidth': [val - last_val for val,last_val in zip(bandwidth,self.__last_bandwidth)],
+                 'in_flight': inFlightStats.value - self.__last_in_flight}
+        self.__last_requests, self.__last_status_codes, self.__last_connections, self.__last_pipeline = requests, status_codes, connections, pipeline
+        self.__last_client_cpu, self.__last_bandwidth, self.__last_in_flight = client_cpu, bandwidth, self.__last_in_flight + delta['in_flight']
+        if patternStats and (pattern_deltas := drainPatternStats(patternStats)):
+            delta['patterns'] = pattern_deltas
+        if (phase_deltas := phaseStats.drain()):
+            delta['phases'] = phase_deltas
+        return delta
+
+##──── Merge the statistics received from a worker process (or from a stats shard) into the statistics of this process ──────────
+def mergeStatsDelta(delta:dict):
+    with G.stats_lock:
+        if delta['requests'] > 0:
+            counter.add(delta['requests'])
+            counterAverage.mark_many(delta['requests'])
+        httpStats.merge(delta['status_codes'])
+        timeStats.merge(delta['times'])
+        lagStats.merge(delta['lags'])
+        clientCPUStats.add(*delta['client_cpu'])
+        bandwidthStats.add(*delta.get('bandwidth',[0,0,0,0]))
+        inFlightStats.add(delta.get('in_flight',0))
+        for pattern, pattern_delta in delta.get('patterns',{}).items():
+            getPatternStats(patternStats,pattern).merge(pattern_delta)
+        if 'phases' in delta:
+            phaseStats.merge(delta['phases'])
+        if G.time_series is not None:
+            G.time_series.merge(delta)
+        if 'connections' in delta: # the shards of the request threads update the connections and the pipeline stats directly
+            connStats.merge(delta['connections'])
+            pipelineStats.merge(delta['pipeline'])
+
+##──── The state of the keyboard controls that is sent from the main process to the worker processes ────────────────────────────
+def getControlState()->dict:
+    return {'interval':G.config.interval, 'burst':G.config.burst, 'timeout':G.config.timeout, 'threads':G.config.threads, 'arrival_rate':G.config.arrival_rate, 'replay_speed':G.config.replay_speed,
+            'clients':G.config.clients, 'pause':G.event_pause.is_set(), 'view_mode':G.view_mode, 'quit':G.event_quit.is_set()}
+
+def broadcastControlState():
+    with G.control_lock: # called by the keyboard and by the stages thread
+        control_state = getControlState()
+        for process, conn in G.worker_processes:
+            try:
+                conn.send(control_state)
+            except Exception as ERR:
+                logDebug(f"broadcastControlState: {str(ERR)}")
+        for agent in list(G.agents):
+            try:
+                agent.send({'type':'control','state':control_state})
+            except Exception as ERR:
+                logDebug(f"broadcastControlState {agent.address}: {str(ERR)}")
+
+##──── Applies the control state received from the main process in a worker process ─────────────────────────────────────────────
+def applyControlState(control_state:dict):
+    G.config.interval, G.config.burst, G.config.timeout = control_state['interval'], control_state['burst'], control_state['timeout']
+    if control_state['arrival_rate'] != G.config.arrival_rate:
+        setArrivalRate(control_state['arrival_rate'])
+    if control_state['replay_speed'] != G.config.replay_speed:
+        setReplaySpeed(control_state['replay_speed'])
+    if control_state['pause']:
+        G.event_pause.set()
+    else:
+        G.event_pause.clear()
+    if control_state['view_mode'] != G.view_mode:
+        setViewMode(control_state['view_mode'])
+    if control_state['quit']:
+        G.event_quit.set()
+    if G.worker_processes: # an agent with its own worker processes only forwards the control state to them
+        G.config.threads, G.config.clients = control_state['threads'], control_state['clients']
+        broadcastControlState()
+    elif G.config.engine == 'asyncio':
+        if control_state['clients'] != G.config.clients:
+            G.config.clients = control_state['clients']
+            G.thread_list[0].set_clients(G.config.clients)
+    else:
+        setNumberOfThreads(control_state['threads'])
+
+##──── Thread of a worker process that receives the control state from the main process ─────────────────────────────────────────
+def threadWorkerControl(conn):
+    while not G.event_quit.is_set():
+        try:
+            applyControlState(conn.recv())
+        except EOFError:
+            G.event_quit.set()
+        except Exception as ERR:
+            logDebug(f"threadWorkerControl: {str(ERR)}")
+
+##──── The main function of a worker process: run the request threads and send the statistics to the main process ──────────────
+def workerProcessMain(worker_index:int,conn):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # only the main process handles the keyboard
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        G.thread_list, G.worker_processes, G.worker_index = [], [], worker_index
+        G.scenario_reader, G.scenario_partitions, G.scenario_thread_counter = None, 0, itertools.count()
+        if len(G.config.cpu_affinity) > 1:
+            setCPUAffinity(os.getpid(),[G.config.cpu_affinity[worker_index % len(G.config.cpu_affinity)]])
+        createStatsObjects(time_stats=newTimeStats())
+        createArrivalScheduler(worker_index)
+        threading.Thread(target=threadWorkerControl,args=(conn,),daemon=True).start()
+        startRequestThreads()
+        stats_collector = classStatsDeltaCollector()
+        while not G.event_quit.is_set():
+            time.sleep(G.worker_stats_interval)
+            conn.send(stats_collector.collect())
+    except (BrokenPipeError,EOFError):
+        pass
+    except Exception as ERR:
+        logDebug(f"workerProcessMain #{worker_index}: {str(ERR)}")
+    finally:
+        G.event_quit.set()
+        os._exit(0)
+
+##──── Thread of the main process that receives and merges the statistics of all worker processes ──────────────────────────────
+def threadWorkerStatsCollector():
+    connections = [conn for process, conn in G.worker_processes]
+    while connections and not G.event_quit.is_set():
+        for conn in multiprocessing.connection.wait(connections,timeout=1):
+            try:
+                mergeStatsDelta(conn.recv())
+            except EOFError:
+                connections.remove(conn)
+                if not G.event_quit.is_set():
+                    log(cWarning(f"  {G.light_circle} A worker process has finished unexpectedly - {getPluralString(len(connections),'worker process','worker processes')} still running"))
+            except Exception as ERR:
+                logDebug(f"threadWorkerStatsCollector: {str(ERR)}")
+
+def startWorkerProcesses():
+    mp_context = multiprocessing.get_context('fork')
+    for worker_index in range(G.config.processes):
+        parent_conn, child_conn = mp_context.Pipe(duplex=True)
+        process = mp_context.Process(target=workerProcessMain,args=(worker_index,child_conn),daemon=True,name=f"{__appname__}-worker-{worker_index}")
+        process.start()
+        G.worker_processes.append((process,parent_conn))
+    threading.Thread(target=threadWorkerStatsCollector,daemon=True).start()
+    log(f"  {G.bold_right} Started {getPluralString(G.config.processes,'worker process','worker processes')} - PIDs: {', '.join([str(process.pid) for process, conn in G.worker_processes])}")
+
+##################################################################################################################################
+##################################################################################################################################
+
+ ###   ####  #  #   ##   #####  ####         ##    ###  ####  #  #  #####   ###
+ #  #  #     ####  #  #    #    #           #  #  #     #     ## #    #    #
+ ###   ###   ####  #  #    #    ###         #  #  # ##  ###   # ##    #     ##
+ # #   #     #  #  #  #    #    #           ####  #  #  #     #  #    #       #
+ #  #  ####  #  #   ##     #    ####        #  #   ###  ####  #  #    #    ###
+
+##──── A controller (--agents) drives many agents (--agent --listen) over TCP with one configuration and one keyboard session.
+##──── The messages are json lines: config -> ready -> start (the start barrier), then control from the controller to the agents
+##──── and stats (the same deltas of the worker processes) from the agents to the controller. The first message carries a shared
+##──── token (--agent-token), so an agent only runs the configurations of its own controllers.
+
+def parseHostPort(address:str,default_host:str='127.0.0.1')->tuple:
+    try:
+        host, port = address.rsplit(':',1) if ':' in address else (default_host, address)
+        return (host.strip('[]') or default_host, int(port))
+    except Exception as ERR:
+        raise StressAnAPIException(f"Invalid address '{address}', use host:port") from None
+
+##──── The deltas of the statistics are sent as json, where the keys of the status codes become strings
+def decodeStatsDelta(delta:dict)->dict:
+    delta = {**delta, 'status_codes':{int(code):amount for code,amount in delta['status_codes'].items()}}
+    if 'patterns' in delta:
+        delta['patterns'] = {pattern:{**pattern_delta, 'status_codes':{int(code):amount for code,amount in pattern_delta['status_codes'].items()}}
+                             for pattern,pattern_delta in delta['patterns'].items()}
+    return delta
+
+class classAgentConnection:
+    def __init__(self,sock:socket.socket,address:str):
+        self.sock = sock
+        self.address = address
+        self.rfile = sock.makefile('rb')
+        self._lock = threading.Lock()
+
+    def send(self,message:dict):
+        with self._lock:
+            self.sock.sendall(json.dumps(message,separators=(',',':')).encode() + b'\n')
+
+    def receive(self)->dict:
+        message = self.rfile.readline()
+        if not message:
+            raise EOFError(f"connection closed by {self.address}")
+        return json.loads(message)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception as ERR:
+            logDebug(f"classAgentConnection.close: {str(ERR)}")
+
+##──── Controller side ───────────────────────────────────────────────────────────────────────────────────────────────────────────
+def threadAgentStatsReceiver(agent:classAgentConnection):
+    while not G.event_quit.is_set():
+        try:
+            message = agent.receive()
+            if message['type'] == 'stats':
+                mergeStatsDelta(decodeStatsDelta(message['delta']))
+        except EOFError:
+            G.agents.remove(agent)
+            if not G.event_quit.is_set():
+                log(cWarning(f"  {G.light_circle} The agent {agent.address} has disconnected - {getPluralString(len(G.agents),'agent','agents')} still running"))
+            break
+        except Exception as ERR:
+            logDebug(f"threadAgentStatsReceiver {agent.address}: {str(ERR)}")
+
+def startAgents():
+    if G.agent_token == '':
+        raise StressAnAPIException("The agents require a shared token: use --agent-token or 'export STRESSANAPI_AGENT_TOKEN=<token>'") from None
+    with open(G.config.config_file,'r') as f:
+        config_dict = json.load(f)
+    agents = []
+    for agent_index, address in enumerate(G.agents_addresses):
+        try:
+            agent = classAgentConnection(socket.create_connection(parseHostPort(address),timeout=G.agent_connect_timeout),address)
+            agent.sock.settimeout(None)
+            agent.send({'type':'config','token':G.agent_token,'config':config_dict,'agent_index':agent_index,'agents_count':len(G.agents_addresses)})
+            agents.append(agent)
+        except Exception as ERR:
+            raise StressAnAPIException(f"Unable to connect to the agent {address} - {str(ERR)}") from None
+    ##──── start barrier: all the agents must be ready before any of them starts
+    for agent in agents:
+        message = agent.receive()
+        if message['type'] != 'ready':
+            raise StressAnAPIException(f"The agent {agent.address} failed - {message.get('message','')}") from None
+        log(f"  {G.bold_right} Agent {cWhite(agent.address)} is ready - {message['hostname']} PID: {message['pid']}")
+    for agent in agents:
+        agent.send({'type':'start'})
+    G.agents.extend(agents)
+    for agent in agents:
+        threading.Thread(target=threadAgentStatsReceiver,args=(agent,),daemon=True).start()
+    log(f"  {G.bold_right} Started {getPluralString(len(agents),'agent','agents')}")
+
+##──── Agent side ────────────────────────────────────────────────────────────────────────────────────────────────────────────────
+def threadAgentControl(controller:classAgentConnection):
+    while not G.event_quit.is_set():
+        try:
+            message = controller.receive()
+            if message['type'] == 'control':
+                applyControlState(message['state'])
+        except EOFError:
+            G.event_quit.set()
+        except Exception as ERR:
+            logDebug(f"threadAgentControl: {str(ERR)}")
+
+##──── Runs one session of a controller in a forked process, so every session starts with a clean state
+def agentSession(sock:socket.socket,address:str):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    controller = classAgentConnection(sock,address)
+    try:
+        sock.settimeout(G.agent_connect_timeout) # a peer that doesn't send the token doesn't hold the agent
+        message = controller.receive()
+        if not hmac.compare_digest(str(message.get('token','')).encode(),G.agent_token.encode()):
+            log(cWarning(f"  {G.light_circle} Rejected the controller {address} - invalid token"))
+            return controller.send({'type':'error','message':"invalid token"})
+        sock.settimeout(None)
+        G.agent_index, G.agents_count = message['agent_index'], message['agents_count']
+        if not validateConfigFile(f"<controller {address}>",config_dict=message['config']):
+            return controller.send({'type':'error','message':f"invalid configuration (run the agent with --debug to see the details)"})
+        displayConfig()
+        G.thread_list = []
+        createStatsObjects(time_stats=newTimeStats())
+        controller.send({'type':'ready','hostname':socket.gethostname(),'pid':os.getpid()})
+        if controller.receive()['type'] != 'start':
+            return
+        threading.Thread(target=threadAgentControl,args=(controller,),daemon=True).start()
+        if G.config.processes > 1:
+            startWorkerProcesses()
+        else:
+            createArrivalScheduler()
+            startRequestThreads()
+        stats_collector = classStatsDeltaCollector()
+        while not G.event_quit.is_set():
+            time.sleep(G.worker_stats_interval)
+            controller.send({'type':'stats','delta':stats_collector.collect()})
+    except (BrokenPipeError,ConnectionResetError,EOFError):
+        pass
+    except Exception as ERR:
+        logDebug(f"agentSession: {str(ERR)}")
+    finally:
+        G.event_quit.set()
+        controller.close()
+        os._exit(0)
+
+def startAgent(listen_address:str):
+    if G.agent_token == '':
+        raise StressAnAPIException("The agent requires a shared token: use --agent-token or 'export STRESSANAPI_AGENT_TOKEN=<token>'") from None
+    server = socket.create_server(parseHostPort(listen_address,default_host='127.0.0.1'))
+    log(f">>> {__appname__} v{__version__} agent listening on {cWhite(listen_address)} - PID: {os.getpid()}")
+    mp_context = multiprocessing.get_context('fork')
+    while True:
+        sock, (host, port) = server.accept()
+        log(f"  {G.bold_right} Controller connected from {cWhite(f'{host}:{port}')}")
+        session = mp_context.Process(target=agentSession,args=(sock,f"{host}:{port}"),daemon=False,name=f"{__appname__}-agent-session")
+        session.start()
+        sock.close()
+        session.join()
+        log(f"  {G.bold_right} Session of the controller {host}:{port} finished")
+
+##################################################################################################################################
+##################################################################################################################################
+
+  ##   ###    ###  ###    ##   ###    ###  ####        #  #  ####  #  #  #  #
+ #  #  #  #  #     #  #  #  #  #  #  #     #           ####  #     ## #  #  #
  #  #  ###   # ##  ###   #  #  ###    ##   ###         ####  ###   # ##  #  #
  ####  # #   #  #  #     ####  # #      #  #           #  #  #     #  #  #  #
  #  #  #  #   ###  #     #  #  #  #  ###   ####        #  #  ####  #  #   ##
@@ -1933,6 +5914,18 @@ def getArgParseMenu():
     template = parser.add_argument_group("Configuration Template")
     template.add_argument('--template',action="store_true", default=False, help="Displays a configuration template. Required values are 'url' and 'method'.")
 
+    distributed = parser.add_argument_group("Distributed load generation")
+    distributed.add_argument('--agents',dest="agents",metavar="<host:port,...>",action="store",default="",help="Controller mode: the requests are made by the agents at these addresses (comma separated), using the configuration file and the keyboard of this session.")
+    distributed.add_argument('--agent',dest="agent",action="store_true",default=False,help="Agent mode: waits for a controller and makes the requests it asks for.")
+    distributed.add_argument('--listen',dest="listen",metavar="<host:port>",action="store",default=G.default_agent_listen,help=f"The address where the agent listens for the controller. Default: {G.default_agent_listen}")
+    distributed.add_argument('--agent-token',dest="agent_token",metavar="<token>",action="store",default=G.agent_token,help="The shared secret of the agents and the controller, required by both. Or use 'export STRESSANAPI_AGENT_TOKEN=<token>'.")
+
+    modes = parser.add_argument_group("Automatic modes")
+    modes.add_argument('--headless',dest="headless",action="store_true",default=False,help="Run without keyboard, printing a progress line every 5 seconds. At the end, the thresholds 'slo_p95', 'slo_p99', 'slo_error_ratio' and 'slo_min_rps' set in the configuration file are checked and the exit code is 1 if any of them is violated (to be used in CI pipelines).")
+    modes.add_argument('--duration',dest="duration",type=float,default=0,metavar="<seconds>",help="Stop the application after the given number of seconds, displaying the full statistics (interactive and headless modes).")
+    modes.add_argument('--report',dest="report",default='',metavar="<file.json>",help="Write a JSON summary of the run (requests, status codes, percentiles, connections, stages and thresholds) to the file at the exit.")
+    modes.add_argument('--find-max',dest="find_max",action="store_true",default=False,help="Search the maximum throughput (open-loop req/sec) that meets the SLOs 'slo_p99' and 'slo_error_ratio' of the configuration file, without keyboard. The last line of the output is 'max_sustainable_rps=<value>' to be used in scripts.")
+
     optional = parser.add_argument_group("More options")
     optional.add_argument('--nodate','--nodatetime', action="store_true", default=False, help="Hide the date/time information at the begin of the output lines.")
     optional.add_argument('--debug','-d', dest="debug", action='store_true', default=False, help="Print debug information do stdout/syslog. Or use 'export STRESSANAPI_DEBUG=1'.")
@@ -1959,13 +5952,19 @@ class classStressAnAPI:
             G.event_quit.set()
             G.event_pause.clear()
             logResponse.__code__ = logResponseEmpty.__code__
+            if isinstance(value,StressAnAPIException): # ex: an agent that rejects the controller
+                log(f"  {G.light_circle} {value}")
+                G.exit_code = 1
+            exportTimeSeries()
+            finishRunReport()
             log(line.middot)
             log(cWhite(f">>> Exiting {__appname__} as requested - PID: {os.getpid()} - {dt.now().strftime(G.date_format_no_milisec)}"))
             log(line.middot)
         finally:
             cursor.show()
-            os.system('stty sane')
-            sys.exit(0)
+            if os.isatty(0): # the stdin is not a terminal in headless mode (CI pipelines)
+                os.system('stty sane')
+            sys.exit(G.exit_code)
 
 ##################################################################################################################################
 ##################################################################################################################################
@@ -1979,8 +5978,117 @@ class classStressAnAPI:
 ##################################################################################################################################
 ##################################################################################################################################
 
-def startApp():
-    global httpStats, timeStats, counter, counterAverage
+def newTimeStats(staged:bool=False)->classTimeStats:
+    stats_class = classStagedTimeStats if staged else classTimeStats
+    return stats_class(significant_digits=G.config.histogram_significant_digits,max_value=G.config.histogram_max_value)
+
+def newStatsShard()->classStatsShard:
+    stats_shard = classStatsShard(time_stats=newTimeStats(),lag_stats=newTimeStats())
+    with G.stats_lock:
+        G.stats_shards.append(stats_shard)
+    return stats_shard
+
+##──── Merges the statistics of the request threads into the global statistics, it must be called before reading them
+def collectStatsShards():
+    with G.stats_lock:
+        for stats_shard in list(G.stats_shards):
+            mergeStatsDelta(stats_shard.drain())
+            if stats_shard.finished:
+                G.stats_shards.remove(stats_shard)
+
+def createStatsObjects(time_stats=None):
+    global httpStats, timeStats, lagStats, counter, counterAverage, connStats, pipelineStats, clientCPUStats, bandwidthStats, inFlightStats, patternStats, phaseStats
+    G.stats_shards = []
+    counter = AtomicCounter()
+    inFlightStats = AtomicCounter() # never reset, it is the requests sent minus the requests finished
+    counterAverage = AtomicAverageCounter(max_window_size=G.stats_window_size)
+    counterAverage.start()
+
+    timeStats = newTimeStats(staged=bool(G.config.stages)) if time_stats is None else time_stats
+    lagStats = newTimeStats()
+    httpStats = classHttpStats()
+    connStats = classConnectionStats()
+    pipelineStats = classPipelineStats(depth=G.config.pipeline_depth)
+    clientCPUStats = classClientCPUStats()
+    bandwidthStats = classBandwidthStats()
+    phaseStats = classPhaseStats()
+    patternStats = {} # the statistics by method+path pattern of the "scenario_file"
+
+##──── The number of processes that make requests, in all the agents
+def getLoadGenerators()->int:
+    return G.config.processes * G.agents_count
+
+##──── The index of this process between all the processes that make requests, in all the agents
+def getLoadGeneratorIndex()->int:
+    return G.agent_index * G.config.processes + G.worker_index
+
+##──── The number of request threads (or virtual clients of the asyncio engine) per process
+def getConcurrency()->int:
+    if G.config.engine == 'asyncio':
+        return G.config.clients
+    return G.config.threads if runsRemoteWorkers() else len(G.thread_list)
+
+##──── The rate that is offered to the API: the open-loop arrival rate, the target rate or the upper bound of the closed-loop mode
+def getOfferedRate()->float:
+    if G.config.target_rps > 0:
+        return float(G.config.target_rps)
+    if G.config.arrival_rate > 0:
+        return float(G.config.arrival_rate)
+    if G.config.interval <= 0 or G.config.replay_file != '': # the rate of a replay follows the access log
+        return math.nan
+    return getConcurrency() * getLoadGenerators() * G.config.burst / G.config.interval
+
+##──── True when the requests are made by worker processes or remote agents and this process only controls them
+def runsRemoteWorkers()->bool:
+    return G.config.processes > 1 or len(G.agents_addresses) > 0
+
+##──── The arrival rate is split between the worker processes, and with fixed arrivals their timelines are interleaved
+def createArrivalScheduler(worker_index:int=0):
+    if G.config.replay_file != '': # each process (and agent) replays its own part of the lines of the log
+        G.arrival_scheduler = classReplayScheduler(G.config.replay_file,G.config.replay_speed,G.agent_index * G.config.processes + worker_index,getLoadGenerators())
+    elif G.config.arrival_rate > 0:
+        G.arrival_scheduler = classArrivalScheduler(G.config.arrival_rate / getLoadGenerators(),G.config.arrival_distribution,
+                                                    start_offset=(G.agent_index * G.config.processes + worker_index) / G.config.arrival_rate)
+
+##──── Starts the requests in this process, in the worker processes or in the remote agents
+def startLoadGenerators():
+    createStatsObjects()
+    G.load_start_time = time.monotonic()
+    if G.agents_addresses:
+        startAgents()
+    elif G.config.processes > 1:
+        startWorkerProcesses()
+    else:
+        createArrivalScheduler()
+        startRequestThreads()
+    startTimeSeriesRecorder()
+    if G.config.metrics_listen != '':
+        startMetricsServer()
+
+##──── Starts or joins request threads until there are 'number_of_threads' threads running (at least 1)
+def setNumberOfThreads(number_of_threads:int):
+    with G.thread_list_lock:
+        while len(G.thread_list) < number_of_threads:
+            ThreadMakeRequests = newRequestThread()
+            ThreadMakeRequests.setDaemon(True)
+            G.thread_list.append(ThreadMakeRequests)
+            ThreadMakeRequests.start()
+        while len(G.thread_list) > max(1,number_of_threads):
+            G.thread_list.pop(0).join()
+
+def startRequestThreads():
+    ##──── the asyncio engine runs all virtual clients in a single thread
+    number_of_threads = 1 if G.config.engine == 'asyncio' else G.config.threads
+    for I in range(number_of_threads):
+        try:
+            ThreadMakeRequests = newRequestThread()
+        except Exception as ERR:
+            logDebug(str(ERR))
+        ThreadMakeRequests.setDaemon(True)
+        G.thread_list.append(ThreadMakeRequests)
+        ThreadMakeRequests.start()
+
+def displayStartupInfo():
     log(line.middot)
     log(cWhite(f">>> Starting {__appname__} v{__version__} - PID: {os.getpid()} - {dt.now().strftime(G.date_format_no_milisec)}"))
     log(line.middot)
@@ -1991,26 +6099,21 @@ def startApp():
     log(cGrey(line.middot1s))
     log(f">>> All done in {'%.6f'%(time.monotonic()-G.start_time)}'s! {cWhite(f'It{G.singleQuote}s Showtime!')}")
     log(cGrey(line.middot1s))
+
+def startApp():
+    displayStartupInfo()
     log(cWhite(f"Use the arrow keys to increase/decrease the speed. Press H for a quick help or ESC/Q to quit.".center(classTerminal().width)))
     log(cGrey(line.middot1s))
 
     threading.Thread(target=threadGarbageCollector,daemon=True).start()
 
-    counter = AtomicCounter()
-    counterAverage = AtomicAverageCounter(max_window_size=G.stats_window_size)
-    counterAverage.start()
-
-    timeStats = classTimeStats(window_size=G.stats_window_size)
-    httpStats = classHttpStats()
-
-    for I in range(G.config.threads):
-        try:
-            ThreadMakeRequests = threadMakeRequestsURLLib(timeStats=timeStats,httpStats=httpStats)
-        except Exception as ERR:
-            logDebug(str(ERR))
-        ThreadMakeRequests.setDaemon(True)
-        G.thread_list.append(ThreadMakeRequests)
-        ThreadMakeRequests.start()
+    startLoadGenerators()
+    if G.config.stages:
+        startStages()
+    if G.config.target_rps > 0:
+        startTargetRPSController()
+    if G.run_duration > 0:
+        threading.Thread(target=threadRunDuration,args=(G.run_duration,),daemon=True).start()
 
     try:
         view_response = False
@@ -2020,7 +6123,7 @@ def startApp():
             k = readKey()
             k = k.lower()
             # logDebug(f"KEY PRESSED: {k}")
-            if k in ['esc','q']:
+            if k in ['esc','q','quit']:
                 quit()
             else:
                 cursor.hide()
@@ -2031,16 +6134,16 @@ def startApp():
                     displayHelp()
                 elif k == 'up':
                     increaseInterval()
-                    counterAverage.reset()
+                    resetRequestRate()
                 elif k == 'down':
                     decreaseInterval()
-                    counterAverage.reset()
+                    resetRequestRate()
                 elif k == 'right':
                     increaseBurst()
-                    counterAverage.reset()
+                    resetRequestRate()
                 elif k == 'left':
                     decreaseBurst()
-                    counterAverage.reset()
+                    resetRequestRate()
                 elif k == 'plus':
                     increaseTimeout()
                 elif k == 'minus':
@@ -2049,6 +6152,10 @@ def startApp():
                     increaseThreads()
                 elif k == 'lowerthan':
                     decreaseThreads()
+                elif k == 'closesquarebracket':
+                    changeTargetRPS(increase=True)
+                elif k == 'opensquarebracket':
+                    changeTargetRPS(increase=False)
                 elif k == 'm':
                     keyMemInfo()
                 elif k == 'p':
@@ -2064,19 +6171,15 @@ def startApp():
                 elif k == 'b':
                     view_response_body = not view_response_body
                     view_response = False
-                    if view_response_body:
-                        logResponse.__code__ = _logResponseBody.__code__
-                    else:
-                        logResponse.__code__ = logResponseEmpty.__code__
+                    setViewMode('body' if view_response_body else 'none')
                 elif k == 'v':
                     view_response = not view_response
                     view_response_body = False
-                    if view_response:
-                        logResponse.__code__ = _logResponse.__code__
-                    else:
-                        logResponse.__code__ = logResponseEmpty.__code__
+                    setViewMode('response' if view_response else 'none')
                 else:
                     continue
+                if runsRemoteWorkers():
+                    broadcastControlState()
     except (KeyboardInterrupt,SystemExit):
         pass
     except Exception as ERR:
@@ -2086,6 +6189,9 @@ def startApp():
         quit()
 
 def main_function():
+    signal.signal(signal.SIGINT, receivedSignalSTOP)   # to make asyncio/thread stop on first CTRL+C
+    signal.signal(signal.SIGTERM, receivedSignalSTOP)  # to make asyncio/thread stop on first CTRL+C
+    signal.signal(signal.SIGPIPE, received_SIGPIPE)    # intercept the broken pipe signal and avoid the application crash
     if ('-d' in sys.argv) or ('--debug' in sys.argv):
         G.DEBUG = True
     if G.DEBUG:
@@ -2111,8 +6217,11 @@ def main_function():
         args.debug = True
 
     G.argsvars = vars(args)
+    G.agent_token = args.agent_token
 
-    if args.template and args.configfile == '':
+    if args.agent:
+        return startAgent(args.listen)
+    elif args.template and args.configfile == '':
         ppJson(G.default_template,compact=False)
     elif args.configfile == '' and not args.template:
         parser.print_help()
@@ -2132,9 +6241,16 @@ def main_function():
                         logDebug.__code__ = logDebugSyslog.__code__ if G.DEBUG else logDebug.__code__
                     except Exception as ERR:
                         raise StressAnAPIConfigException(str(ERR)) from None
-                logDebug(f"argparser vars: {G.argsvars}")
+                logDebug(f"argparser vars: {dict(G.argsvars,agent_token='***')}")
+                G.agents_addresses = [address.strip() for address in args.agents.split(',') if address.strip() != '']
+                G.agents_count = max(1,len(G.agents_addresses))
+                G.headless, G.run_duration, G.report_file = args.headless, max(0.0,args.duration), args.report
                 try:
                     with classStressAnAPI() as StressAnAPI:
+                        if args.find_max:
+                            return startFindMax()
+                        elif args.headless:
+                            return startHeadless()
                         return startApp()
                 except Exception as ERR:
                     logDebug(f"Failed in classStressAnAPI() as StressAnAPI: {str(ERR)}")
@@ -2145,7 +6261,4 @@ def main_function():
 ##################################################################################################################################
 
 if __name__ == '__main__':
-    signal.signal(signal.SIGINT, receivedSignalSTOP)   # to make asyncio/thread stop on first CTRL+C
-    signal.signal(signal.SIGTERM, receivedSignalSTOP)  # to make asyncio/thread stop on first CTRL+C
-    signal.signal(signal.SIGPIPE, received_SIGPIPE)    # intercept the broken pipe signal and avoid the application crash
     sys.exit(main_function())
\ No newline at end of file
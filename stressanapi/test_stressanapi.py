@@ -1,7 +1,36 @@
 #!/usr/bin/env python3
-import unittest, json, os
-from stressanapi import runCommand, stripColor, G, validateConfigFile
-from stressanapi import threadMakeRequestsURLLib, getErrorResponseCode, getFormattedStatusCode
+import unittest, json, os, sys, io, socket, shutil, subprocess, threading, http.server, asyncio, time, random, math, re, timeit, itertools, urllib.request, urllib.response
+from stressanapi import runCommand, stripColor, G, validateConfigFile, isValidIPv4, logDebug
+from stressanapi import threadMakeRequestsURLLib, getErrorResponseCode, getAsyncErrorMessage, getFormattedStatusCode
+from stressanapi import readHttpResponse, readHttpResponseAsync, buildRequestBytes, classRemoteDisconnected, classRequestWireTemplate
+from stressanapi import AtomicCounter, classHttpStats, classTimeStats, classPipelineStats, classArrivalScheduler
+from stressanapi import validateStages, getStageRate, StressAnAPIConfigException, getClosedLoopSettings, classMaxThroughputSearch
+from stressanapi import decodeStatsDelta, parseHostPort, classStatsShard, classTimeSeriesRecorder, createStatsObjects, checkThresholds
+from stressanapi import classMetricsExporter, newStatsShard, collectStatsShards, classStringTemplate, StressAnAPIException
+from stressanapi import classDataFeeder, quoteUrlValue, quoteJsonValue, readScenarioRows, classScenarioReader, getRequestPattern, readAccessLogRows, classReplayScheduler
+from stressanapi import classAliasSampler, validateRequestMix, classMixRequest, classRequestMixWireTemplate
+from stressanapi import validateFlow, classFlowStep, classFlowSession, validateAssertions, classResponseAssertions
+from stressanapi import classBandwidthStats, getUrllibRequestSize, getBytesHumanReadable
+from stressanapi import classRequestPhases, classPhaseStats, createTimedConnection
+from array import array
+from collections import defaultdict
+
+##──── a local API that counts the requests by path, for the tests that run stressanapi in a subprocess
+def startTestServer()->tuple:
+    hits = defaultdict(int)
+    class classHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        def do_GET(self):
+            hits[self.path] += 1
+            self.send_response(200)
+            self.send_header('Content-Length','2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+        def log_message(self,*args):
+            pass
+    server = http.server.ThreadingHTTPServer(('127.0.0.1',0),classHandler)
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    return server, hits
 
 class TestStressAnAPI(unittest.TestCase):
     def test_extract_template_var(self):
@@ -27,6 +56,10 @@ class TestStressAnAPI(unittest.TestCase):
         self.assertEqual(result, 111)
         result = getErrorResponseCode('<another unknown message without error code>')
         self.assertEqual(result, 999)
+        result = getErrorResponseCode(getAsyncErrorMessage(ConnectionRefusedError(111,"Connect call failed ('127.0.0.1', 1)")))
+        self.assertEqual(result, 900)
+        result = getErrorResponseCode(getAsyncErrorMessage(asyncio.TimeoutError()))
+        self.assertEqual(result, 901)
         
     def test_getFormattedStatusCode(self):
         result = stripColor(getFormattedStatusCode(200))
@@ -35,6 +68,528 @@ class TestStressAnAPI(unittest.TestCase):
         self.assertEqual(result,'### Remote end closed connection without response')
         result = stripColor(getFormattedStatusCode(999))
         self.assertEqual(result,'### Unknown Error')
+
+    def test_readHttpResponse(self):
+        rfile = io.BytesIO(b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+                           b"HTTP/1.1 404 Not Found\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n2;ext=1\r\nde\r\n0\r\n\r\n"
+                           b"HTTP/1.1 204 No Content\r\nConnection: close\r\n\r\n")
+        self.assertEqual(readHttpResponse(rfile),[200,{b'content-length':b'5'},b'hello',True])
+        self.assertEqual(readHttpResponse(rfile)[::2],[404,b'abcde'])
+        self.assertEqual(readHttpResponse(rfile)[::2],[204,b''])
+        self.assertFalse(readHttpResponse(io.BytesIO(b"HTTP/1.0 200 OK\r\n\r\nuntil the end"))[3])
+        with self.assertRaises(classRemoteDisconnected):
+            readHttpResponse(rfile)
+
+    def test_readHttpResponseAsync(self):
+        async def read_responses():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 201 Created\r\nContent-Length: 2\r\n\r\nok"
+                             b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n4\r\nabcd\r\n0\r\n\r\n")
+            reader.feed_eof()
+            return [await readHttpResponseAsync(reader), await readHttpResponseAsync(reader)]
+        first, second = asyncio.run(read_responses())
+        self.assertEqual(first[::2],[201,b'ok'])
+        self.assertEqual(second[::2],[200,b'abcd'])
+
+    def test_stats_merge(self):
+        atomic_counter = AtomicCounter()
+        atomic_counter.incr()
+        atomic_counter.add(10)
+        atomic_counter.incr()
+        self.assertEqual(atomic_counter.value,12)
+        http_stats = classHttpStats()
+        http_stats.save(200)
+        http_stats.merge({200:5,901:2})
+        self.assertEqual(http_stats.values,{200:6,901:2})
+        time_stats, merged_time_stats = classTimeStats(), classTimeStats()
+        [time_stats.save(elapsed_time) for elapsed_time in [0.1,0.2,0.3]]
+        merged_time_stats.merge(time_stats.drain())
+        self.assertEqual(time_stats.drain()['counts'],[])
+        time_stats.save(0.4)
+        merged_time_stats.merge(time_stats.drain())
+        self.assertEqual([merged_time_stats.total,merged_time_stats.min_time,merged_time_stats.max_time],[4,0.1,0.4])
+        self.assertAlmostEqual(merged_time_stats.avg_time,0.25)
+        pipeline_stats = classPipelineStats(depth=3)
+        pipeline_stats.save([0.1,0.2,0.3])
+        pipeline_stats.merge([[1,1,0],[0.3,0.4,0.0]])
+        self.assertEqual([round(average,6) for average in pipeline_stats.averages()],[0.2,0.3,0.3])
+
+    def test_classStatsShard(self):
+        stats_shard = classStatsShard(time_stats=classTimeStats(),lag_stats=classTimeStats())
+        for response_code, elapsed_time in [(200,0.1),(200,0.2),(503,0.3)]:
+            stats_shard.http_stats.save(response_code)
+            stats_shard.time_stats.save(elapsed_time)
+        stats_shard.client_cpu.add(3000,3)
+        delta = stats_shard.drain()
+        self.assertEqual([delta['requests'],delta['status_codes'],delta['client_cpu'],len(delta['times']['counts'])],[3,{200:2,503:1},[3000,3],3])
+        stats_shard.http_stats.save(200)
+        delta = stats_shard.drain()
+        self.assertEqual([delta['requests'],delta['status_codes'],delta['client_cpu'],delta['times']['counts']],[1,{200:1},[0,0],[]])
+        self.assertEqual([len(time_stats.counts) for time_stats in stats_shard.phase_stats.time_stats.values()],[0] * len(G.request_phases)) # allocated on demand
+        stats_shard.save_pattern('GET /users/{id}',200,0.1)
+        stats_shard.save_pattern('GET /users/{id}',404,0.2)
+        delta = decodeStatsDelta(json.loads(json.dumps(stats_shard.drain())))
+        self.assertEqual([delta['patterns']['GET /users/{id}']['status_codes'],len(delta['patterns']['GET /users/{id}']['times']['counts'])],[{200:1,404:1},2])
+        self.assertNotIn('patterns',stats_shard.drain())
+
+    def test_classBandwidthStats(self):
+        stats_shard = classStatsShard(time_stats=classTimeStats(),lag_stats=classTimeStats())
+        stats_shard.bandwidth.add(2048,100,2048,1000000)
+        self.assertEqual(stats_shard.drain()['bandwidth'],[2048,100,2048,1000000])
+        self.assertEqual(stats_shard.drain()['bandwidth'],[0,0,0,0])
+        self.assertAlmostEqual(stats_shard.bandwidth.download_throughput,2048000)
+        bandwidth_stats = classBandwidthStats()
+        bandwidth_stats.get_rates()
+        bandwidth_stats.add(1000,10)
+        bytes_in_per_sec, bytes_out_per_sec = bandwidth_stats.get_rates()
+        self.assertAlmostEqual(bytes_in_per_sec / bytes_out_per_sec,100)
+        self.assertEqual(bandwidth_stats.get_rates(),[0.0,0.0])
+        self.assertEqual([getBytesHumanReadable(512),getBytesHumanReadable(1536),getBytesHumanReadable(3*1024**3)],['512 B','1.50 KiB','3.00 GiB'])
+        request = urllib.request.Request('http://localhost/api',data=b'{"a":1}',headers={'Accept':'*/*'},method='POST')
+        self.assertEqual(getUrllibRequestSize(request),len(b'POST /api HTTP/1.1\r\nAccept: */*\r\n\r\n{"a":1}'))
+        thread = threadMakeRequestsURLLib(stats_shard)
+        thread.body_buffer = memoryview(bytearray(16))
+        for body in [b'{"first":"line"}\n' + b'x' * 100, b'short', b'']:
+            response_text, body_size, transfer_ns = thread.drain_body(io.BytesIO(body),200)
+            self.assertEqual([response_text,body_size],[body.split(b'\n')[0][:16].decode(),len(body)])
+        body = b'{"first":"line"}\n' + b'x' * 100 # without "read_full_body" only the first line is read and counted
+        thread.open_url = lambda request,timeout: urllib.response.addinfourl(io.BytesIO(body),{'Content-Length':str(len(body))},request.full_url,200)
+        thread.phases, thread.assertions, thread.body_buffer = None, None, None
+        stats_shard.drain()
+        self.assertEqual(thread.urllib_open(request,1),(200,'{"first":"line"}'))
+        self.assertEqual(stats_shard.drain()['bandwidth'][0],len(b'{"first":"line"}\n'))
+        def open_url_error(request,timeout): # a non-2xx response of urllib, its phases are saved too
+            raise urllib.error.HTTPError(request.full_url,503,'Service Unavailable',{},io.BytesIO(b'busy\n'))
+        thread.open_url, thread.phases = open_url_error, classRequestPhases()
+        self.assertEqual(thread.urllib_open(request,1),(503,'busy'))
+        self.assertEqual([stats_shard.phase_stats.time_stats[phase].total for phase in ['ttfb','transfer']],[1,1])
+
+    def test_classRequestPhases(self):
+        phases = classRequestPhases()
+        response = b'HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}'
+        self.assertEqual(readHttpResponse(io.BytesIO(response),'GET',phases)[::2],[200,b'{}'])
+        self.assertEqual([phase for phase,value in phases.values.items() if value > 0],['ttfb','transfer'])
+        self.assertEqual(re.sub(r'[\d.]+','N',phases.text()),'ttfb N transfer N')
+        server = socket.create_server(('127.0.0.1',0))
+        try:
+            phases.start()
+            createTimedConnection(server.getsockname(),5,phases=phases).close()
+            self.assertTrue(phases.values['dns'] > 0 and phases.values['connect'] > 0)
+        finally:
+            server.close()
+        phase_stats = classPhaseStats()
+        phase_stats.save(phases)
+        phases.clear()
+        phase_stats.save(phases) # nothing to save
+        deltas = phase_stats.drain()
+        self.assertEqual(sorted(deltas.keys()),['connect','dns'])
+        self.assertEqual(phase_stats.drain(),{})
+        merged_stats = classPhaseStats()
+        [merged_stats.merge(deltas) for I in range(2)]
+        self.assertEqual([merged_stats.total,merged_stats.time_stats['dns'].total],[4,2])
+
+    def test_classTimeSeriesRecorder(self):
+        createStatsObjects()
+        time_series = classTimeSeriesRecorder(max_seconds=2)
+        time_stats = classTimeStats()
+        for elapsed_second in range(3):
+            [time_stats.save(elapsed_time) for elapsed_time in [0.1,0.2] + ([5.0] if elapsed_second == 0 else [])]
+            time_series.merge({'requests':3,'status_codes':{200:2,503:1},'times':time_stats.drain()})
+            time_series.close_second()
+        rows = time_series.get_rows()
+        self.assertEqual(len(rows),2)
+        self.assertEqual([rows[-1]['requests'],rows[-1]['errors'],rows[-1]['status_codes']],[3,1,{'200':2,'503':1}])
+        self.assertAlmostEqual(rows[-1]['avg'],0.15)
+        self.assertEqual([rows[-1]['max'],time_stats.drain()['max']],[0.2,None]) # the max of the first second is not sent again
+        time_series.export('/tmp/stressanapi_unit_test.csv')
+        with open('/tmp/stressanapi_unit_test.csv') as f:
+            lines = f.read().splitlines()
+        os.remove('/tmp/stressanapi_unit_test.csv')
+        self.assertEqual(lines[0],','.join(classTimeSeriesRecorder.columns + ['status_200','status_503']))
+        self.assertTrue(lines[-1].endswith(',2,1'))
+
+    def test_classTimeStats(self):
+        time_stats = classTimeStats(significant_digits=3,max_value=60)
+        elapsed_times = [random.uniform(0.0001,2.0) for I in range(20000)]
+        [time_stats.save(elapsed_time) for elapsed_time in elapsed_times]
+        elapsed_times.sort()
+        for percentile in [50,90,99,99.9,99.99]:
+            expected = elapsed_times[math.ceil(len(elapsed_times) * percentile / 100) - 1]
+            self.assertAlmostEqual(time_stats.percentile(percentile),expected,delta=expected * 0.001 + 0.000001)
+        self.assertEqual(time_stats.percentile(100),elapsed_times[-1])
+        self.assertEqual(list(time_stats.stats().keys()),['min','avg','max','50pct','75pct','90pct','99pct','99.9pct','99.99pct'])
+        time_stats.save(3600)
+        self.assertEqual(time_stats.percentile(100),3600)
+        max_value_stats = classTimeStats(significant_digits=3,max_value=60)
+        max_value_stats.save(60)
+        self.assertEqual(len(time_stats.counts),len(max_value_stats.counts))
+        time_stats.reset()
+        self.assertIsNone(time_stats.percentile(99))
+
+    def test_classMetricsExporter(self):
+        createStatsObjects(time_stats=classTimeStats())
+        stats_shard = newStatsShard()
+        for response_code, elapsed_time in [(200,0.0005),(200,0.003),(503,0.2)]:
+            stats_shard.sent += 1
+            stats_shard.http_stats.save(response_code)
+            stats_shard.time_stats.save(elapsed_time)
+        stats_shard.sent += 2 # still waiting for the response
+        metrics_exporter = classMetricsExporter('127.0.0.1:9464')
+        metrics_exporter.update()
+        samples = dict([line.rsplit(' ',1) for line in metrics_exporter.snapshot.decode().splitlines() if not line.startswith('#')])
+        self.assertEqual([samples['stressanapi_requests_total'],samples['stressanapi_requests_in_flight']],['3','2'])
+        self.assertEqual([samples['stressanapi_responses_total{code="200"}'],samples['stressanapi_responses_total{code="503"}']],['2','1'])
+        self.assertEqual([samples[f'stressanapi_request_duration_seconds_bucket{{le="{limit}"}}'] for limit in ['0.001','0.005','0.1','0.25','+Inf']],['1','2','2','3','3'])
+        stats_shard.finished = True
+        collectStatsShards()
+
+    def test_checkThresholds(self):
+        report = {'elapsed_time':{'95pct':0.2,'99pct':0.4},'summary':{'error_ratio':0.5},'requests_per_sec':90.0}
+        slo_thresholds, G.config.slo_thresholds = G.config.slo_thresholds, ['slo_error_ratio']
+        self.assertEqual([threshold['name'] for threshold in checkThresholds(report)],['slo_error_ratio']) # the default slo_p99 is not checked
+        G.config.slo_thresholds = ['slo_p95','slo_p99','slo_error_ratio','slo_min_rps']
+        self.assertEqual([threshold['name'] for threshold in checkThresholds(report)],['slo_p99','slo_error_ratio'])
+        self.assertTrue(all([threshold['passed'] for threshold in checkThresholds(report)]))
+        G.config.slo_p95, G.config.slo_min_rps = 0.1, 100
+        try:
+            results = {threshold['name']:threshold['passed'] for threshold in checkThresholds(report)}
+            self.assertEqual(results,{'slo_p95':False,'slo_p99':True,'slo_error_ratio':True,'slo_min_rps':False})
+            report['elapsed_time']['99pct'] = None # no responses
+            self.assertFalse({threshold['name']:threshold['passed'] for threshold in checkThresholds(report)}['slo_p99'])
+        finally:
+            G.config.slo_p95, G.config.slo_min_rps, G.config.slo_thresholds = 0, 0, slo_thresholds
+
+    def test_buildRequestBytes(self):
+        result = buildRequestBytes('POST','/api?a=1',[('Host','localhost:8000')],b'{}')
+        self.assertEqual(result,b"POST /api?a=1 HTTP/1.1\r\nHost: localhost:8000\r\nContent-Length: 2\r\n\r\n{}")
+        result = buildRequestBytes('GET','/',[('Host','localhost')])
+        self.assertEqual(result,b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+
+    def test_classRequestWireTemplate(self):
+        url = 'http://localhost/api/%%randomint:42:42%%?a=1'
+        wire_template = classRequestWireTemplate('GET',url,16,[('Host','localhost')],b'',classStringTemplate(url))
+        segments,result_url = wire_template.render()
+        self.assertEqual(b''.join(segments),b"GET /api/42?a=1 HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        self.assertEqual(result_url,'http://localhost/api/42?a=1')
+        wire_template = classRequestWireTemplate('GET','http://localhost',16,[('Host','localhost')],b'')
+        self.assertEqual(wire_template.render(),([b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"],'http://localhost'))
+
+    def test_classStringTemplate(self):
+        string_template = classStringTemplate('http://localhost/customer/%%randomint:1:100000%%/ip/%%randomipv4%%/%%randomint:7:7%%')
+        self.assertEqual(string_template.variables,['%%randomint:1:100000%%','%%randomipv4%%','%%randomint:7:7%%'])
+        for I in range(100):
+            customer, ipv4, seven = re.match(r'http://localhost/customer/(\d+)/ip/([\d.]+)/(\d+)$',string_template.render()).groups()
+            self.assertTrue(1 <= int(customer) <= 100000 and isValidIPv4(ipv4) and seven == '7')
+        self.assertEqual(classStringTemplate('http://localhost/%%randomint:5:5%%?a=1').render(),'http://localhost/5?a=1')
+        self.assertEqual(classStringTemplate('http://localhost/api').render(),'http://localhost/api')
+        for text in ['http://localhost/%%randomint:9:1%%','http://localhost/%%unknown%%']:
+            with self.assertRaises(StressAnAPIException):
+                classStringTemplate(text)
+
+    ##──── micro-benchmark of the render of a url with one variable: the compiled template vs. the generator + str.replace() of v1.0.3
+    ##──── the times are only logged (with --debug or STRESSANAPI_DEBUG=1), a comparison of timings would fail on a loaded machine
+    def test_classStringTemplate_benchmark(self):
+        url, template_var = 'http://127.0.0.1:8000/api/v1/customer/%%randomint:1:100000%%', '%%randomint:1:100000%%'
+        def get_url():
+            yield url.replace(template_var,str(random.randint(1,100000)))
+        string_template = classStringTemplate(url)
+        for I in range(1000):
+            self.assertEqual(re.sub(r'\d+$',template_var,string_template.render()),re.sub(r'\d+$',template_var,next(get_url())))
+        replace_time = min(timeit.repeat(lambda: next(get_url()),number=20000,repeat=5)) / 20000
+        render_time = min(timeit.repeat(string_template.render,number=20000,repeat=5)) / 20000
+        logDebug(f"url render: {'%.0f'%(replace_time*1e9)} ns (str.replace) vs {'%.0f'%(render_time*1e9)} ns (compiled template)")
+
+    def test_classRequestWireTemplate_headers_body(self):
+        url = 'http://localhost/api/%%randomint:1:9%%'
+        body_template = classStringTemplate('{"id":"%%randomint:100:999%%","name":"çhär"}')
+        wire_template = classRequestWireTemplate('POST',url,16,[('Host','localhost'),('X-Forwarded-For','%%randomipv4%%')],b'',classStringTemplate(url),body_template)
+        for I in range(20):
+            segments,result_url = wire_template.render()
+            request = b''.join(segments)
+            path, forwarded_for, content_length, body = re.match(rb'POST /api/(\d) HTTP/1.1\r\nHost: localhost\r\nX-Forwarded-For: ([\d.]+)\r\nContent-Length: (\d+)\r\n\r\n(.*)$',request,re.S).groups()
+            self.assertEqual(result_url,f'http://localhost/api/{path.decode()}')
+            self.assertTrue(isValidIPv4(forwarded_for.decode()))
+            self.assertEqual(int(content_length),len(body))
+            self.assertEqual(json.loads(body)['name'],'çhär')
+            self.assertTrue(100 <= int(json.loads(body)['id']) <= 999)
+
+    def test_classRequestWireTemplate_data_file(self):
+        data_file, header_file = '/tmp/stressanapi_unit_test_names.txt', '/tmp/stressanapi_unit_test_header.txt'
+        with open(data_file,'w') as f:
+            f.write('John Smith\nJosé\n')
+        try:
+            url = f'http://localhost/c/%%fileseq:{data_file}%%'
+            wire_template = classRequestWireTemplate('GET',url,16,[('Host','localhost'),('X-Name',f'%%fileseq:{data_file}%%')],b'')
+            segments,result_url = wire_template.render()
+            self.assertEqual([b''.join(segments),result_url],[b"GET /c/John%20Smith HTTP/1.1\r\nHost: localhost\r\nX-Name: Jos\xe9\r\n\r\n",'http://localhost/c/John%20Smith'])
+            self.assertEqual(classStringTemplate(url,quoteUrlValue).render(),'http://localhost/c/John%20Smith') # the same as the 'urllib' engine
+            for header_value in ['a\rb','Łódź']:
+                with open(header_file,'w') as f:
+                    f.write(f'ok\n{header_value}\n')
+                with self.assertRaises(StressAnAPIException):
+                    classRequestWireTemplate('GET','http://localhost/',16,[('X-Name',f'%%filerand:{header_file}%%')],b'')
+                os.remove(header_file + G.data_feeder_index_suffix)
+                G.data_feeders.pop(header_file)
+        finally:
+            [os.remove(file_name) for file_name in [data_file,data_file + G.data_feeder_index_suffix,header_file] if os.path.isfile(file_name)]
+
+    def test_classDataFeeder(self):
+        data_file = '/tmp/stressanapi_unit_test_data.txt'
+        with open(data_file,'w') as f:
+            f.write(''.join([f"customer-{line_number}\r\n" for line_number in range(10)]) + 'José "Zé"')
+        try:
+            data_feeder = classDataFeeder(data_file)
+            self.assertEqual([data_feeder.lines,data_feeder.get_line(0),data_feeder.get_line(10)],[11,'customer-0','José "Zé"'])
+            self.assertEqual(classDataFeeder(data_file).load_index(),data_feeder.offsets) # reused from the index file
+            get_value = data_feeder.get_value_generator('fileseq')
+            self.assertEqual([get_value() for I in range(12)][-2:],['José "Zé"','customer-0'])
+            G.config.processes, G.worker_index = 3, 1
+            get_value = data_feeder.get_value_generator('fileunique')
+            self.assertEqual([get_value() for I in range(5)],['customer-1','customer-4','customer-7','José "Zé"','customer-1'])
+            self.assertEqual(data_feeder.get_value_generator('filerand',quoteUrlValue)().startswith(('customer-','Jos%C3%A9%20%22Z%C3%A9%22')),True)
+            body_template = classStringTemplate(json.dumps({'name':f'%%fileseq:{data_file}%%'}),quoteJsonValue)
+            self.assertEqual([json.loads(body_template.render())['name'] for I in range(11)][-1],'José "Zé"')
+        finally:
+            G.config.processes, G.worker_index = 1, 0
+            os.remove(data_file)
+            os.remove(data_file + G.data_feeder_index_suffix)
+
+    def test_readScenarioRows(self):
+        scenario_file = '/tmp/stressanapi_unit_test_scenario.csv'
+        with open(scenario_file,'w') as f:
+            f.write('method,url,headers,body\nGET,/users/42?full=1,,\n\nPOST,http://other:81/users,"{""X-Id"": 7}","{""name"": ""a, b""}"\nDELETE,/users/0a1b2c3d4e5f6a7b\n')
+        try:
+            rows = readScenarioRows(scenario_file,'http://localhost:8000/api','GET',strict=True)
+            self.assertEqual([[row.method,row.url,row.path,row.headers,row.body,row.url.pattern] for row in itertools.islice(rows,4)],
+                             [['GET','http://localhost:8000/users/42?full=1','/users/42?full=1',[],b'','GET /users/{id}'],
+                              ['POST','http://other:81/users','/users',[('X-Id','7')],b'{"name": "a, b"}','POST /users'],
+                              ['DELETE','http://localhost:8000/users/0a1b2c3d4e5f6a7b','/users/0a1b2c3d4e5f6a7b',[],b'','DELETE /users/{id}'],
+                              ['GET','http://localhost:8000/users/42?full=1','/users/42?full=1',[],b'','GET /users/{id}']])
+            partitions = [[row.method for row in itertools.islice(readScenarioRows(scenario_file,'http://localhost:8000/','GET',index,2),3)] for index in range(2)]
+            self.assertEqual(partitions,[['GET','DELETE','GET'],['POST','POST','POST']])
+            self.assertEqual([row.path for row in itertools.islice(readScenarioRows(scenario_file,'http://localhost:8000/','GET',4,5),2)],['/users']*2)
+            scenario_reader = classScenarioReader(scenario_file) # the rows are read once and dealt to the thread partitions
+            self.assertEqual([[scenario_reader.next_partition_row(index,2).method for I in range(3)] for index in range(2)],[['GET','DELETE','GET'],['POST','POST','POST']])
+            scenario_reader = classScenarioReader(scenario_file)
+            self.assertEqual([scenario_reader.next_partition_row(index,5).method for index in [4,3,0,1,2]],['POST','GET','GET','POST','DELETE'])
+            self.assertEqual(getRequestPattern('GET','/v1/orders/123e4567-e89b-12d3-a456-426614174000/items'),'GET /v1/orders/{id}/items')
+            with open(scenario_file,'a') as f:
+                f.write('GET,/ok,[1]\n')
+            with self.assertRaises(StressAnAPIException):
+                list(itertools.islice(readScenarioRows(scenario_file,'http://localhost:8000/','GET',strict=True),4))
+        finally:
+            os.remove(scenario_file)
+
+    def test_classReplayScheduler(self):
+        access_log = '/tmp/stressanapi_unit_test_access.log'
+        with open(access_log,'w') as f:
+            f.write('10.0.0.1 - - [10/Jul/2024:13:55:36 -0300] "GET /users/1 HTTP/1.1" 200 12 "-" "curl/8.0"\n'
+                    '10.0.0.1 - - [10/Jul/2024:13:55:36 -0300] "HEAD /users/2 HTTP/1.1" 200 0 "-" "curl/8.0"\n'
+                    'not an access log line\n'
+                    '10.0.0.2 - - [10/Jul/2024:16:55:36.500 +0000] "POST /users?id=3 HTTP/1.1" 201 5\n'
+                    '10.0.0.3 - - [10/Jul/2024:13:55:37 -0300] "DELETE /users/4 HTTP/1.1" 204 0 "-" "-"\n')
+        try:
+            rows = [[log_time,row.method,row.url,row.url.pattern] for log_time,row in itertools.islice(readAccessLogRows(access_log,'http://localhost:8000/api'),4)]
+            self.assertEqual(rows,[[0.0,'GET','http://localhost:8000/users/1','GET /users/{id}'],[0.5,'POST','http://localhost:8000/users?id=3','POST /users'],
+                                   [1.0,'DELETE','http://localhost:8000/users/4','DELETE /users/{id}'],[2.0,'GET','http://localhost:8000/users/1','GET /users/{id}']])
+            self.assertEqual([row.method for log_time,row in itertools.islice(readAccessLogRows(access_log,'http://localhost:8000/',1,2),2)],['POST','POST'])
+            G.replay_lookahead = 2 # the reader thread waits after the first batch of rows
+            scheduler = classReplayScheduler(access_log,speed=4.0)
+            slots = [scheduler.next_slot() for I in range(3)]
+            self.assertEqual([scheduler.next_row().method for I in range(3)],['GET','POST','DELETE'])
+            self.assertEqual([round(slot - slots[0],6) for slot in slots],[0.0,0.125,0.25])
+            scheduler.set_speed(1000.0)
+            self.assertLess(scheduler.next_slot() - slots[2],0.25)
+            scheduler.rows = iter([]) # stops the reader thread
+        finally:
+            G.replay_lookahead = 10000
+            os.remove(access_log)
+
+    def test_request_mix(self):
+        sampler = classAliasSampler([70,20,10])
+        samples = [sampler.sample() for I in range(100000)]
+        self.assertEqual([round(samples.count(index) / len(samples),2) for index in range(3)],[0.7,0.2,0.1])
+        self.assertEqual(set([classAliasSampler([5]).sample() for I in range(100)]),{0})
+        config_dict = {'url':'http://localhost:8000/api','method':'GET','post_data':{},'headers':{'X-Id':'1','Accept':'*/*'},'engine':'pooled'}
+        requests = validateRequestMix([{'name':'customer','weight':7,'url':'http://localhost:8000/api/customer/%%randomint:5:5%%'},
+                                       {'method':'post','post_data':{'a':1},'headers':{'x-id':'2'}}],config_dict)
+        self.assertEqual(requests,[{'name':'customer','weight':7.0,'url':'http://localhost:8000/api/customer/%%randomint:5:5%%','method':'GET','headers':{'X-Id':'1','Accept':'*/*'},'post_data':{}},
+                                   {'name':'POST /api','weight':1.0,'url':'http://localhost:8000/api','method':'POST','headers':{'Accept':'*/*','x-id':'2'},'post_data':{'a':1}}])
+        for invalid_requests in [{}, [{'weight':0}], [{'url':'http://other:8000/api'}], [{'method':'HEAD'}], [{'name':'a'},{'name':'a'}], [{'wieght':2}]]:
+            with self.assertRaises(StressAnAPIConfigException):
+                validateRequestMix(invalid_requests,config_dict)
+        mix_requests = [classMixRequest(request) for request in requests]
+        wire_template = classRequestMixWireTemplate([classRequestWireTemplate(mix_request.method,mix_request.url,21,[('Host','localhost')],mix_request.post_data,
+                                                                              mix_request.url_template,mix_request.post_data_template) for mix_request in mix_requests[:1]],classAliasSampler([1]))
+        segments, url = wire_template.render()
+        self.assertEqual([b''.join(segments),url,url.pattern],[b"GET /api/customer/5 HTTP/1.1\r\nHost: localhost\r\n\r\n",'http://localhost:8000/api/customer/5','customer'])
+        self.assertEqual([mix_requests[1].url.pattern,mix_requests[1].post_data],['POST /api',b'{"a":1}'])
+
+    def test_flow(self):
+        config_dict = {'url':'http://localhost:8000/api','method':'GET','post_data':{},'headers':{'Accept':'*/*'},'engine':'pooled'}
+        flow = validateFlow([{'name':'login','method':'POST','url':'http://localhost:8000/login','think_time':[0.5,1],
+                              'extract':{'token':{'json':'$.data.items[1].token'},'sid':{'header':'X-Session'},'order':{'regex':'order=(\\w+)'}}},
+                             {'url':'http://localhost:8000/orders/%%var:order%%','headers':{'Authorization':'Bearer %%var:token%%'}}],config_dict)
+        self.assertEqual([[step['name'],step['think_time']] for step in flow],[['login',[0.5,1.0]],['GET /orders/%%var:order%%',[0.0,0.0]]])
+        for invalid_flow in [[{'url':'http://localhost:8000/%%var:token%%'}], [{'extract':{'a-b':{'json':'x'}}}], [{'extract':{'a':{'regex':'('}}}], [{'think_time':[2,1]}]]:
+            with self.assertRaises(StressAnAPIConfigException):
+                validateFlow(invalid_flow,config_dict)
+        steps = [classFlowStep(step,list(step['headers'].items())) for step in flow]
+        session = classFlowSession()
+        session.start()
+        body = b'{"data":{"items":[{},{"token":"t1"}]},"html":"order=A7"}'
+        self.assertEqual(session.process(steps[0],200,{b'x-session':b's1',b'set-cookie':b'sid=s1; Path=/\nold=1; Max-Age=0'},body),200)
+        self.assertEqual([session.variables,session.cookies],[{'token':'t1','sid':'s1','order':'A7'},{'sid':'s1'}])
+        self.assertEqual(session.render(steps[1]),['GET','http://localhost:8000/orders/A7',[('Accept','*/*'),('Authorization','Bearer t1'),('Cookie','sid=s1')],b''])
+        self.assertEqual(session.process(steps[0],200,{},b'{}'),905)
+
+    def test_classResponseAssertions(self):
+        assertions = classResponseAssertions(validateAssertions([{'contains':'"ok"'},{'not_contains':'error'},{'regex':'id":\\s*\\d+'},{'json':'data.items[0].id','equals':7},
+                                                                 {'body_size':[10,100]},{'header':'Content-Type','equals':'application/json'}]),1.0)
+        body, headers = b'{"status":"ok","data":{"items":[{"id": 7}]}}', {b'content-type':b'application/json'}
+        self.assertEqual(assertions.check(200,headers,body,'text'),[200,'text'])
+        self.assertEqual(assertions.check(500,{},b'error','text'),[500,'text'])
+        self.assertEqual(assertions.check(200,headers,body.replace(b'ok',b'error'),'text')[0],G.assertion_error_code)
+        self.assertEqual(assertions.check(200,headers,body.replace(b'7',b'8'),'text'),[906,'Assertion failed: json "data.items[0].id" equals 7'])
+        self.assertEqual(assertions.check(200,{},body,'text'),[906,'Assertion failed: header "Content-Type" equals "application/json"'])
+        self.assertEqual(assertions.check(200,headers,b'"ok" id":1 <html>','text'),[906,'Assertion failed: the body is not a valid json'])
+        self.assertEqual([assertions.parse_json,assertions.read_body,assertions.read_headers],[True,True,True])
+        self.assertAlmostEqual(sum([classResponseAssertions([{'contains':'x'}],0.2).sample() for I in range(10000)]) / 10000,0.2,delta=0.03)
+        for invalid_assertions in [{'contains':'x'}, [{'contains':'x','regex':'y'}], [{'contains':'x','equals':'y'}], [{'regex':'('}], [{'body_size':[5,1]}], [{'size':1}]]:
+            with self.assertRaises(StressAnAPIConfigException):
+                validateAssertions(invalid_assertions)
+
+    def test_classArrivalScheduler(self):
+        scheduler = classArrivalScheduler(rate=1000,distribution='fixed',start_offset=-1) # the slots are already due
+        slots = [scheduler.slot_time(scheduler.next_slot()) for I in range(5)]
+        self.assertTrue(all(abs((slot2 - slot1) - 0.001) < 1e-9 for slot1, slot2 in zip(slots,slots[1:])))
+        scheduler.set_rate(10)
+        slots = [scheduler.slot_time(scheduler.next_slot()) for I in range(3)]
+        self.assertAlmostEqual(slots[2] - slots[1],0.1)
+        self.assertLessEqual(scheduler.wait_slot(scheduler.next_slot()),time.monotonic())
+        scheduler.next_origin -= 1000
+        scheduler.restart()
+        self.assertGreaterEqual(scheduler.slot_time(scheduler.next_slot()),time.monotonic() - 1)
+        scheduler = classArrivalScheduler(rate=0.1,distribution='fixed') # a ramp from 0 req/sec
+        scheduler.next_slot()
+        slot = scheduler.next_slot() # given to a waiting thread before the rate changes
+        scheduler.set_rate(100)
+        self.assertLess(scheduler.slot_time(slot) - time.monotonic(),0.1)
+        self.assertLess(asyncio.run(scheduler.wait_slot_async(scheduler.next_slot())) - time.monotonic(),0.001)
+        scheduler = classArrivalScheduler(rate=1000,distribution='poisson')
+        slots = [scheduler.next_slot() for I in range(2001)]
+        self.assertAlmostEqual((slots[-1] - slots[0]) / 2000,0.001,delta=0.0003)
+
+    def test_stages(self):
+        stages = validateStages([{"type":"ramp","from":100,"to":1100,"duration":10},{"type":"HOLD","rate":500,"duration":5,"name":"steady"},
+                                 {"type":"wave","min":100,"max":300,"period":4,"duration":8}])
+        self.assertEqual([stage['name'] for stage in stages],['ramp','steady','wave'])
+        self.assertAlmostEqual(getStageRate(stages[0],5),600)
+        self.assertAlmostEqual(getStageRate(stages[0],20),1100)
+        self.assertAlmostEqual(getStageRate(stages[1],1),500)
+        self.assertAlmostEqual(getStageRate(stages[2],0),100)
+        self.assertAlmostEqual(getStageRate(stages[2],2),300)
+        self.assertEqual(validateStages([{"type":"ramp","from":0,"to":100,"duration":10}])[0]['from'],0.0)
+        for invalid_stages in [{},[{"type":"jump","duration":1}],[{"type":"spike","rate":10,"duration":1}],[{"type":"ramp","from":-1,"to":1,"duration":1}],[{"type":"hold","rate":-1,"duration":1}],[{"type":"ramp","from":1,"duration":1}],
+                               [{"type":"wave","min":10,"max":5,"period":1,"duration":1}]]:
+            with self.assertRaises(StressAnAPIConfigException):
+                validateStages(invalid_stages)
+
+    def test_getClosedLoopSettings(self):
+        self.assertEqual(getClosedLoopSettings(1000,0.001,100),[2,1,0.001])
+        self.assertEqual(getClosedLoopSettings(100,0.001,100),[1,1,0.009])
+        self.assertEqual(getClosedLoopSettings(5000,0.0001,100),[1,10,0.001])
+        self.assertEqual(getClosedLoopSettings(100000,0.01,10),[10,1,0.00001])
+
+    def test_classMaxThroughputSearch(self):
+        search = classMaxThroughputSearch(start_rate=100,max_rate=10000,precision=5)
+        capacity, rates = 1000, []
+        rate = search.next_rate()
+        while rate is not None:
+            rates.append(rate)
+            search.save({'rate':rate,'passed':rate <= capacity})
+            rate = search.next_rate()
+        self.assertEqual(rates[:5],[100,200,400,800,1600])
+        self.assertLessEqual(search.passed_rate,capacity)
+        self.assertGreaterEqual(search.passed_rate,capacity * 0.95)
+        search = classMaxThroughputSearch(start_rate=100,max_rate=300,precision=5)
+        for rate in [100,200,300]:
+            self.assertEqual(search.next_rate(),rate)
+            search.save({'rate':rate,'passed':True})
+        self.assertIsNone(search.next_rate())
+
+    def test_agents_localhost(self):
+        server, hits = startTestServer()
+        test_dir, agents, agents_addresses = '/tmp/stressanapi_unit_test_agents', [], []
+        os.makedirs(test_dir,exist_ok=True)
+        with open(f'{test_dir}/agents.txt','w') as f:
+            f.write('agent0\nagent1\n') # each agent sends only its own line
+        with open(f'{test_dir}/config.json','w') as f:
+            json.dump({'url':f'http://127.0.0.1:{server.server_port}/%%fileunique:{test_dir}/agents.txt%%','method':'GET','engine':'pooled','arrival_rate':40},f)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)),'stressanapi.py')
+        try:
+            for I in range(2):
+                with socket.create_server(('127.0.0.1',0)) as free_port:
+                    agents_addresses.append(f'127.0.0.1:{free_port.getsockname()[1]}')
+                agents.append(subprocess.Popen([sys.executable,script,'--agent','--listen',agents_addresses[-1],'--agent-token','unit-test','--nodate'],
+                                               stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,stderr=subprocess.STDOUT))
+                self.assertIn(b'listening',agents[-1].stdout.readline())
+            def runController(token:str):
+                return subprocess.run([sys.executable,script,'--conf',f'{test_dir}/config.json','--agents',','.join(agents_addresses),'--headless','--duration','2',
+                                       '--report',f'{test_dir}/report.json','--nodate'],env={**os.environ,'STRESSANAPI_AGENT_TOKEN':token},
+                                      stdin=subprocess.DEVNULL,capture_output=True,timeout=60)
+            self.assertEqual(runController('unit-test').returncode,0)
+            with open(f'{test_dir}/report.json') as f:
+                report = json.load(f)
+            self.assertEqual(sorted(hits.keys()),['/agent0','/agent1'])
+            self.assertLessEqual(report['status_codes']['200'],sum(hits.values()))
+            self.assertGreater(report['status_codes']['200'],max(hits.values())) # the requests of both agents are merged
+            result = runController('wrong-token')
+            self.assertEqual(result.returncode,1)
+            self.assertIn(b'invalid token',result.stdout)
+        finally:
+            [agent.kill() for agent in agents]
+            server.shutdown()
+            shutil.rmtree(test_dir)
+
+    ##──── the console script of setup.py calls main_function() without the __main__ block of stressanapi.py
+    def test_main_function_headless(self):
+        server, hits = startTestServer()
+        test_dir = '/tmp/stressanapi_unit_test_headless'
+        os.makedirs(test_dir,exist_ok=True)
+        with open(f'{test_dir}/config.json','w') as f:
+            json.dump({'url':f'http://127.0.0.1:{server.server_port}/api','method':'GET','engine':'pooled','arrival_rate':20,'slo_error_ratio':1.0},f)
+        main_function = f"import sys; sys.path.insert(0,{repr(os.path.dirname(os.path.abspath(__file__)))}); from stressanapi import main_function; main_function()"
+        command = [sys.executable,'-c',main_function,'--conf',f'{test_dir}/config.json','--headless','--report',f'{test_dir}/report.json','--nodate']
+        try:
+            result = subprocess.run(command + ['--duration','1'],stdin=subprocess.DEVNULL,capture_output=True,timeout=60)
+            self.assertEqual(result.returncode,0)
+            with open(f'{test_dir}/report.json') as f:
+                report = json.load(f)
+            self.assertEqual([report['summary']['errors'],[(threshold['name'],threshold['passed']) for threshold in report['thresholds']]],[0,[('slo_error_ratio',True)]])
+            self.assertGreater(report['status_codes']['200'],0)
+            os.remove(f'{test_dir}/report.json')
+            hits.clear()
+            process = subprocess.Popen(command,stdin=subprocess.DEVNULL,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+            deadline = time.monotonic() + 30
+            while not hits and time.monotonic() < deadline: # the requests have started
+                time.sleep(0.05)
+            process.terminate() # SIGTERM, like a CI pipeline cancelled
+            self.assertEqual(process.wait(timeout=60),0)
+            self.assertTrue(os.path.isfile(f'{test_dir}/report.json'))
+        finally:
+            server.shutdown()
+            shutil.rmtree(test_dir)
+
+    def test_agent_stats_delta(self):
+        time_stats = classTimeStats()
+        [time_stats.save(elapsed_time) for elapsed_time in [0.1,0.2,0.3]]
+        delta = {'requests':3,'status_codes':{200:2,901:1},'times':time_stats.drain(),'lags':classTimeStats().drain(),
+                 'connections':[1,0,0,0,0],'pipeline':[[1],[0.1]],'client_cpu':[100,3]}
+        self.assertEqual(decodeStatsDelta(json.loads(json.dumps(delta))),delta)
+        self.assertEqual(parseHostPort('10.0.0.1:7878'),('10.0.0.1',7878))
+        self.assertEqual(parseHostPort('7878',default_host='0.0.0.0'),('0.0.0.0',7878))
+        self.assertEqual(parseHostPort('[::1]:7878'),('::1',7878))
         
 if __name__ == '__main__':
     test_file = '/tmp/stressanapi_unit_test.json'